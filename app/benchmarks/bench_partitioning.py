@@ -0,0 +1,87 @@
+# Benchmark do particionamento por grafo: tempo de carga (nós + arestas) de um grafo à medida que o banco acumula
+# grafos. Com GRAPH_PARTITIONING=list a leitura toca apenas as partições do grafo e deve ficar estável; sem
+# particionamento ela depende dos índices por graph_id em tabelas cada vez maiores
+#
+# Uso (contra o banco configurado pelas variáveis USER/PASSWORD/HOST/PORT):
+#   GRAPH_PARTITIONING=list python -m app.benchmarks.bench_partitioning --steps 10 100 1000 --size 20 --samples 20
+
+import argparse
+import random
+import statistics
+import time
+
+from app.db.database import Session, engine
+from app.db.partitioning import GRAPH_PARTITIONING, create_schema
+from app.controllers.graph_controls import delete_graph_by_id
+from app.controllers.graph_ingest import insert_graph, bulk_insert_nodes, bulk_insert_edges
+from app.controllers.graph_loader import load_graph_rows
+from app.benchmarks.bench_routing import build_grid_rows
+
+
+def create_graphs(count: int, size: int, prefix: str, offset: int) -> list:
+    nodes, edges = build_grid_rows(size)
+    node_rows = [(name, lon, lat) for _, name, lon, lat in nodes]
+    graph_ids = []
+    db = Session()
+    try:
+        for i in range(offset, offset + count):
+            graph = insert_graph(f"{prefix}_{i}", db)
+            node_id_map = bulk_insert_nodes(graph.id, node_rows, db)
+            bulk_insert_edges(graph.id, edges, node_id_map, db)
+            db.commit()
+            graph_ids.append(graph.id)
+    finally:
+        db.close()
+    return graph_ids
+
+
+def measure_loads(graph_ids: list, samples: int, rnd: random.Random) -> list:
+    timings = []
+    db = Session()
+    try:
+        for graph_id in rnd.sample(graph_ids, min(samples, len(graph_ids))):
+            start = time.perf_counter()
+            load_graph_rows(graph_id, db)
+            timings.append(time.perf_counter() - start)
+            db.rollback()
+    finally:
+        db.close()
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--steps", type=int, nargs="+", default=[10, 100, 1000], help="total de grafos em cada medição")
+    parser.add_argument("--size", type=int, default=20, help="lado da grade de cada grafo (size x size nós)")
+    parser.add_argument("--samples", type=int, default=20, help="grafos carregados por medição")
+    parser.add_argument("--keep", action="store_true", help="mantém os grafos criados ao final")
+    args = parser.parse_args()
+
+    create_schema(engine)
+    prefix = f"bench_partitioning_{int(time.time())}"
+    rnd = random.Random(7)
+    graph_ids = []
+
+    print(f"GRAPH_PARTITIONING={GRAPH_PARTITIONING}, {args.size * args.size} nodes per graph")
+    print(f"{'graphs':>8}{'create (s)':>12}{'load p50 (ms)':>16}{'load p95 (ms)':>16}")
+    try:
+        for step in sorted(args.steps):
+            start = time.perf_counter()
+            graph_ids += create_graphs(max(0, step - len(graph_ids)), args.size, prefix, len(graph_ids))
+            created = time.perf_counter() - start
+
+            timings = sorted(measure_loads(graph_ids, args.samples, rnd))
+            p95 = timings[min(len(timings) - 1, int(len(timings) * 0.95))]
+            print(f"{len(graph_ids):8}{created:12.2f}{statistics.median(timings) * 1e3:16.2f}{p95 * 1e3:16.2f}")
+    finally:
+        if not args.keep:
+            db = Session()
+            try:
+                for graph_id in graph_ids:
+                    delete_graph_by_id(graph_id, db)
+            finally:
+                db.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,138 @@
+# Benchmark do motor de rotas: memória e latência do nx.DiGraph comparados à representação CSR
+#
+# Uso: python -m app.benchmarks.bench_routing --size 200 --queries 200
+
+import argparse
+import random
+import time
+import tracemalloc
+from collections import namedtuple
+
+import networkx as nx
+from geoalchemy2.shape import from_shape, to_shape
+from shapely.geometry import Point
+
+from app.controllers.compact_graph import CompactGraph
+from app.controllers.graph_controls import materialize_route
+from app.controllers.routing_index import build_landmark_index
+from app.schemas.graph_schemas import NodeResponse
+
+
+# Linha de nó como devolvida pelo ORM (geometria em WKB)
+WkbNode = namedtuple("WkbNode", ["id", "name", "geom"])
+
+
+# Gera uma malha viária (grade com arestas nos dois sentidos) com pesos aleatórios
+def build_grid_rows(size: int, seed: int = 42):
+    rnd = random.Random(seed)
+    nodes = [(r * size + c + 1, f"N{r}_{c}", -47.0 + c * 0.001, -15.0 + r * 0.001) for r in range(size) for c in range(size)]
+    edges = []
+    for r in range(size):
+        for c in range(size):
+            for dr, dc in ((0, 1), (1, 0)):
+                if r + dr < size and c + dc < size:
+                    weight = rnd.randint(100, 200)
+                    edges.append((f"N{r}_{c}", f"N{r + dr}_{c + dc}", weight))
+                    edges.append((f"N{r + dr}_{c + dc}", f"N{r}_{c}", weight))
+    return nodes, edges
+
+
+def build_networkx(nodes, edges) -> nx.DiGraph:
+    G = nx.DiGraph()
+    for node_id, name, lon, lat in nodes:
+        G.add_node(name, id=node_id, longitude=lon, latitude=lat)
+    for u, v, w in edges:
+        G.add_edge(u, v, weight=w)
+    return G
+
+
+def measure_build(builder, *args):
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = builder(*args)
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    current = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return result, elapsed, current, peak
+
+
+def measure_queries(run, pairs) -> float:
+    start = time.perf_counter()
+    for source, target in pairs:
+        run(source, target)
+    return (time.perf_counter() - start) / len(pairs)
+
+
+# Montagem da resposta antiga: busca linear pelo nome e decodificação do WKB a cada parada
+def materialize_by_scan(wkb_nodes, path_names):
+    route = []
+    for node_name in path_names:
+        node = next((n for n in wkb_nodes if n.name == node_name), None)
+        if node:
+            point = to_shape(node.geom)
+            route.append(NodeResponse(id=node.id, name=node.name, longitude=point.x, latitude=point.y))
+    return route
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--size", type=int, default=200, help="lado da grade (size x size nós)")
+    parser.add_argument("--queries", type=int, default=200)
+    args = parser.parse_args()
+
+    nodes, edges = build_grid_rows(args.size)
+    print(f"graph: {len(nodes)} nodes, {len(edges)} edges")
+
+    G, nx_build, nx_mem, nx_peak = measure_build(build_networkx, nodes, edges)
+    compact, csr_build, csr_mem, csr_peak = measure_build(CompactGraph.from_rows, nodes, edges)
+
+    rnd = random.Random(1)
+    names = [name for _, name, _, _ in nodes]
+    pairs = [(rnd.choice(names), rnd.choice(names)) for _ in range(args.queries)]
+    index_pairs = [(compact.node_index(s), compact.node_index(t)) for s, t in pairs]
+
+    nx_query = measure_queries(lambda s, t: nx.dijkstra_path(G, s, t), pairs)
+    csr_query = measure_queries(compact.dijkstra_path, index_pairs)
+
+    print(f"{'':12}{'build (s)':>12}{'memory (MB)':>14}{'peak (MB)':>12}{'query (ms)':>12}")
+    print(f"{'nx.DiGraph':12}{nx_build:12.3f}{nx_mem / 1e6:14.1f}{nx_peak / 1e6:12.1f}{nx_query * 1e3:12.2f}")
+    print(f"{'CSR':12}{csr_build:12.3f}{csr_mem / 1e6:14.1f}{csr_peak / 1e6:12.1f}{csr_query * 1e3:12.2f}")
+    print(f"CSR arrays: {compact.nbytes / 1e6:.1f} MB ({compact.nbytes / len(edges):.1f} bytes/edge without the name table)")
+
+    # Dijkstra x A* (heurística geográfica com a escala admissível do grafo) x ALT (landmarks): latência e nós expandidos
+    expanded = {"dijkstra": 0, "astar": 0, "alt": 0}
+
+    def run_dijkstra(s, t):
+        expanded["dijkstra"] += len(compact.dijkstra_tree(s, [t])[0])
+
+    def run_astar(s, t):
+        expanded["astar"] += compact.astar_path(s, t)[2]
+
+    dijkstra_query = measure_queries(run_dijkstra, index_pairs)
+    astar_query = measure_queries(run_astar, index_pairs)
+    print(f"dijkstra: {dijkstra_query * 1e3:.2f} ms/query, {expanded['dijkstra'] / len(index_pairs):.0f} nodes expanded; "
+          f"A* (scale {compact.heuristic_scale:.3f}): {astar_query * 1e3:.2f} ms/query, {expanded['astar'] / len(index_pairs):.0f} nodes expanded")
+
+    start = time.perf_counter()
+    landmarks = build_landmark_index(compact)
+    alt_build = time.perf_counter() - start
+
+    def run_alt(s, t):
+        expanded["alt"] += compact.alt_path(s, t, landmarks)[2]
+
+    alt_query = measure_queries(run_alt, index_pairs)
+    print(f"ALT ({len(landmarks.landmarks)} landmarks, built in {alt_build:.2f} s, {len(landmarks.to_bytes()) / 1e6:.1f} MB stored): "
+          f"{alt_query * 1e3:.2f} ms/query, {expanded['alt'] / len(index_pairs):.0f} nodes expanded")
+
+    # Microbenchmark da montagem das respostas de rota
+    paths = [compact.dijkstra_path(s, t) for s, t in index_pairs[:20]]
+    wkb_nodes = [WkbNode(node_id, name, from_shape(Point(lon, lat), srid=4326)) for node_id, name, lon, lat in nodes]
+    hops = sum(len(p) for p in paths)
+    scan = measure_queries(lambda p, _: materialize_by_scan(wkb_nodes, compact.path_names(p)), [(p, None) for p in paths])
+    table = measure_queries(lambda p, _: materialize_route(compact, p), [(p, None) for p in paths])
+    print(f"route materialization ({hops / len(paths):.0f} hops/route): scan {scan * 1e3:.2f} ms/route, table lookup {table * 1e3:.3f} ms/route")
+
+
+if __name__ == "__main__":
+    main()
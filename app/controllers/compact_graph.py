@@ -0,0 +1,529 @@
+# Arquivo com a representação compacta (CSR) dos grafos usada pelo motor de rotas
+
+import heapq
+import math
+from bisect import bisect_right
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+import networkx as nx
+import numpy as np
+import shapely
+from shapely import STRtree
+
+# SciPy é opcional: quando disponível, as matrizes de distância usam o Dijkstra vetorizado do csgraph
+try:
+    from scipy.sparse import csr_matrix
+    from scipy.sparse.csgraph import dijkstra as csgraph_dijkstra
+except ImportError:  # pragma: no cover
+    csr_matrix = None
+    csgraph_dijkstra = None
+
+
+# Quantidade de passos da busca em profundidade entre consultas ao should_stop
+STOP_CHECK_INTERVAL = 2048
+
+# Memória máxima da matriz densa (origens x nós) de cada chamada ao csgraph; as origens são processadas em blocos
+DISTANCE_MATRIX_CHUNK_BYTES = 64 * 1024 * 1024
+
+# Raio médio da Terra (m), o mesmo usado pelo ST_DistanceSphere do PostGIS
+EARTH_RADIUS_M = 6371008.8
+
+
+def haversine_m(lon1, lat1, lon2, lat2):
+    # Distância de grande círculo em metros; aceita escalares ou arrays NumPy
+    lon1, lat1, lon2, lat2 = np.radians(lon1), np.radians(lat1), np.radians(lon2), np.radians(lat2)
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_M * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+
+
+class CompactGraph:
+    """
+        Grafo direcionado em formato CSR: os nós são índices inteiros e as arestas de saída
+        do nó i ficam em targets[offsets[i]:offsets[i + 1]] / weights[offsets[i]:offsets[i + 1]]
+    """
+
+    def __init__(self, names: List[str], node_ids: np.ndarray, longitudes: np.ndarray, latitudes: np.ndarray,
+                 offsets: np.ndarray, targets: np.ndarray, weights: np.ndarray):
+        self.names = names
+        self.index: Dict[str, int] = {name: i for i, name in enumerate(names)}
+        self.node_ids = node_ids
+        self.longitudes = longitudes
+        self.latitudes = latitudes
+        self.offsets = offsets
+        self.targets = targets
+        self.weights = weights
+
+    @classmethod
+    def from_rows(cls, nodes: Iterable[Tuple[int, str, float, float]], edges: Iterable[Tuple[str, str, int]]) -> "CompactGraph":
+        # Nós ordenados pelo id do banco para que a numeração seja estável entre reconstruções
+        nodes = sorted(nodes)
+        names = [name for _, name, _, _ in nodes]
+        node_ids = np.fromiter((node_id for node_id, _, _, _ in nodes), dtype=np.int64, count=len(nodes))
+        longitudes = np.fromiter((lon for _, _, lon, _ in nodes), dtype=np.float64, count=len(nodes))
+        latitudes = np.fromiter((lat for _, _, _, lat in nodes), dtype=np.float64, count=len(nodes))
+        index = {name: i for i, name in enumerate(names)}
+
+        sources, targets, weights = [], [], []
+        for from_node_name, to_node_name, weight in edges:
+            u = index.get(from_node_name)
+            v = index.get(to_node_name)
+            if u is None or v is None:
+                continue
+            sources.append(u)
+            targets.append(v)
+            weights.append(weight)
+
+        return cls.from_arrays(names, node_ids, longitudes, latitudes,
+                               np.asarray(sources, dtype=np.int32), np.asarray(targets, dtype=np.int32),
+                               np.asarray(weights, dtype=np.int64))
+
+    @classmethod
+    def from_arrays(cls, names: List[str], node_ids: np.ndarray, longitudes: np.ndarray, latitudes: np.ndarray,
+                    sources: np.ndarray, targets: np.ndarray, weights: np.ndarray) -> "CompactGraph":
+        n = len(names)
+        # Arestas paralelas: assim como no nx.DiGraph, a última inserida prevalece
+        order = np.lexsort((np.arange(len(sources)), targets, sources))
+        sources, targets, weights = sources[order], targets[order], weights[order]
+        if len(sources):
+            last = np.ones(len(sources), dtype=bool)
+            last[:-1] = (sources[1:] != sources[:-1]) | (targets[1:] != targets[:-1])
+            sources, targets, weights = sources[last], targets[last], weights[last]
+
+        offsets = np.zeros(n + 1, dtype=np.int64)
+        np.cumsum(np.bincount(sources, minlength=n), out=offsets[1:])
+        return cls(names, node_ids, longitudes, latitudes, offsets, targets.astype(np.int32), weights.astype(np.int64))
+
+    def __getstate__(self) -> dict:
+        # O índice nome -> posição é reconstruído ao desserializar (envio do grafo para processos de rotas)
+        # e o índice espacial, se necessário, sob demanda
+        state = self.__dict__.copy()
+        del state["index"]
+        state.pop("_spatial_index", None)
+        state.pop("_heuristic_scale", None)
+        return state
+
+    def __setstate__(self, state: dict) -> None:
+        self.__dict__.update(state)
+        self.index = {name: i for i, name in enumerate(self.names)}
+
+    def _derive(self, **attributes) -> "CompactGraph":
+        # Novo grafo que compartilha com este tudo o que não foi substituído (arrays, índice de nomes, índice espacial);
+        # o original continua válido para as consultas em andamento
+        graph = CompactGraph.__new__(CompactGraph)
+        graph.__dict__.update(self.__dict__)
+        graph.__dict__.pop("_heuristic_scale", None)
+        graph.__dict__.update(attributes)
+        return graph
+
+    def with_weights(self, updates: Iterable[Tuple[str, str, int]]) -> "CompactGraph":
+        # Cópia com novos pesos em arestas existentes: apenas o array de pesos é copiado (copy-on-write).
+        # Arestas inexistentes são ignoradas, o que torna a operação idempotente
+        weights = self.weights.copy()
+        for from_node_name, to_node_name, weight in updates:
+            u, v = self.index.get(from_node_name), self.index.get(to_node_name)
+            if u is None or v is None:
+                continue
+            start, end = self.offsets[u], self.offsets[u + 1]
+            pos = start + np.searchsorted(self.targets[start:end], v)
+            if pos < end and self.targets[pos] == v:
+                weights[pos] = weight
+        return self._derive(weights=weights)
+
+    def with_changes(self, remove_edges: Iterable[Tuple[str, str]] = (), remove_nodes: Iterable[str] = (),
+                     add_nodes: Iterable[Tuple[int, str, float, float]] = (), move_nodes: Iterable[Tuple[str, float, float]] = (),
+                     set_edges: Iterable[Tuple[str, str, int]] = ()) -> "CompactGraph":
+        # Reconstrução em memória após uma alteração estrutural, na ordem: remoção de arestas, remoção de nós
+        # (com as arestas incidentes), inclusão de nós (ids novos, maiores que os existentes), mudança de coordenadas
+        # e inclusão/atualização de arestas. O resultado é o mesmo de recarregar o grafo do banco
+        n = self.number_of_nodes
+        sources = np.repeat(np.arange(n, dtype=np.int64), np.diff(self.offsets))
+        targets, weights = self.targets.astype(np.int64), self.weights
+
+        keep_edges = np.ones(len(targets), dtype=bool)
+        removed = [(self.index[a], self.index[b]) for a, b in remove_edges if a in self.index and b in self.index]
+        if removed:
+            keep_edges &= ~np.isin(sources * n + targets, [u * n + v for u, v in removed])
+
+        keep_nodes = np.ones(n, dtype=bool)
+        keep_nodes[[self.index[name] for name in remove_nodes if name in self.index]] = False
+        keep_edges &= keep_nodes[sources] & keep_nodes[targets]
+        remap = np.cumsum(keep_nodes) - 1
+
+        names = [name for name, keep in zip(self.names, keep_nodes) if keep]
+        known = set(names)
+        added = [(node_id, name, lon, lat) for node_id, name, lon, lat in add_nodes if name not in known]
+        names += [name for _, name, _, _ in added]
+        node_ids = np.concatenate([self.node_ids[keep_nodes], np.asarray([row[0] for row in added], dtype=np.int64)])
+        longitudes = np.concatenate([self.longitudes[keep_nodes], np.asarray([row[2] for row in added], dtype=np.float64)])
+        latitudes = np.concatenate([self.latitudes[keep_nodes], np.asarray([row[3] for row in added], dtype=np.float64)])
+
+        index = {name: i for i, name in enumerate(names)}
+        for name, lon, lat in move_nodes:
+            if name in index:
+                longitudes[index[name]], latitudes[index[name]] = lon, lat
+
+        new_edges = [(index[a], index[b], w) for a, b, w in set_edges if a in index and b in index]
+        sources = np.concatenate([remap[sources[keep_edges]], np.asarray([e[0] for e in new_edges], dtype=np.int64)])
+        targets = np.concatenate([remap[targets[keep_edges]], np.asarray([e[1] for e in new_edges], dtype=np.int64)])
+        weights = np.concatenate([weights[keep_edges], np.asarray([e[2] for e in new_edges], dtype=np.int64)])
+
+        return CompactGraph.from_arrays(names, node_ids, longitudes, latitudes,
+                                        sources.astype(np.int32), targets.astype(np.int32), weights)
+
+    @property
+    def number_of_nodes(self) -> int:
+        return len(self.names)
+
+    @property
+    def number_of_edges(self) -> int:
+        return len(self.targets)
+
+    @property
+    def nbytes(self) -> int:
+        arrays = (self.node_ids, self.longitudes, self.latitudes, self.offsets, self.targets, self.weights)
+        return sum(a.nbytes for a in arrays)
+
+    def node_index(self, name: str) -> int:
+        try:
+            return self.index[name]
+        except KeyError:
+            raise nx.NodeNotFound(f"Node {name} not in graph")
+
+    def successors(self, u: int) -> Tuple[List[int], List[int]]:
+        start, end = self.offsets[u], self.offsets[u + 1]
+        return self.targets[start:end].tolist(), self.weights[start:end].tolist()
+
+    def edge_weight(self, u: int, v: int) -> Optional[int]:
+        start, end = self.offsets[u], self.offsets[u + 1]
+        # Os destinos de cada nó ficam ordenados, permitindo busca binária
+        pos = start + np.searchsorted(self.targets[start:end], v)
+        if pos < end and self.targets[pos] == v:
+            return int(self.weights[pos])
+        return None
+
+    def path_names(self, path: List[int]) -> List[str]:
+        return [self.names[i] for i in path]
+
+    def node_rows(self, path: List[int]) -> Tuple[List[int], List[str], List[float], List[float]]:
+        # Tabela de nós indexada pelo índice CSR: id, nome, longitude e latitude de cada nó do caminho
+        return (self.node_ids[path].tolist(), [self.names[i] for i in path],
+                self.longitudes[path].tolist(), self.latitudes[path].tolist())
+
+    @property
+    def spatial_index(self) -> STRtree:
+        # STRtree dos pontos dos nós (posição na árvore = índice CSR), construída no primeiro uso e mantida junto do grafo em cache
+        tree = self.__dict__.get("_spatial_index")
+        if tree is None:
+            tree = self._spatial_index = STRtree(shapely.points(self.longitudes, self.latitudes))
+        return tree
+
+    def nearest_nodes(self, longitude: float, latitude: float, k: int = 1) -> List[Tuple[int, float]]:
+        # Os k nós mais próximos do ponto, como (índice, distância em metros). A ordenação usa a distância
+        # planar em graus, a mesma do operador <-> do PostGIS em SRID 4326
+        n = self.number_of_nodes
+        if n == 0:
+            return []
+        point = shapely.Point(longitude, latitude)
+        tree = self.spatial_index
+        nearest, distances = tree.query_nearest(point, return_distance=True, all_matches=True)
+        candidates = nearest
+        if k > len(candidates):
+            # Amplia o raio de busca a partir do vizinho mais próximo até reunir k candidatos
+            radius = max(float(distances[0]), 1e-9)
+            while True:
+                radius *= 2
+                candidates = tree.query(point, predicate="dwithin", distance=radius)
+                if len(candidates) >= min(k, n):
+                    break
+
+        candidates = np.asarray(candidates, dtype=np.int64)
+        planar = np.hypot(self.longitudes[candidates] - longitude, self.latitudes[candidates] - latitude)
+        chosen = candidates[np.lexsort((candidates, planar))[:k]]
+        meters = haversine_m(longitude, latitude, self.longitudes[chosen], self.latitudes[chosen])
+        return list(zip(chosen.tolist(), meters.tolist()))
+
+    def corridor_mask(self, source: int, target: int, width_m: float) -> np.ndarray:
+        # Máscara (por índice CSR) dos nós a até width_m metros do segmento entre origem e destino. O STRtree seleciona
+        # os candidatos por uma distância em graus que nunca fica abaixo de width_m; a distância ao segmento é então
+        # medida em uma projeção equirretangular centrada no segmento (aproximação adequada para corredores de rota)
+        longitudes, latitudes = self.longitudes[[source, target]], self.latitudes[[source, target]]
+        meters_per_degree = math.pi * EARTH_RADIUS_M / 180
+        max_latitude = min(float(np.max(np.abs(latitudes))) + width_m / meters_per_degree, 89.0)
+        radius = width_m / meters_per_degree / math.cos(math.radians(max_latitude))
+        segment = shapely.LineString(np.column_stack((longitudes, latitudes))) if source != target else shapely.Point(longitudes[0], latitudes[0])
+        candidates = self.spatial_index.query(segment, predicate="dwithin", distance=radius)
+
+        x_scale = meters_per_degree * math.cos(math.radians(float(latitudes.mean())))
+        ax, bx = longitudes * x_scale
+        ay, by = latitudes * meters_per_degree
+        px, py = self.longitudes[candidates] * x_scale, self.latitudes[candidates] * meters_per_degree
+        dx, dy = bx - ax, by - ay
+        length2 = dx * dx + dy * dy
+        t = np.clip(((px - ax) * dx + (py - ay) * dy) / length2, 0.0, 1.0) if length2 > 0 else 0.0
+        distances = np.hypot(px - (ax + t * dx), py - (ay + t * dy))
+
+        mask = np.zeros(self.number_of_nodes, dtype=bool)
+        mask[candidates[distances <= width_m]] = True
+        mask[[source, target]] = True
+        return mask
+
+    def dijkstra_tree(self, source: int, targets: Optional[Iterable[int]] = None, blocked_nodes: Optional[set] = None,
+                      blocked_edges: Optional[set] = None, allowed: Optional[np.ndarray] = None) -> Tuple[Dict[int, int], Dict[int, int]]:
+        # Dijkstra a partir de uma única origem; para assim que todos os destinos informados forem fixados.
+        # blocked_nodes/blocked_edges removem temporariamente nós e arestas (usado pelo k-shortest-paths);
+        # allowed restringe a busca aos nós marcados na máscara (corredor espacial)
+        remaining = set(targets) if targets is not None else None
+        dist = {source: 0}
+        pred = {source: -1}
+        heap = [(0, source)]
+        done = set()
+
+        while heap:
+            d, u = heapq.heappop(heap)
+            if u in done:
+                continue
+            done.add(u)
+            if remaining is not None:
+                remaining.discard(u)
+                if not remaining:
+                    break
+            for v, w in zip(*self.successors(u)):
+                if blocked_nodes and v in blocked_nodes:
+                    continue
+                if allowed is not None and not allowed[v]:
+                    continue
+                if blocked_edges and (u, v) in blocked_edges:
+                    continue
+                nd = d + w
+                if nd < dist.get(v, nd + 1):
+                    dist[v] = nd
+                    pred[v] = u
+                    heapq.heappush(heap, (nd, v))
+
+        # Mantém apenas os nós fixados (distâncias definitivas)
+        return {u: dist[u] for u in done}, pred
+
+    def tree_path(self, pred: Dict[int, int], source: int, target: int) -> List[int]:
+        if target != source and target not in pred:
+            raise nx.NetworkXNoPath(f"No path between {self.names[source]} and {self.names[target]}.")
+        path = [target]
+        while path[-1] != source:
+            path.append(pred[path[-1]])
+        path.reverse()
+        return path
+
+    def dijkstra_path(self, source: int, target: int) -> List[int]:
+        dist, pred = self.dijkstra_tree(source, [target])
+        if target not in dist:
+            raise nx.NetworkXNoPath(f"No path between {self.names[source]} and {self.names[target]}.")
+        return self.tree_path(pred, source, target)
+
+    @property
+    def heuristic_scale(self) -> float:
+        # Maior escala (unidades de peso por metro) que mantém a heurística do A* admissível:
+        # o menor peso/comprimento geográfico entre as arestas do grafo
+        scale = self.__dict__.get("_heuristic_scale")
+        if scale is None:
+            sources = np.repeat(np.arange(self.number_of_nodes), np.diff(self.offsets))
+            lengths = haversine_m(self.longitudes[sources], self.latitudes[sources],
+                                  self.longitudes[self.targets], self.latitudes[self.targets])
+            positive = lengths > 0
+            scale = float(np.min(self.weights[positive] / lengths[positive])) if positive.any() else 0.0
+            self._heuristic_scale = scale = max(scale, 0.0)
+        return scale
+
+    def astar_path(self, source: int, target: int, scale: Optional[float] = None,
+                   allowed: Optional[np.ndarray] = None) -> Tuple[List[int], int, int]:
+        # A* com heurística de distância de grande círculo até o destino multiplicada por scale;
+        # devolve (caminho, custo, nós expandidos). Sem scale, usa a escala admissível do grafo
+        if scale is None:
+            scale = self.heuristic_scale
+        longitudes, latitudes = self.longitudes, self.latitudes
+        target_lat = math.radians(latitudes[target])
+        target_lon = math.radians(longitudes[target])
+        cos_target = math.cos(target_lat)
+        factor = 2 * EARTH_RADIUS_M * scale
+
+        def heuristic(v: int) -> float:
+            lat = math.radians(latitudes[v])
+            a = math.sin((target_lat - lat) / 2) ** 2 + math.cos(lat) * cos_target * math.sin((target_lon - math.radians(longitudes[v])) / 2) ** 2
+            return factor * math.asin(math.sqrt(min(a, 1.0)))
+
+        return self._astar(source, target, heuristic, allowed=allowed)
+
+    def alt_path(self, source: int, target: int, index, allowed: Optional[np.ndarray] = None) -> Tuple[List[int], int, int]:
+        # A* com a heurística de landmarks (ALT) de um índice pré-calculado para este grafo; as estimativas
+        # continuam válidas com a busca restrita por allowed, pois restringir o grafo só aumenta as distâncias
+        return self._astar(source, target, index.heuristic(target), prune_at=index.unreachable // 2, allowed=allowed)
+
+    def _astar(self, source: int, target: int, heuristic: Callable[[int], float],
+               prune_at: Optional[float] = None, allowed: Optional[np.ndarray] = None) -> Tuple[List[int], int, int]:
+        # Nós com heurística >= prune_at não alcançam o destino e não entram na fila; nós fora de allowed são ignorados
+        dist = {source: 0}
+        pred = {source: -1}
+        # Em empates de f, expande primeiro o nó com maior custo acumulado (mais próximo do destino)
+        heap = [(heuristic(source), 0, source)]
+        done = set()
+
+        while heap:
+            _, negative_d, u = heapq.heappop(heap)
+            if u in done:
+                continue
+            done.add(u)
+            d = -negative_d
+            if u == target:
+                return self.tree_path(pred, source, target), d, len(done)
+            for v, w in zip(*self.successors(u)):
+                if v in done or (allowed is not None and not allowed[v]):
+                    continue
+                nd = d + w
+                if nd < dist.get(v, nd + 1):
+                    h = heuristic(v)
+                    if prune_at is not None and h >= prune_at:
+                        continue
+                    dist[v] = nd
+                    pred[v] = u
+                    heapq.heappush(heap, (nd + h, -nd, v))
+
+        raise nx.NetworkXNoPath(f"No path between {self.names[source]} and {self.names[target]}.")
+
+    def distance_matrix(self, sources: List[int], targets: List[int]) -> np.ndarray:
+        # Custos de todos os pares origem x destino (np.inf quando não há caminho)
+        if csgraph_dijkstra is not None:
+            n = self.number_of_nodes
+            matrix = csr_matrix((self.weights, self.targets, self.offsets), shape=(n, n))
+            unique_sources, positions = np.unique(np.asarray(sources, dtype=np.int64), return_inverse=True)
+            target_columns = np.asarray(targets, dtype=np.int64)
+            # O csgraph devolve a distância da origem a todos os nós: cada bloco de origens mantém só as colunas dos destinos
+            chunk = max(1, DISTANCE_MATRIX_CHUNK_BYTES // (8 * max(n, 1)))
+            costs = np.empty((len(unique_sources), len(target_columns)))
+            for start in range(0, len(unique_sources), chunk):
+                dist = csgraph_dijkstra(matrix, directed=True, indices=unique_sources[start:start + chunk])
+                costs[start:start + chunk] = dist[:, target_columns]
+            return costs[positions]
+
+        costs = np.full((len(sources), len(targets)), np.inf)
+        trees = {}
+        for row, source in enumerate(sources):
+            if source not in trees:
+                trees[source] = self.dijkstra_tree(source, targets)[0]
+            dist = trees[source]
+            for col, target in enumerate(targets):
+                if target in dist:
+                    costs[row, col] = dist[target]
+        return costs
+
+    def path_cost(self, path: List[int]) -> int:
+        return sum(self.edge_weight(u, v) for u, v in zip(path, path[1:]))
+
+    def k_shortest_paths(self, source: int, target: int, k: int, max_cost: Optional[int] = None) -> Iterator[Tuple[List[int], int]]:
+        # Algoritmo de Yen: devolve até k caminhos simples em ordem crescente de custo.
+        # Cada novo caminho custa no máximo len(caminho) buscas de Dijkstra, independente do total de caminhos do grafo
+        if source == target:
+            return iter(())
+        dist, pred = self.dijkstra_tree(source, [target])
+        if target not in dist:
+            return iter(())
+        return self._yen(source, target, k, max_cost, self.tree_path(pred, source, target), dist[target])
+
+    def _yen(self, source: int, target: int, k: int, max_cost: Optional[int], first_path: List[int],
+             first_cost: int) -> Iterator[Tuple[List[int], int]]:
+        accepted: List[List[int]] = []
+        candidates = [(first_cost, len(first_path), first_path)]
+        seen = {tuple(first_path)}
+
+        while candidates and len(accepted) < k:
+            cost, _, path = heapq.heappop(candidates)
+            if max_cost is not None and cost > max_cost:
+                return
+            accepted.append(path)
+            yield path, cost
+
+            if len(accepted) == k:
+                return
+
+            # Gera desvios a partir de cada nó do último caminho aceito
+            root_cost = 0
+            for i in range(len(path) - 1):
+                spur, root = path[i], path[:i + 1]
+                blocked_edges = {(p[i], p[i + 1]) for p in accepted if len(p) > i + 1 and p[:i + 1] == root}
+                blocked_nodes = set(root[:-1])
+
+                spur_dist, spur_pred = self.dijkstra_tree(spur, [target], blocked_nodes, blocked_edges)
+                if target in spur_dist:
+                    candidate = root[:-1] + self.tree_path(spur_pred, spur, target)
+                    key = tuple(candidate)
+                    if key not in seen:
+                        seen.add(key)
+                        heapq.heappush(candidates, (root_cost + spur_dist[target], len(candidate), candidate))
+
+                root_cost += self.edge_weight(path[i], path[i + 1])
+
+    def all_simple_paths(self, source: int, target: int, cutoff: Optional[int] = None,
+                         resume_after: Optional[List[int]] = None, max_cost: Optional[int] = None) -> Iterator[List[int]]:
+        return (path for path, _ in self.all_simple_paths_with_costs(source, target, cutoff, resume_after, max_cost))
+
+    def all_simple_paths_with_costs(self, source: int, target: int, cutoff: Optional[int] = None,
+                                    resume_after: Optional[List[int]] = None, max_cost: Optional[int] = None,
+                                    should_stop: Optional[Callable[[], bool]] = None) -> Iterator[Tuple[List[int], int]]:
+        # Busca em profundidade iterativa que devolve (caminho, custo); cutoff limita a quantidade de arestas
+        # e max_cost poda os ramos cujo custo acumulado já o ultrapassou (pesos não negativos).
+        # should_stop é consultado periodicamente e encerra a busca (orçamento de tempo, cancelamento).
+        # O estado inicial é montado aqui (e não no gerador) para que cursores inválidos falhem imediatamente
+        if cutoff is None:
+            cutoff = self.number_of_nodes - 1
+        if source == target or cutoff < 1:
+            return iter(())
+
+        if resume_after is None:
+            path, costs = [source], [0]
+            stack = [iter(zip(*self.successors(source)))]
+        else:
+            path, costs, stack = self._resume_state(source, target, resume_after)
+        return self._simple_paths(path, costs, stack, target, cutoff, max_cost, should_stop)
+
+    def _simple_paths(self, path: List[int], costs: List[int], stack: list, target: int, cutoff: int,
+                      max_cost: Optional[int], should_stop: Optional[Callable[[], bool]] = None) -> Iterator[Tuple[List[int], int]]:
+        on_path = set(path)
+        steps = 0
+        while stack:
+            steps += 1
+            if should_stop is not None and steps % STOP_CHECK_INTERVAL == 0 and should_stop():
+                return
+            edge = next(stack[-1], None)
+            if edge is None:
+                stack.pop()
+                on_path.discard(path.pop())
+                costs.pop()
+                continue
+
+            v, w = edge
+            cost = costs[-1] + w
+            if v in on_path or (max_cost is not None and cost > max_cost):
+                continue
+            if v == target:
+                if len(path) <= cutoff:
+                    yield path + [target], cost
+            elif len(path) < cutoff:
+                path.append(v)
+                costs.append(cost)
+                on_path.add(v)
+                stack.append(iter(zip(*self.successors(v))))
+
+    def _resume_state(self, source: int, target: int, last_path: List[int]) -> Tuple[List[int], List[int], list]:
+        # Reconstrói a pilha da busca em profundidade logo após o último caminho entregue:
+        # como os destinos de cada nó ficam ordenados, basta posicionar cada iterador após o próximo nó do caminho
+        if len(last_path) < 2 or last_path[0] != source or last_path[-1] != target:
+            raise ValueError("Cursor does not match the requested start and end nodes")
+
+        costs, stack = [0], []
+        for u, v in zip(last_path, last_path[1:]):
+            if not 0 <= u < self.number_of_nodes:
+                raise ValueError("Invalid cursor")
+            targets, weights = self.successors(u)
+            position = bisect_right(targets, v)
+            if position == 0 or targets[position - 1] != v:
+                raise ValueError("Invalid cursor")
+            costs.append(costs[-1] + weights[position - 1])
+            stack.append(iter(zip(targets[position:], weights[position:])))
+        return list(last_path[:-1]), costs[:-1], stack
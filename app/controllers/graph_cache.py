@@ -0,0 +1,197 @@
+# Arquivo responsável pelo cache em memória dos grafos compilados usados nas consultas de rotas
+
+import asyncio
+import os
+import threading
+from collections import OrderedDict
+from typing import Awaitable, Callable, Dict, Optional
+
+from app.controllers.compact_graph import CompactGraph
+
+
+# Limites do cache (quantidade de grafos e soma de nós + arestas mantidos em memória)
+GRAPH_CACHE_MAX_GRAPHS = int(os.environ.get("GRAPH_CACHE_MAX_GRAPHS", 32))
+GRAPH_CACHE_MAX_ELEMENTS = int(os.environ.get("GRAPH_CACHE_MAX_ELEMENTS", 5_000_000))
+
+
+class CompiledGraph:
+    """
+        Estrutura de roteamento pronta para consulta de um grafo em uma versão específica
+    """
+
+    def __init__(self, graph_id: int, version: int, name: str, graph: CompactGraph, landmarks=None):
+        self.graph_id = graph_id
+        self.version = version
+        self.name = name
+        self.graph = graph
+        # Índice ALT (app.controllers.routing_index.LandmarkIndex) quando existir um válido para esta versão
+        self.landmarks = landmarks
+
+    @property
+    def size(self) -> int:
+        return self.graph.number_of_nodes + self.graph.number_of_edges
+
+
+class GraphCache:
+    """
+        Cache LRU de grafos compilados, indexado por graph_id + versão.
+        Toda escrita em um grafo incrementa a versão, invalidando a entrada antiga.
+    """
+
+    def __init__(self, max_graphs: int = GRAPH_CACHE_MAX_GRAPHS, max_elements: int = GRAPH_CACHE_MAX_ELEMENTS):
+        self.max_graphs = max_graphs
+        self.max_elements = max_elements
+        self._entries: "OrderedDict[int, CompiledGraph]" = OrderedDict()
+        self._versions: Dict[int, int] = {}
+        self._build_locks: Dict[int, threading.Lock] = {}
+        self._async_build_locks: Dict[int, asyncio.Lock] = {}
+        self._write_locks: Dict[int, threading.Lock] = {}
+        self._lock = threading.Lock()
+        self._elements = 0
+        self.hits = 0
+        self.misses = 0
+        self.rebuilds = 0
+        self.evictions = 0
+        self.patches = 0
+
+    def version(self, graph_id: int) -> int:
+        with self._lock:
+            return self._versions.get(graph_id, 0)
+
+    def bump_version(self, graph_id: int) -> int:
+        # Chamado após o commit de qualquer escrita no grafo
+        with self._lock:
+            return self._bump(graph_id)
+
+    def write_lock(self, graph_id: int) -> threading.Lock:
+        # Serializa as alterações incrementais de um mesmo grafo (commit + atualização do cache na mesma ordem)
+        with self._lock:
+            return self._write_locks.setdefault(graph_id, threading.Lock())
+
+    def apply_patch(self, graph_id: int, patch: Callable[[CompiledGraph, int], Optional[CompiledGraph]]) -> int:
+        # Chamado após o commit de uma alteração incremental: a versão é incrementada como no bump_version, mas a
+        # entrada em cache é atualizada pelo patch (entrada atual, nova versão) em vez de descartada.
+        # Sem entrada em cache, ou se o patch devolver None, o grafo é reconstruído do banco na próxima consulta.
+        # O patch roda fora do lock (pode levar segundos em grafos grandes); enquanto isso as consultas seguem com a
+        # entrada anterior. Se a versão mudou nesse intervalo, o resultado é descartado
+        with self._lock:
+            entry = self._entries.get(graph_id)
+            current = self._versions.get(graph_id, 0)
+            if entry is None or entry.version != current:
+                return self._bump(graph_id)
+
+        patched = patch(entry, current + 1)
+
+        with self._lock:
+            if self._versions.get(graph_id, 0) != current:
+                return self._bump(graph_id)
+            version = self._bump(graph_id)
+            if patched is not None:
+                self._entries[graph_id] = patched
+                self._elements += patched.size
+                self.patches += 1
+                self._evict()
+            return version
+
+    def get(self, graph_id: int) -> Optional[CompiledGraph]:
+        with self._lock:
+            entry = self._entries.get(graph_id)
+            if entry is not None and entry.version == self._versions.get(graph_id, 0):
+                self._entries.move_to_end(graph_id)
+                self.hits += 1
+                return entry
+            self.misses += 1
+            return None
+
+    def get_or_build(self, graph_id: int, builder: Callable[[int], CompiledGraph]) -> CompiledGraph:
+        entry = self.get(graph_id)
+        if entry is not None:
+            return entry
+
+        # Apenas uma thread reconstrói um mesmo grafo; as demais aguardam o resultado
+        with self._lock:
+            build_lock = self._build_locks.setdefault(graph_id, threading.Lock())
+
+        with build_lock:
+            with self._lock:
+                entry = self._entries.get(graph_id)
+                if entry is not None and entry.version == self._versions.get(graph_id, 0):
+                    self._entries.move_to_end(graph_id)
+                    return entry
+
+            version = self.version(graph_id)
+            entry = builder(version)
+            self.put(entry)
+            return entry
+
+    async def get_or_build_async(self, graph_id: int, builder: Callable[[int], Awaitable[CompiledGraph]]) -> CompiledGraph:
+        # Mesma lógica do get_or_build, para construtores assíncronos (sem bloquear o event loop enquanto espera)
+        entry = self.get(graph_id)
+        if entry is not None:
+            return entry
+
+        with self._lock:
+            build_lock = self._async_build_locks.setdefault(graph_id, asyncio.Lock())
+
+        async with build_lock:
+            with self._lock:
+                entry = self._entries.get(graph_id)
+                if entry is not None and entry.version == self._versions.get(graph_id, 0):
+                    self._entries.move_to_end(graph_id)
+                    return entry
+
+            version = self.version(graph_id)
+            entry = await builder(version)
+            self.put(entry)
+            return entry
+
+    def put(self, entry: CompiledGraph) -> None:
+        with self._lock:
+            # Descarta construções feitas sobre uma versão que já foi invalidada
+            if entry.version != self._versions.get(entry.graph_id, 0):
+                return
+            self._discard(entry.graph_id)
+            self._entries[entry.graph_id] = entry
+            self._elements += entry.size
+            self.rebuilds += 1
+            self._evict()
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._elements = 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "graphs": len(self._entries),
+                "elements": self._elements,
+                "max_graphs": self.max_graphs,
+                "max_elements": self.max_elements,
+                "hits": self.hits,
+                "misses": self.misses,
+                "rebuilds": self.rebuilds,
+                "evictions": self.evictions,
+                "patches": self.patches,
+            }
+
+    def _bump(self, graph_id: int) -> int:
+        version = self._versions.get(graph_id, 0) + 1
+        self._versions[graph_id] = version
+        self._discard(graph_id)
+        return version
+
+    def _discard(self, graph_id: int) -> None:
+        entry = self._entries.pop(graph_id, None)
+        if entry is not None:
+            self._elements -= entry.size
+
+    def _evict(self) -> None:
+        # Remove os grafos menos usados até respeitar os dois limites (mantém sempre o mais recente)
+        while len(self._entries) > 1 and (len(self._entries) > self.max_graphs or self._elements > self.max_elements):
+            _, entry = self._entries.popitem(last=False)
+            self._elements -= entry.size
+            self.evictions += 1
+
+
+graph_cache = GraphCache()
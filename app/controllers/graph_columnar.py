@@ -0,0 +1,186 @@
+# Arquivo responsável pela importação/exportação de grafos em formatos colunares (Arrow IPC e Parquet).
+# Um grafo são duas tabelas: nodes (name, longitude, latitude) e edges (from_node_name, to_node_name, weight).
+# O pyarrow é carregado sob demanda; sem ele os endpoints respondem 501
+
+import io
+import os
+from typing import BinaryIO, Callable, Iterator, List
+
+from fastapi import HTTPException
+from fastapi.responses import StreamingResponse
+from sqlalchemy.exc import IntegrityError, SQLAlchemyError
+from sqlalchemy.orm import Session
+
+from app.schemas.graph_schemas import GraphIngestResponse
+from app.controllers.graph_cache import graph_cache
+from app.controllers.graph_export import stream_partitions
+from app.controllers.graph_ingest import insert_graph, bulk_insert_nodes, bulk_insert_edges, derive_edge_weights, integrity_error_to_http
+from app.controllers.graph_loader import graph_statement, nodes_statement, edges_statement
+
+
+# Linhas por lote lido do arquivo importado
+COLUMNAR_BATCH_SIZE = int(os.environ.get("COLUMNAR_BATCH_SIZE", 65536))
+
+MEDIA_TYPES = {
+    "arrow": "application/vnd.apache.arrow.stream",
+    "parquet": "application/vnd.apache.parquet",
+}
+
+# Colunas lidas na importação (as demais são ignoradas); pesos nulos são calculados pelo comprimento da aresta
+NODE_COLUMNS = ("name", "longitude", "latitude")
+EDGE_COLUMNS = ("from_node_name", "to_node_name", "weight")
+NULLABLE_COLUMNS = ("weight",)
+
+ARROW_FILE_MAGIC = b"ARROW1"
+
+
+def _pyarrow():
+    try:
+        import pyarrow
+        import pyarrow.ipc
+        import pyarrow.parquet
+    except ImportError:
+        raise HTTPException(status_code=501, detail="Columnar import/export requires pyarrow, which is not installed")
+    return pyarrow
+
+
+def _schemas(pa):
+    nodes = pa.schema([("id", pa.int64()), ("name", pa.string()), ("longitude", pa.float64()), ("latitude", pa.float64())])
+    edges = pa.schema([("id", pa.int64()), ("from_node_name", pa.string()), ("to_node_name", pa.string()), ("weight", pa.int64())])
+    return nodes, edges
+
+
+class _ChunkSink(io.RawIOBase):
+    """
+        Destino de escrita do pyarrow que acumula os bytes até serem repassados à resposta
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.chunks: List[bytes] = []
+        self.position = 0
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        data = bytes(data)
+        self.chunks.append(data)
+        self.position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self.position
+
+    def drain(self) -> bytes:
+        data = b"".join(self.chunks)
+        self.chunks = []
+        return data
+
+
+def _record_batches(pa, db: Session, stmt, schema) -> Iterator:
+    # Um record batch por lote do cursor do servidor
+    for rows in stream_partitions(db, stmt):
+        columns = list(zip(*rows))
+        yield pa.record_batch([pa.array(column, type=field.type) for column, field in zip(columns, schema)], schema=schema)
+
+
+# Função para exportar a tabela de nós ou de arestas de um grafo. Os lotes do cursor são escritos e enviados um a um
+# (record batches do Arrow IPC ou row groups do Parquet), sem materializar a tabela inteira em memória
+def export_graph_table(graph_id: int, table: str, file_format: str, db: Session, session_factory: Callable[[], Session]) -> StreamingResponse:
+    pa = _pyarrow()
+    graph = db.execute(graph_statement(graph_id)).first()
+    if graph is None:
+        raise HTTPException(status_code=404, detail=f"Graph with id {graph_id} not found")
+
+    nodes_schema, edges_schema = _schemas(pa)
+    schema, stmt = (nodes_schema, nodes_statement(graph_id)) if table == "nodes" else (edges_schema, edges_statement(graph_id))
+
+    def generate() -> Iterator[bytes]:
+        export_db = session_factory()
+        sink = _ChunkSink()
+        try:
+            if file_format == "parquet":
+                writer = pa.parquet.ParquetWriter(sink, schema)
+            else:
+                writer = pa.ipc.new_stream(sink, schema)
+            for batch in _record_batches(pa, export_db, stmt, schema):
+                if file_format == "parquet":
+                    writer.write_batch(batch, row_group_size=batch.num_rows)
+                else:
+                    writer.write_batch(batch)
+                yield sink.drain()
+            writer.close()
+            yield sink.drain()
+        finally:
+            export_db.close()
+
+    filename = f"graph_{graph_id}_{table}.{file_format}"
+    return StreamingResponse(generate(), media_type=MEDIA_TYPES[file_format],
+                             headers={"Content-Disposition": f'attachment; filename="{filename}"'})
+
+
+def _read_batches(pa, file: BinaryIO, columns: tuple) -> Iterator:
+    # Lê o arquivo em lotes: Parquet (row groups), Arrow IPC em formato de arquivo ou de stream
+    head = file.read(len(ARROW_FILE_MAGIC))
+    file.seek(0)
+    try:
+        if head.startswith(b"PAR1"):
+            yield from pa.parquet.ParquetFile(file).iter_batches(batch_size=COLUMNAR_BATCH_SIZE, columns=list(columns))
+            return
+        reader = pa.ipc.open_file(file) if head == ARROW_FILE_MAGIC else pa.ipc.open_stream(file)
+        if head == ARROW_FILE_MAGIC:
+            for i in range(reader.num_record_batches):
+                yield reader.get_batch(i).select(list(columns))
+        else:
+            for batch in reader:
+                yield batch.select(list(columns))
+    except (pa.ArrowInvalid, KeyError) as e:
+        raise ValueError(f"Invalid columnar file (expected columns {', '.join(columns)}): {e}")
+
+
+def _column_rows(pa, batches: Iterator, columns: tuple, types: tuple) -> Iterator[tuple]:
+    # Converte coluna a coluna (cast vetorizado) e gera as tuplas esperadas pela inserção em lote
+    for batch in batches:
+        values = []
+        for name, arrow_type in zip(columns, types):
+            column = batch.column(name)
+            if column.null_count and name not in NULLABLE_COLUMNS:
+                raise ValueError(f"Column {name} must not contain nulls")
+            try:
+                values.append(column.cast(arrow_type).to_pylist())
+            except (pa.ArrowInvalid, pa.ArrowNotImplementedError) as e:
+                raise ValueError(f"Column {name} has an invalid type: {e}")
+        yield from zip(*values)
+
+
+# Função para importar um grafo a partir dos arquivos colunares de nós e arestas, direto para a inserção em lote
+# (uma transação, sem objetos Pydantic por linha)
+def import_graph_columnar(name: str, nodes_file: BinaryIO, edges_file: BinaryIO, db: Session) -> GraphIngestResponse:
+    pa = _pyarrow()
+    try:
+        db_graph = insert_graph(name, db)
+
+        node_rows = _column_rows(pa, _read_batches(pa, nodes_file, NODE_COLUMNS), NODE_COLUMNS, (pa.string(), pa.float64(), pa.float64()))
+        node_id_map = bulk_insert_nodes(db_graph.id, node_rows, db)
+
+        edge_rows = _column_rows(pa, _read_batches(pa, edges_file, EDGE_COLUMNS), EDGE_COLUMNS, (pa.string(), pa.string(), pa.int64()))
+        edge_ids = bulk_insert_edges(db_graph.id, edge_rows, node_id_map, db)
+        derive_edge_weights(db_graph.id, db)
+
+        db.commit()
+        graph_cache.bump_version(db_graph.id)
+
+        return GraphIngestResponse(id=db_graph.id, name=name, nodes_created=len(node_id_map), edges_created=len(edge_ids))
+
+    except IntegrityError as e:
+        db.rollback()
+        raise integrity_error_to_http(e)
+
+    except SQLAlchemyError as e:
+        db.rollback()
+        raise HTTPException(status_code=500, detail=f"A database error occurred while importing the graph: {str(e)}")
+
+    except ValueError as e:
+        db.rollback()
+        raise HTTPException(status_code=400, detail=str(e))
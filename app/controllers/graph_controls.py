@@ -1,61 +1,55 @@
 # app/controllers/graph.py
+from sqlalchemy import delete, func, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 from sqlalchemy.exc import IntegrityError, SQLAlchemyError
-from app.models.graph_models import Graph, Node, Edge
-from app.schemas.graph_schemas import GraphCreate, GraphResponse, NodeResponse, EdgeResponse, GraphDelete, RouteResponse
-from geoalchemy2.shape import to_shape
-from typing import List, Optional
-from fastapi import HTTPException
+from app.models.graph_models import Graph, Node, Edge, RoutingIndex
+from app.schemas.graph_schemas import GraphCreate, GraphResponse, NodeResponse, EdgeResponse, GraphDelete, RouteResponse, RoutePair, ShortestRouteBatchItem, ShortestRouteBatchResponse, NearestNodeResponse, SnappedRouteResponse, RoutingIndexResponse
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+from fastapi import BackgroundTasks, HTTPException, Request, Response
+from fastapi.responses import ORJSONResponse
+import json
+import math
+import threading
+from itertools import islice
 import networkx as nx
-from shapely.geometry import Point
+from app.controllers.graph_cache import graph_cache, CompiledGraph
+from app.controllers.compact_graph import CompactGraph
+from app.core.executor import run_routing
+from app.controllers.route_enumeration import RouteBudget, RouteSelection, route_budgets, select_routes, select_routes_in_process
+from app.controllers.graph_loader import GraphRows, graph_statement, load_graph_rows, load_graph_rows_async
+from app.controllers.graph_ingest import insert_graph, bulk_insert_nodes, bulk_insert_edges, derived_edge_weights, integrity_error_to_http
+from app.db.partitioning import GRAPH_PARTITIONING, drop_graph_partitions
+from app.controllers.routing_index import ROUTING_INDEX_LANDMARKS, build_landmark_index, graph_fingerprint, load_landmark_index
 
 def create_graph(graph: GraphCreate, db: Session) -> GraphResponse:
     try:
-        # Iniciar uma transação
-        db.begin()
+        # A sessão abre a transação automaticamente; tudo abaixo é confirmado em um único commit
 
-        # Primeiro, criar o gráfico
-        db_graph = Graph(name=graph.name)
-        db.add(db_graph)
-        db.commit()
-        db.refresh(db_graph)
-
-        node_id_map = {}  # Mapeamento de nomes de nós para IDs
-
-        # Em seguida, criar os nós
-        for node in graph.nodes:
-            db_node = Node(name=node.name, geom=f'POINT({node.longitude} {node.latitude})', graph_id=db_graph.id)
-            db.add(db_node)
-            db.commit()
-            db.refresh(db_node)
-            node_id_map[node.name] = db_node.id  # Mapeie o nome do nó para o ID gerado
+        # Primeiro, criar o gráfico (flush apenas para obter o ID)
+        db_graph = insert_graph(graph.name, db)
 
-        # Finalmente, criar as arestas
-        for edge in graph.edges:
-            from_node_id = node_id_map.get(edge.from_node_name)  # Use o nome do nó para encontrar o ID correto
-            to_node_id = node_id_map.get(edge.to_node_name)  # Use o nome do nó para encontrar o ID correto
-            if from_node_id is None or to_node_id is None:
-                raise ValueError(f"Invalid node names in edge: {edge.from_node_name} -> {edge.to_node_name}")
+        # Em seguida, criar os nós em lotes (mapeamento de nomes de nós para IDs resolvido em memória)
+        node_id_map = bulk_insert_nodes(db_graph.id, ((n.name, n.longitude, n.latitude) for n in graph.nodes), db)
 
-            db_edge = Edge(graph_id=db_graph.id, from_node_name=edge.from_node_name, to_node_name=edge.to_node_name, weight=edge.weight)
-            db.add(db_edge)
+        # Finalmente, criar as arestas em lotes; as que vieram sem peso recebem o comprimento calculado no banco
+        edge_ids = bulk_insert_edges(db_graph.id, ((e.from_node_name, e.to_node_name, e.weight, e.coordinates) for e in graph.edges), node_id_map, db)
+        weights = derived_edge_weights(db_graph.id, db) if any(e.weight is None for e in graph.edges) else {}
 
         # Commitar a transação ao final
         db.commit()
+        graph_cache.bump_version(db_graph.id)
 
-        # Construir a resposta
-        nodes_response = [NodeResponse(id=n.id, name=n.name, longitude=to_shape(n.geom).x, latitude=to_shape(n.geom).y) for n in db_graph.nodes]
-        edges_response = [EdgeResponse(id=e.id, from_node_name=e.from_node_name, to_node_name=e.to_node_name, weight=e.weight) for e in db_graph.edges]
+        # Construir a resposta a partir dos dados já em memória
+        nodes_response = [NodeResponse(id=node_id_map[n.name], name=n.name, longitude=n.longitude, latitude=n.latitude) for n in graph.nodes]
+        edges_response = [EdgeResponse(id=edge_id, from_node_name=e.from_node_name, to_node_name=e.to_node_name, weight=weights.get(edge_id, e.weight))
+                          for edge_id, e in zip(edge_ids, graph.edges)]
 
-        return GraphResponse(id=db_graph.id, name=db_graph.name, nodes=nodes_response, edges=edges_response)
+        return GraphResponse(id=db_graph.id, name=graph.name, nodes=nodes_response, edges=edges_response)
 
     except IntegrityError as e:
         db.rollback()
-        if "duplicate key value violates unique constraint" in str(e.orig):
-            # Extrair o nome do nó duplicado da mensagem de erro
-            detail = str(e.orig).split("DETAIL:  Key (name)=")[1].split(" already exists.")[0]
-            raise HTTPException(status_code=404, detail=f"Node with name '{detail}' already exists.")
-        raise HTTPException(status_code=400, detail=f"An integrity error occurred while creating the graph: {str(e)}")
+        raise integrity_error_to_http(e)
 
     except SQLAlchemyError as e:
         db.rollback()
@@ -69,321 +63,605 @@ def create_graph(graph: GraphCreate, db: Session) -> GraphResponse:
         db.close()
 
 
-def get_graph(graph_id: int, db: Session) -> GraphResponse:
-    try:
-        # Tentar encontrar o gráfico pelo ID
-        graph = db.query(Graph).filter(Graph.id == graph_id).first()
-        if not graph:
-            raise HTTPException(status_code=404, detail=f"Graph with id {graph_id} not found")
-
-        # Consultar nós e arestas associados ao gráfico
-        nodes = db.query(Node).filter(Node.graph_id == graph_id).all()
-        edges = db.query(Edge).filter(Edge.graph_id == graph_id).all()
-
-        # Construir a resposta para os nós
-        node_responses = [
-            NodeResponse(
-                id=node.id,
-                name=node.name,
-                longitude=to_shape(node.geom).x,
-                latitude=to_shape(node.geom).y
-            ) for node in nodes
-        ]
-
-        # Construir a resposta para as arestas
-        edge_responses = [
-            EdgeResponse(
-                id=edge.id,
-                from_node_name=edge.from_node_name,
-                to_node_name=edge.to_node_name,
-                weight=edge.weight
-            ) for edge in edges
-        ]
-
-        # Retornar a resposta do gráfico completo
-        return GraphResponse(
-            id=graph.id,
-            name=graph.name,
-            nodes=node_responses,
-            edges=edge_responses
-        )
+def update_graph_by_id(graph_id: int, graph: GraphCreate, db: Session) -> GraphResponse:
+    # Substituição completa do grafo (PUT); alterações pontuais usam patch_graph (PATCH)
+    with graph_cache.write_lock(graph_id):
+        try:
+            # Verifica se o gráfico existe
+            existing_graph = db.execute(select(Graph).where(Graph.id == graph_id)).scalar_one_or_none()
+            if not existing_graph:
+                raise HTTPException(status_code=404, detail=f"Graph with id {graph_id} not found")
 
-    except SQLAlchemyError as e:
-        # Capturar erros do SQLAlchemy e retornar uma resposta HTTP 500
-        raise HTTPException(status_code=404, detail=f"A database error occurred while retrieving the graph: {str(e)}")
+            existing_graph.name = graph.name
 
-    except Exception as e:
-        # Capturar outras exceções e retornar uma resposta HTTP 500
-        raise HTTPException(status_code=404, detail=f"An unexpected error occurred: {str(e)}")
+            # Remove as arestas e os nós atuais com um DELETE por tabela e recria tudo pela inserção em lote
+            db.execute(delete(Edge).where(Edge.graph_id == graph_id))
+            db.execute(delete(Node).where(Node.graph_id == graph_id))
+            node_id_map = bulk_insert_nodes(graph_id, ((n.name, n.longitude, n.latitude) for n in graph.nodes), db)
+            edge_ids = bulk_insert_edges(graph_id, ((e.from_node_name, e.to_node_name, e.weight, e.coordinates) for e in graph.edges), node_id_map, db)
+            weights = derived_edge_weights(graph_id, db) if any(e.weight is None for e in graph.edges) else {}
 
+            # Salva as alterações no banco de dados
+            db.commit()
+            graph_cache.bump_version(graph_id)
 
-def update_graph_by_id(graph_id: int, graph: GraphCreate, db: Session) -> GraphResponse:
-    try:
-        # Verifica se o gráfico existe
-        existing_graph = db.query(Graph).filter(Graph.id == graph_id).first()
-        if not existing_graph:
-            raise HTTPException(status_code=404, detail=f"Graph with id {graph_id} not found")
-        
-        # Atualiza o nome do gráfico, se fornecido
-        if graph.name:
-            existing_graph.name = graph.name
-        
-        # Atualiza os nós e arestas do gráfico, se fornecido
-        if graph.nodes:
-            # Remove todos os nós existentes do gráfico
-            existing_graph.nodes.clear()
-            for node in graph.nodes:
-                existing_graph.nodes.append(node)
-
-        if graph.edges:
-            # Remove todas as arestas existentes do gráfico
-            existing_graph.edges.clear()
-            for edge in graph.edges:
-                existing_graph.edges.append(edge)
-
-        # Salva as alterações no banco de dados
-        db.commit()
+            # Retorna a resposta a partir dos dados já em memória
+            nodes_response = [NodeResponse(id=node_id_map[n.name], name=n.name, longitude=n.longitude, latitude=n.latitude) for n in graph.nodes]
+            edges_response = [EdgeResponse(id=edge_id, from_node_name=e.from_node_name, to_node_name=e.to_node_name, weight=weights.get(edge_id, e.weight))
+                              for edge_id, e in zip(edge_ids, graph.edges)]
 
-        # Retorna a resposta atualizada
-        return GraphResponse(
-            id=existing_graph.id,
-            name=existing_graph.name,
-            nodes=existing_graph.nodes,
-            edges=existing_graph.edges
-        )
+            return GraphResponse(id=graph_id, name=graph.name, nodes=nodes_response, edges=edges_response)
 
-    except HTTPException as e:
-        # Re-raise HTTP exceptions to keep their status and detail
-        raise e
+        except HTTPException as e:
+            # Re-raise HTTP exceptions to keep their status and detail
+            db.rollback()
+            raise e
 
-    except SQLAlchemyError as e:
-        # Captura erros do SQLAlchemy e retorna uma resposta HTTP 500
-        raise HTTPException(status_code=500, detail=f"A database error occurred while updating the graph: {str(e)}")
+        except IntegrityError as e:
+            db.rollback()
+            raise integrity_error_to_http(e)
 
-    except Exception as e:
-        # Captura outras exceções e retorna uma resposta HTTP 500
-        raise HTTPException(status_code=500, detail=f"An unexpected error occurred: {str(e)}")
+        except SQLAlchemyError as e:
+            # Captura erros do SQLAlchemy e retorna uma resposta HTTP 500
+            db.rollback()
+            raise HTTPException(status_code=500, detail=f"A database error occurred while updating the graph: {str(e)}")
+
+        except ValueError as e:
+            db.rollback()
+            raise HTTPException(status_code=400, detail=str(e))
 
 
 def delete_graph_by_id(graph_id: int, db: Session) -> GraphDelete:
-    try:
-        # Tentar encontrar o gráfico pelo ID
-        graph = db.query(Graph).filter(Graph.id == graph_id).first()
-        if not graph:
-            raise HTTPException(status_code=404, detail=f"Graph with id {graph_id} not found")
-
-        # Consultar nós e arestas associados ao gráfico
-        nodes = db.query(Node).filter(Node.graph_id == graph_id).all()
-        edges = db.query(Edge).filter(Edge.graph_id == graph_id).all()
-
-        # Deletar arestas
-        for edge in edges:
-            db.delete(edge)
+    with graph_cache.write_lock(graph_id):
+        try:
+            # Tentar encontrar o gráfico pelo ID
+            graph = db.execute(graph_statement(graph_id)).first()
+            if not graph:
+                raise HTTPException(status_code=404, detail=f"Graph with id {graph_id} not found")
+
+            # Um DELETE por tabela (arestas, nós, índice de rotas e o próprio grafo), todos na mesma transação.
+            # Com particionamento por lista, nós e arestas saem antes, com o descarte das partições do grafo fora da
+            # transação; se ele falhar, o grafo continua registrado e a remoção pode ser repetida
+            if GRAPH_PARTITIONING == "list":
+                nodes_deleted, edges_deleted = drop_graph_partitions(graph_id, db.get_bind())
+            else:
+                edges_deleted = db.execute(delete(Edge).where(Edge.graph_id == graph_id)).rowcount
+                nodes_deleted = db.execute(delete(Node).where(Node.graph_id == graph_id)).rowcount
+            db.execute(delete(RoutingIndex).where(RoutingIndex.graph_id == graph_id))
+            db.execute(delete(Graph).where(Graph.id == graph_id))
             db.commit()
+            graph_cache.bump_version(graph_id)
+
+            # Retornar apenas as contagens do que foi removido
+            return GraphDelete(
+                id=graph.id,
+                name=graph.name,
+                message="Graph deleted successfully",
+                nodes_deleted=nodes_deleted,
+                edges_deleted=edges_deleted
+            )
+
+        except HTTPException as e:
+            raise e
+
+        except SQLAlchemyError as e:
+            # Capturar erros do SQLAlchemy e retornar uma resposta HTTP 500
+            db.rollback()
+            raise HTTPException(status_code=500, detail=f"A database error occurred while deleting the graph: {str(e)}")
+
+        except Exception as e:
+            # Capturar outras exceções e retornar uma resposta HTTP 500
+            db.rollback()
+            raise HTTPException(status_code=404, detail=f"An unexpected error occurred: {str(e)}")
+
+
+# Remoção em segundo plano (grafos muito grandes): a requisição apenas agenda, com sessão própria criada por session_factory
+def delete_graph_in_background(graph_id: int, session_factory: Callable[[], Session]) -> None:
+    db = session_factory()
+    try:
+        delete_graph_by_id(graph_id, db)
+    except HTTPException:
+        # Grafo já removido por outra requisição
+        pass
+    finally:
+        db.close()
 
-        # Deletar nós
-        for node in nodes:
-            db.delete(node)
-            db.commit()
 
-        # Deletar o gráfico
-        db.delete(graph)
-        db.commit()
+# Agenda a remoção de um grafo; a resposta (202) sai antes de as linhas serem apagadas
+def schedule_graph_deletion(graph_id: int, background_tasks: BackgroundTasks, db: Session,
+                            session_factory: Callable[[], Session]) -> GraphDelete:
+    graph = db.execute(graph_statement(graph_id)).first()
+    if not graph:
+        raise HTTPException(status_code=404, detail=f"Graph with id {graph_id} not found")
 
-        # Retornar a resposta do gráfico deletado
-        return GraphDelete(
-            id=graph.id,
-            name=graph.name,
-            nodes=[NodeResponse(
-                id=node.id,
-                name=node.name,
-                longitude=to_shape(node.geom).x,
-                latitude=to_shape(node.geom).y
-            ) for node in nodes],
-            edges=[EdgeResponse(
-                id=edge.id,
-                from_node_name=edge.from_node_name,
-                to_node_name=edge.to_node_name,
-                weight=edge.weight
-            ) for edge in edges]
-        )
+    background_tasks.add_task(delete_graph_in_background, graph_id, session_factory)
+    return GraphDelete(id=graph.id, name=graph.name, message="Graph deletion scheduled")
 
-    except SQLAlchemyError as e:
-        # Capturar erros do SQLAlchemy e retornar uma resposta HTTP 500
-        raise HTTPException(status_code=500, detail=f"A database error occurred while deleting the graph: {str(e)}")
 
-    except Exception as e:
-        # Capturar outras exceções e retornar uma resposta HTTP 500
-        raise HTTPException(status_code=404, detail=f"An unexpected error occurred: {str(e)}")
-
-
-# Função para criar o grafo networkx a partir dos dados do banco de dados
-def create_networkx_graph(graph_id: int, db: Session) -> nx.DiGraph:
-    graph = nx.DiGraph()
-    
-    nodes = db.query(Node).filter(Node.graph_id == graph_id).all()
-    edges = db.query(Edge).filter(Edge.graph_id == graph_id).all()
-    
-    for node in nodes:
-        graph.add_node(node.name, pos=(node.longitude, node.latitude))
-    
-    for edge in edges:
-        graph.add_edge(edge.from_node_name, edge.to_node_name, weight=edge.weight)
-    
-    return graph
+# Consulta do índice de rotas persistido, carregado junto do grafo compilado
+def routing_index_statement(graph_id: int):
+    return select(RoutingIndex.fingerprint, RoutingIndex.data).where(RoutingIndex.graph_id == graph_id)
+
+
+def compile_graph(graph_id: int, version: int, rows: GraphRows, index_row=None) -> CompiledGraph:
+    # As coordenadas já vêm do SQL; as rotas consultam apenas a tabela de nós do grafo compilado
+    compact = CompactGraph.from_rows(rows.nodes, ((from_node_name, to_node_name, weight) for _, from_node_name, to_node_name, weight in rows.edges))
+    # O índice de rotas persistido só é aproveitado se foi gerado a partir deste mesmo grafo
+    landmarks = load_landmark_index(compact, *index_row) if index_row is not None else None
+    return CompiledGraph(graph_id=graph_id, version=version, name=rows.name, graph=compact, landmarks=landmarks)
+
+
+# Função para carregar o grafo compilado usado nas rotas, reaproveitando o cache enquanto a versão não mudar
+def load_compiled_graph(graph_id: int, db: Session) -> CompiledGraph:
+    def build(version: int) -> CompiledGraph:
+        rows = load_graph_rows(graph_id, db)
+        if rows is None:
+            raise HTTPException(status_code=404, detail="Graph not found")
+
+        return compile_graph(graph_id, version, rows, db.execute(routing_index_statement(graph_id)).first())
+
+    return graph_cache.get_or_build(graph_id, build)
+
+
+# Versão assíncrona do carregador: consultas via asyncpg e compilação (CPU) no executor de rotas
+async def load_compiled_graph_async(graph_id: int, db: AsyncSession) -> CompiledGraph:
+    async def build(version: int) -> CompiledGraph:
+        rows = await load_graph_rows_async(graph_id, db)
+        if rows is None:
+            raise HTTPException(status_code=404, detail="Graph not found")
+
+        index_row = (await db.execute(routing_index_statement(graph_id))).first()
+        return await run_routing(compile_graph, graph_id, version, rows, index_row)
+
+    return await graph_cache.get_or_build_async(graph_id, build)
+
+
+# Converte um caminho (índices CSR) na lista de nós da resposta, por consulta direta à tabela de nós
+def materialize_route(G: CompactGraph, path: List[int]) -> List[NodeResponse]:
+    ids, names, longitudes, latitudes = G.node_rows(path)
+    return [
+        NodeResponse.model_construct(id=node_id, name=name, longitude=longitude, latitude=latitude)
+        for node_id, name, longitude, latitude in zip(ids, names, longitudes, latitudes)
+    ]
  
 
-def find_all_routes(graph_id: int, start_node: str, end_node: str, max_stops: Optional[int], db: Session) -> List[RouteResponse]:
+# Cursor de paginação das rotas: versão do grafo + índices do último caminho entregue
+def encode_route_cursor(version: int, path: List[int]) -> str:
+    return f"{version}:" + ".".join(str(i) for i in path)
+
+
+def decode_route_cursor(cursor: str, version: int) -> List[int]:
     try:
-        # Busca o grafo no banco de dados
-        graph = db.query(Graph).filter(Graph.id == graph_id).first()
-        if not graph:
-            raise HTTPException(status_code=404, detail="Graph not found")
+        cursor_version, path = cursor.split(":", 1)
+        cursor_version = int(cursor_version)
+        path = [int(i) for i in path.split(".")]
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    if cursor_version != version:
+        raise HTTPException(status_code=409, detail="The graph changed since the cursor was issued; restart the pagination")
+    return path
+
+
+# Converte os nomes dos nós e o cursor da consulta em índices CSR
+def resolve_route_query(compiled: CompiledGraph, start_node: str, end_node: str, cursor: Optional[str] = None) -> Tuple[int, int, Optional[List[int]]]:
+    G = compiled.graph
+    source = G.node_index(start_node)
+    target = G.node_index(end_node)
+    resume_after = decode_route_cursor(cursor, compiled.version) if cursor else None
+    return source, target, resume_after
+
+
+# Gera os caminhos (índices CSR) e seus custos entre dois nós, com max_stops e max_cost aplicados como poda da própria busca.
+# Com k, usa o k-shortest-paths: no máximo k rotas, em ordem crescente de custo
+def iter_route_paths(compiled: CompiledGraph, start_node: str, end_node: str, max_stops: Optional[int], cursor: Optional[str] = None,
+                     max_cost: Optional[int] = None, k: Optional[int] = None,
+                     should_stop: Optional[Callable[[], bool]] = None) -> Iterator[Tuple[List[int], int]]:
+    G = compiled.graph
+
+    if k is not None:
+        if max_stops is not None or cursor:
+            raise HTTPException(status_code=400, detail="k cannot be combined with max_stops or cursor")
+        return G.k_shortest_paths(G.node_index(start_node), G.node_index(end_node), k, max_cost=max_cost)
+
+    source, target, resume_after = resolve_route_query(compiled, start_node, end_node, cursor)
+    try:
+        return G.all_simple_paths_with_costs(source, target, cutoff=max_stops, resume_after=resume_after, max_cost=max_cost,
+                                             should_stop=should_stop)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
 
-        # Busca todos os nós e arestas do grafo
-        nodes = db.query(Node).filter(Node.graph_id == graph_id).all()
-        edges = db.query(Edge).filter(Edge.graph_id == graph_id).all()
-
-        # Cria um grafo direcionado com NetworkX
-        G = nx.DiGraph()
-
-        # Adiciona os nós ao grafo NetworkX
-        for node in nodes:
-            point: Point = to_shape(node.geom)
-            G.add_node(node.name, id=node.id, longitude=point.x, latitude=point.y)
-
-        # Adiciona as arestas ao grafo NetworkX
-        for edge in edges:
-            G.add_edge(edge.from_node_name, edge.to_node_name, weight=edge.weight)
-
-        all_routes = []
-
-        # Verifica se deve considerar um limite de paradas
-        if max_stops is not None:
-            for path in nx.all_simple_paths(G, source=start_node, target=end_node):
-                if len(path) - 1 <= max_stops:
-                    route = []
-                    for node_name in path:
-                        node = next((n for n in nodes if n.name == node_name), None)
-                        if node:
-                            point: Point = to_shape(node.geom)
-                            route.append(NodeResponse(id=node.id, name=node.name, longitude=point.x, latitude=point.y))
-                    all_routes.append(RouteResponse(route=route))
-        else:
-            for path in nx.all_simple_paths(G, source=start_node, target=end_node):
-                route = []
-                for node_name in path:
-                    node = next((n for n in nodes if n.name == node_name), None)
-                    if node:
-                        point: Point = to_shape(node.geom)
-                        route.append(NodeResponse(id=node.id, name=node.name, longitude=point.x, latitude=point.y))
-                all_routes.append(RouteResponse(route=route))
 
-        return all_routes
+# Monta a resposta de uma rota com o custo total e a quantidade de arestas já conhecidos pela busca
+def build_route_response(G: CompactGraph, path: List[int], cost: int) -> RouteResponse:
+    return RouteResponse(route=materialize_route(G, path), cost=cost, hops=len(path) - 1)
+
+
+# Função para enumerar as rotas entre dois nós do grafo compilado, com paginação, filtro por custo ou k menores rotas
+def all_routes_for_graph(compiled: CompiledGraph, start_node: str, end_node: str, max_stops: Optional[int],
+                         limit: Optional[int] = None, cursor: Optional[str] = None, response: Optional[Response] = None,
+                         max_cost: Optional[int] = None, order_by: Optional[str] = None, k: Optional[int] = None,
+                         time_budget: Optional[float] = None, max_routes: Optional[int] = None) -> List[RouteResponse]:
+    try:
+        G = compiled.graph
+
+        if k is not None:
+            # O k-shortest-paths já entrega as rotas em ordem de custo e limitado a k
+            paths = iter_route_paths(compiled, start_node, end_node, max_stops, cursor, max_cost=max_cost, k=k)
+            return [build_route_response(G, path, cost) for path, cost in islice(paths, limit)]
+
+        source, target, resume_after = route_query_for_enumeration(compiled, start_node, end_node, cursor, order_by)
+        time_budget, max_routes = route_budgets(time_budget, max_routes)
+        selection = select_routes(G, source, target, cutoff=max_stops, resume_after=resume_after, max_cost=max_cost,
+                                  order_by=order_by, limit=limit, max_routes=max_routes, time_budget=time_budget)
+        return route_selection_response(compiled, selection, response)
 
     except HTTPException as e:
         raise e
+    except nx.NodeNotFound as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"An unexpected error occurred: {str(e)}")
-    
 
-# Função para encontrar a menor rota possível entre dois pontos
-def find_shortest_route(graph_id: int, start_node: str, end_node: str, db: Session) -> RouteResponse:
+
+# Versão assíncrona: a enumeração (exponencial) roda no pool de processos de rotas, com orçamento de tempo/rotas,
+# e é cancelada se o cliente desconectar. O k-shortest-paths, limitado a k rotas, continua no executor de threads
+async def all_routes_for_graph_async(compiled: CompiledGraph, start_node: str, end_node: str, max_stops: Optional[int],
+                                     limit: Optional[int] = None, cursor: Optional[str] = None, response: Optional[Response] = None,
+                                     max_cost: Optional[int] = None, order_by: Optional[str] = None, k: Optional[int] = None,
+                                     time_budget: Optional[float] = None, max_routes: Optional[int] = None,
+                                     request: Optional[Request] = None) -> List[RouteResponse]:
+    if k is not None:
+        return await run_routing(all_routes_for_graph, compiled, start_node, end_node, max_stops, limit=limit, cursor=cursor,
+                                 response=response, max_cost=max_cost, k=k)
+
     try:
-        # Busca o grafo no banco de dados
-        graph = db.query(Graph).filter(Graph.id == graph_id).first()
-        if not graph:
-            raise HTTPException(status_code=404, detail="Graph not found")
+        source, target, resume_after = route_query_for_enumeration(compiled, start_node, end_node, cursor, order_by)
+        time_budget, max_routes = route_budgets(time_budget, max_routes)
+        selection = await select_routes_in_process(compiled, source, target, request=request, cutoff=max_stops, resume_after=resume_after,
+                                                   max_cost=max_cost, order_by=order_by, limit=limit, max_routes=max_routes,
+                                                   time_budget=time_budget)
+    except HTTPException as e:
+        raise e
+    except nx.NodeNotFound as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"An unexpected error occurred: {str(e)}")
 
-        # Busca todos os nós e arestas do grafo
-        nodes = db.query(Node).filter(Node.graph_id == graph_id).all()
-        edges = db.query(Edge).filter(Edge.graph_id == graph_id).all()
+    return await run_routing(route_selection_response, compiled, selection, response)
 
-        # Cria um grafo direcionado com NetworkX
-        G = nx.DiGraph()
 
-        # Adiciona os nós ao grafo NetworkX
-        for node in nodes:
-            point: Point = to_shape(node.geom)
-            G.add_node(node.name, id=node.id, longitude=point.x, latitude=point.y)
+def route_query_for_enumeration(compiled: CompiledGraph, start_node: str, end_node: str, cursor: Optional[str],
+                                order_by: Optional[str]) -> Tuple[int, int, Optional[List[int]]]:
+    # A ordenação exige percorrer todas as rotas, então não é paginada por cursor
+    if order_by == "cost" and cursor:
+        raise HTTPException(status_code=400, detail="cursor cannot be combined with order_by=cost")
+    return resolve_route_query(compiled, start_node, end_node, cursor)
 
-        # Adiciona as arestas ao grafo NetworkX
-        for edge in edges:
-            G.add_edge(edge.from_node_name, edge.to_node_name, weight=edge.weight)
 
-        # Encontra o caminho mais curto usando Bellman-Ford
-        shortest_path = nx.dijkstra_path(G, source=start_node, target=end_node)
-        
-        # Cria a resposta da rota
-        route = []
-        for node_name in shortest_path:
-            node = next((n for n in nodes if n.name == node_name), None)
-            if node:
-                point: Point = to_shape(node.geom)
-                route.append(NodeResponse(id=node.id, name=node.name, longitude=point.x, latitude=point.y))
+# Materializa as rotas selecionadas; X-Next-Cursor indica que há mais rotas e X-Routes-Truncated que a busca
+# foi interrompida pelo orçamento de tempo/rotas ou por cancelamento
+def route_selection_response(compiled: CompiledGraph, selection: RouteSelection, response: Optional[Response] = None) -> List[RouteResponse]:
+    if response is not None:
+        if selection.next_after is not None:
+            response.headers["X-Next-Cursor"] = encode_route_cursor(compiled.version, selection.next_after)
+        if selection.truncated:
+            response.headers["X-Routes-Truncated"] = "true"
+    return [build_route_response(compiled.graph, path, cost) for path, cost in selection.routes]
 
-        return RouteResponse(route=route)
 
-    except nx.NetworkXNoPath:
-        raise HTTPException(status_code=404, detail="No path found between the specified nodes")
+# Função para enviar as rotas em NDJSON conforme são encontradas, sem acumulá-las em memória
+def stream_routes_for_graph(compiled: CompiledGraph, start_node: str, end_node: str, max_stops: Optional[int],
+                            limit: Optional[int] = None, cursor: Optional[str] = None, max_cost: Optional[int] = None,
+                            k: Optional[int] = None, time_budget: Optional[float] = None,
+                            cancelled: Optional[Callable[[], bool]] = None) -> Iterator[bytes]:
+    # A enumeração para ao esgotar o orçamento de tempo ou quando cancelled() indicar que o cliente desconectou
+    budget = RouteBudget(route_budgets(time_budget)[0], cancelled) if k is None else None
 
+    # A validação acontece antes do início da resposta, para que erros virem respostas HTTP
+    try:
+        paths = iter_route_paths(compiled, start_node, end_node, max_stops, cursor, max_cost=max_cost, k=k, should_stop=budget)
     except nx.NodeNotFound as e:
         raise HTTPException(status_code=404, detail=str(e))
 
+    if k is not None:
+        # Rotas do k-shortest-paths não são paginadas por cursor: limit apenas encurta a lista
+        paths, limit = islice(paths, limit), None
+
+    G = compiled.graph
+
+    def generate() -> Iterator[bytes]:
+        sent = 0
+        last_path = None
+        for path, cost in paths:
+            if limit is not None and sent >= limit:
+                yield (json.dumps({"next_cursor": encode_route_cursor(compiled.version, last_path)}) + "\n").encode()
+                return
+            yield (build_route_response(G, path, cost).model_dump_json() + "\n").encode()
+            sent += 1
+            last_path = path
+
+        if budget is not None and budget.exceeded:
+            # Busca interrompida: a última linha sinaliza o truncamento e, se possível, o cursor para continuar
+            next_cursor = encode_route_cursor(compiled.version, last_path) if last_path is not None else cursor
+            yield (json.dumps({"truncated": True, "next_cursor": next_cursor}) + "\n").encode()
+
+    return generate()
+
+
+# Calcula os menores caminhos de vários pares agrupando-os por origem: uma única árvore de Dijkstra atende todos os destinos da mesma origem.
+# Devolve, para cada par, (índices do caminho, custo) ou a exceção do networkx que explica a falha
+def shortest_paths_for_pairs(G: CompactGraph, pairs: List[Tuple[str, str]]) -> list:
+    results = [None] * len(pairs)
+    by_source: Dict[int, List[Tuple[int, int]]] = {}
+
+    for position, (start_node, end_node) in enumerate(pairs):
+        try:
+            source = G.node_index(start_node)
+            target = G.node_index(end_node)
+        except nx.NodeNotFound as e:
+            results[position] = e
+            continue
+        by_source.setdefault(source, []).append((position, target))
+
+    for source, requests in by_source.items():
+        dist, pred = G.dijkstra_tree(source, [target for _, target in requests])
+        for position, target in requests:
+            if target in dist:
+                results[position] = (G.tree_path(pred, source, target), dist[target])
+            else:
+                results[position] = nx.NetworkXNoPath(f"No path between {G.names[source]} and {G.names[target]}.")
+
+    return results
+
+
+# Função para encontrar as menores rotas de vários pares origem/destino em uma única chamada
+def shortest_routes_for_graph(compiled: CompiledGraph, pairs: List[RoutePair]) -> ShortestRouteBatchResponse:
+    try:
+        G = compiled.graph
+
+        items = []
+        results = shortest_paths_for_pairs(G, [(pair.start_node, pair.end_node) for pair in pairs])
+        for pair, result in zip(pairs, results):
+            if isinstance(result, nx.NetworkXNoPath):
+                items.append(ShortestRouteBatchItem(start_node=pair.start_node, end_node=pair.end_node, error="No path found between the specified nodes"))
+            elif isinstance(result, Exception):
+                items.append(ShortestRouteBatchItem(start_node=pair.start_node, end_node=pair.end_node, error=str(result)))
+            else:
+                path, cost = result
+                items.append(ShortestRouteBatchItem(start_node=pair.start_node, end_node=pair.end_node, route=materialize_route(G, path), cost=cost, hops=len(path) - 1))
+
+        return ShortestRouteBatchResponse(routes=items)
+
+    except HTTPException as e:
+        raise e
+
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"An unexpected error occurred: {str(e)}")
 
 
-# Função para demonstrar o custo computacional de encontrar todas as rotas possíveis
-def compute_all_routes(graph_id: int, start_node: str, end_node: str, max_stops: Optional[int], db: Session) -> List[RouteResponse]:
+# Função para calcular a matriz de custos entre um conjunto de origens e um de destinos em uma única passada
+def distance_matrix_for_graph(compiled: CompiledGraph, sources: List[str], targets: List[str]) -> ORJSONResponse:
     try:
-        # Busca o grafo no banco de dados
-        graph = db.query(Graph).filter(Graph.id == graph_id).first()
-        if not graph:
-            raise HTTPException(status_code=404, detail="Graph not found")
+        G = compiled.graph
+
+        matrix = G.distance_matrix([G.node_index(name) for name in sources], [G.node_index(name) for name in targets])
+
+        # Resposta compacta (listas de custos, null quando não há caminho), serializada sem passar por modelos Pydantic
+        costs = [[None if cost == math.inf else int(cost) for cost in row] for row in matrix.tolist()]
+        return ORJSONResponse({"sources": sources, "targets": targets, "costs": costs})
+
+    except HTTPException as e:
+        raise e
+
+    except nx.NodeNotFound as e:
+        raise HTTPException(status_code=404, detail=str(e))
+
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"An unexpected error occurred: {str(e)}")
 
-        # Busca todos os nós e arestas do grafo
-        nodes = db.query(Node).filter(Node.graph_id == graph_id).all()
-        edges = db.query(Edge).filter(Edge.graph_id == graph_id).all()
-
-        # Cria um grafo direcionado com NetworkX
-        G = nx.DiGraph()
-
-        # Adiciona os nós ao grafo NetworkX
-        for node in nodes:
-            point: Point = to_shape(node.geom)
-            G.add_node(node.name, id=node.id, longitude=point.x, latitude=point.y)
-
-        # Adiciona as arestas ao grafo NetworkX
-        for edge in edges:
-            G.add_edge(edge.from_node_name, edge.to_node_name, weight=edge.weight)
-
-        all_routes = []
-
-        # Verifica se deve considerar um limite de paradas
-        if max_stops is not None:
-            for path in nx.all_simple_paths(G, source=start_node, target=end_node):
-                if len(path) - 1 <= max_stops:
-                    route = []
-                    for node_name in path:
-                        node = next((n for n in nodes if n.name == node_name), None)
-                        if node:
-                            point: Point = to_shape(node.geom)
-                            route.append(NodeResponse(id=node.id, name=node.name, longitude=point.x, latitude=point.y))
-                    all_routes.append(RouteResponse(route=route))
+
+# Menor rota entre dois nós por Dijkstra, A* (heurística de distância geográfica até o destino) ou ALT (landmarks).
+# Sem algoritmo informado, usa o índice ALT do grafo quando existir. Com corridor_m, a busca fica restrita aos nós
+# a até essa distância (m) do segmento entre origem e destino. A resposta informa o algoritmo usado
+# e quantos nós foram expandidos, para comparação
+def shortest_route_for_graph(compiled: CompiledGraph, start_node: str, end_node: str, algorithm: Optional[str] = None,
+                             heuristic_scale: Optional[float] = None, corridor_m: Optional[float] = None) -> RouteResponse:
+    try:
+        G = compiled.graph
+        source = G.node_index(start_node)
+        target = G.node_index(end_node)
+        allowed = G.corridor_mask(source, target, corridor_m) if corridor_m is not None else None
+
+        if algorithm is None:
+            algorithm = "alt" if compiled.landmarks is not None else "dijkstra"
+
+        if algorithm == "alt":
+            if compiled.landmarks is None:
+                raise HTTPException(status_code=400, detail="The graph has no routing index; build it first")
+            shortest_path, cost, expanded = G.alt_path(source, target, compiled.landmarks, allowed)
+        elif algorithm == "astar":
+            shortest_path, cost, expanded = G.astar_path(source, target, heuristic_scale, allowed)
         else:
-            for path in nx.all_simple_paths(G, source=start_node, target=end_node):
-                route = []
-                for node_name in path:
-                    node = next((n for n in nodes if n.name == node_name), None)
-                    if node:
-                        point: Point = to_shape(node.geom)
-                        route.append(NodeResponse(id=node.id, name=node.name, longitude=point.x, latitude=point.y))
-                all_routes.append(RouteResponse(route=route))
+            # Dijkstra sobre a representação CSR, interrompido ao fixar o destino
+            dist, pred = G.dijkstra_tree(source, [target], allowed=allowed)
+            if target not in dist:
+                raise nx.NetworkXNoPath(f"No path between {start_node} and {end_node}.")
+            shortest_path, cost, expanded = G.tree_path(pred, source, target), dist[target], len(dist)
 
-        return all_routes
+        # Cria a resposta da rota (o custo vem da própria busca)
+        return RouteResponse(route=materialize_route(G, shortest_path), cost=cost, hops=len(shortest_path) - 1,
+                             algorithm=algorithm, nodes_expanded=expanded)
 
     except HTTPException as e:
         raise e
+
+    except nx.NetworkXNoPath:
+        detail = "No path found between the specified nodes"
+        raise HTTPException(status_code=404, detail=detail if corridor_m is None else f"{detail} within a {corridor_m} m corridor")
+
+    except nx.NodeNotFound as e:
+        raise HTTPException(status_code=404, detail=str(e))
+
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"An unexpected error occurred: {str(e)}")
+
+
+# Constrói (ou reconstrói) o índice ALT de um grafo e o persiste em routing_indexes. Executada em segundo plano,
+# com sessão própria criada por session_factory; o grafo em cache passa a usar o índice assim que ele fica pronto
+def build_routing_index(graph_id: int, session_factory: Callable[[], Session], landmarks: int = ROUTING_INDEX_LANDMARKS) -> None:
+    db = session_factory()
+    try:
+        compiled = load_compiled_graph(graph_id, db)
+        index = build_landmark_index(compiled.graph, landmarks)
+
+        row = db.get(RoutingIndex, graph_id) or RoutingIndex(graph_id=graph_id)
+        row.kind = "alt"
+        row.landmarks = len(index.landmarks)
+        row.fingerprint = index.fingerprint
+        row.data = index.to_bytes()
+        db.add(row)
+        db.commit()
+
+        compiled.landmarks = index
+    except HTTPException:
+        # Grafo removido antes da construção
+        db.rollback()
+    finally:
+        db.close()
+
+
+# Grafos com reconstrução do índice em andamento -> se outra alteração pediu nova reconstrução enquanto isso
+_index_rebuilds: Dict[int, bool] = {}
+_index_rebuilds_lock = threading.Lock()
+
+
+# Reconstrói o índice apenas para grafos que já optaram por ele (chamada após alterações no grafo). Pedidos feitos
+# durante uma reconstrução do mesmo grafo não disputam o executor: viram uma única nova passada ao final dela
+def rebuild_routing_index_if_present(graph_id: int, session_factory: Callable[[], Session]) -> None:
+    with _index_rebuilds_lock:
+        if graph_id in _index_rebuilds:
+            _index_rebuilds[graph_id] = True
+            return
+        _index_rebuilds[graph_id] = False
+
+    try:
+        while True:
+            refresh_routing_index(graph_id, session_factory)
+            with _index_rebuilds_lock:
+                if not _index_rebuilds[graph_id]:
+                    del _index_rebuilds[graph_id]
+                    return
+                _index_rebuilds[graph_id] = False
+    except Exception:
+        with _index_rebuilds_lock:
+            _index_rebuilds.pop(graph_id, None)
+        raise
+
+
+# Atualiza o índice persistido para a versão atual do grafo. Se o grafo em cache ainda tem landmarks (alterações
+# desde a última construção foram só aumentos de peso, ver reweight_compiled_graph), o índice continua válido e
+# basta gravar a nova impressão digital; caso contrário, o índice é reconstruído
+def refresh_routing_index(graph_id: int, session_factory: Callable[[], Session]) -> None:
+    with session_factory() as db:
+        row = db.execute(select(RoutingIndex.landmarks).where(RoutingIndex.graph_id == graph_id)).first()
+        if row is None:
+            return
+
+        compiled = graph_cache.get(graph_id)
+        if compiled is not None and compiled.landmarks is not None:
+            landmarks = compiled.landmarks
+            fingerprint = graph_fingerprint(compiled.graph)
+            if fingerprint == landmarks.fingerprint:
+                return
+            result = db.execute(
+                update(RoutingIndex)
+                .where(RoutingIndex.graph_id == graph_id, RoutingIndex.fingerprint == landmarks.fingerprint)
+                .values(fingerprint=fingerprint)
+            )
+            db.commit()
+            if result.rowcount:
+                landmarks.fingerprint = fingerprint
+                return
+
+    build_routing_index(graph_id, session_factory, row.landmarks)
+
+
+# Situação do índice de rotas de um grafo: ativo (válido para a versão em cache), desatualizado, desconhecido ou inexistente
+async def get_routing_index_status(graph_id: int, db: AsyncSession) -> RoutingIndexResponse:
+    row = (await db.execute(
+        select(RoutingIndex.kind, RoutingIndex.landmarks, RoutingIndex.fingerprint, func.length(RoutingIndex.data))
+        .where(RoutingIndex.graph_id == graph_id)
+    )).first()
+    if row is None:
+        if (await db.execute(select(Graph.id).where(Graph.id == graph_id))).first() is None:
+            raise HTTPException(status_code=404, detail="Graph not found")
+        return RoutingIndexResponse(graph_id=graph_id, status="missing")
+
+    # O status é respondido sem compilar o grafo: compara a impressão digital gravada com a da versão em cache.
+    # Sem o grafo em cache não há com o que comparar, e o índice é validado na próxima consulta de rota
+    compiled = graph_cache.get(graph_id)
+    if compiled is None:
+        status = "unknown"
+    else:
+        active = await run_routing(graph_fingerprint, compiled.graph) == row.fingerprint
+        status = "active" if active else "stale"
+    return RoutingIndexResponse(graph_id=graph_id, status=status, kind=row.kind, landmarks=row.landmarks,
+                                fingerprint=row.fingerprint, size_bytes=row[3])
+
+
+# Nós mais próximos de uma coordenada, usando o índice espacial (STRtree) do grafo compilado
+def nearest_nodes_for_graph(compiled: CompiledGraph, longitude: float, latitude: float, k: int = 1) -> List[NearestNodeResponse]:
+    G = compiled.graph
+    nearest = G.nearest_nodes(longitude, latitude, k)
+    nodes = materialize_route(G, [index for index, _ in nearest])
+    return [NearestNodeResponse(node=node, distance_m=distance) for node, (_, distance) in zip(nodes, nearest)]
+
+
+# Busca KNN no banco: o índice GiST de nodes.geom atende a ordenação pelo operador <->
+async def nearest_nodes_from_db(graph_id: int, longitude: float, latitude: float, k: int, db: AsyncSession) -> List[NearestNodeResponse]:
+    point = func.ST_SetSRID(func.ST_MakePoint(longitude, latitude), 4326)
+    stmt = (
+        select(Node.id, Node.name, func.ST_X(Node.geom), func.ST_Y(Node.geom), func.ST_DistanceSphere(Node.geom, point))
+        .where(Node.graph_id == graph_id)
+        .order_by(Node.geom.op("<->")(point))
+        .limit(k)
+    )
+    rows = (await db.execute(stmt)).all()
+    if not rows and (await db.execute(select(Graph.id).where(Graph.id == graph_id))).first() is None:
+        raise HTTPException(status_code=404, detail="Graph not found")
+
+    return [
+        NearestNodeResponse(node=NodeResponse(id=node_id, name=name, longitude=x, latitude=y), distance_m=distance)
+        for node_id, name, x, y, distance in rows
+    ]
+
+
+# Função para encontrar os nós mais próximos de uma coordenada: em memória se o grafo estiver em cache,
+# senão pelo banco, sem compilar o grafo inteiro apenas para uma consulta pontual. A consulta em memória roda no
+# executor de rotas: a primeira de cada versão do grafo constrói o STRtree
+async def find_nearest_nodes(graph_id: int, longitude: float, latitude: float, k: int, db: AsyncSession) -> List[NearestNodeResponse]:
+    compiled = graph_cache.get(graph_id)
+    if compiled is not None:
+        return await run_routing(nearest_nodes_for_graph, compiled, longitude, latitude, k)
+    return await nearest_nodes_from_db(graph_id, longitude, latitude, k, db)
+
+
+# Menor rota entre duas coordenadas: cada ponto é ligado ao nó mais próximo do grafo antes do Dijkstra
+def shortest_route_by_coordinates_for_graph(compiled: CompiledGraph, start_longitude: float, start_latitude: float,
+                                            end_longitude: float, end_latitude: float, max_distance_m: Optional[float] = None,
+                                            algorithm: Optional[str] = None, heuristic_scale: Optional[float] = None,
+                                            corridor_m: Optional[float] = None) -> SnappedRouteResponse:
+    snaps = []
+    for longitude, latitude in ((start_longitude, start_latitude), (end_longitude, end_latitude)):
+        nearest = nearest_nodes_for_graph(compiled, longitude, latitude)
+        if not nearest or (max_distance_m is not None and nearest[0].distance_m > max_distance_m):
+            raise HTTPException(status_code=404, detail=f"No node found near ({longitude}, {latitude})")
+        snaps.append(nearest[0])
+
+    start_snap, end_snap = snaps
+    route = shortest_route_for_graph(compiled, start_snap.node.name, end_snap.node.name, algorithm, heuristic_scale, corridor_m)
+    return SnappedRouteResponse(**dict(route), start_snap=start_snap, end_snap=end_snap)
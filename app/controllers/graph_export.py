@@ -0,0 +1,142 @@
+# Arquivo responsável pela exportação rápida de grafos: as linhas saem do cursor do banco direto para
+# JSON/NDJSON (orjson) ou MessagePack, em lotes, sem criar um objeto Pydantic por nó ou aresta
+
+import os
+from typing import Callable, Iterator, List, Optional, Tuple
+
+import orjson
+from fastapi import HTTPException
+from fastapi.responses import StreamingResponse
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session
+
+from app.models.graph_models import Node, Edge
+from app.controllers.graph_loader import graph_statement, nodes_statement, edges_statement
+
+# MessagePack é opcional: sem a biblioteca o formato simplesmente não é oferecido na negociação
+try:
+    import msgpack
+except ImportError:  # pragma: no cover
+    msgpack = None
+
+
+# Linhas lidas do cursor do servidor por lote
+EXPORT_BATCH_SIZE = int(os.environ.get("EXPORT_BATCH_SIZE", 5000))
+
+JSON = "application/json"
+NDJSON = "application/x-ndjson"
+MSGPACK = "application/msgpack"
+
+# Tipos aceitos no cabeçalho Accept e o formato correspondente
+GRAPH_MEDIA_TYPES = {
+    JSON: JSON,
+    NDJSON: NDJSON,
+    "application/jsonl": NDJSON,
+    MSGPACK: MSGPACK,
+    "application/x-msgpack": MSGPACK,
+}
+
+NODE_KEYS = ("id", "name", "longitude", "latitude")
+EDGE_KEYS = ("id", "from_node_name", "to_node_name", "weight")
+
+
+def _accepted(accept: Optional[str]) -> List[Tuple[float, int, str]]:
+    # Tipos do Accept com seus pesos (q), na ordem de preferência do cliente
+    accepted = []
+    for position, part in enumerate((accept or "*/*").split(",")):
+        media_type, *params = [item.strip() for item in part.split(";")]
+        quality = 1.0
+        for param in params:
+            if param.startswith("q="):
+                try:
+                    quality = float(param[2:])
+                except ValueError:
+                    quality = 0.0
+        if quality > 0:
+            accepted.append((-quality, position, media_type.lower()))
+    return sorted(accepted)
+
+
+def negotiate_graph_format(accept: Optional[str]) -> str:
+    # Escolhe o formato de exportação pelo cabeçalho Accept; curingas resultam em JSON
+    for _, _, media_type in _accepted(accept):
+        if media_type in ("*/*", "application/*"):
+            return JSON
+        chosen = GRAPH_MEDIA_TYPES.get(media_type)
+        if chosen == MSGPACK and msgpack is None:
+            continue
+        if chosen is not None:
+            return chosen
+
+    available = [media_type for media_type, chosen in GRAPH_MEDIA_TYPES.items() if chosen != MSGPACK or msgpack is not None]
+    raise HTTPException(status_code=406, detail=f"Unsupported Accept header; available: {', '.join(available)}")
+
+
+def stream_partitions(db: Session, stmt) -> Iterator[list]:
+    # Cursor do lado do servidor: apenas um lote de linhas fica em memória por vez
+    result = db.execute(stmt.execution_options(yield_per=EXPORT_BATCH_SIZE))
+    yield from result.partitions()
+
+
+def _json_rows(batches: Iterator[list], keys: Tuple[str, ...]) -> Iterator[bytes]:
+    # Elementos de um array JSON, lote a lote (sem os colchetes)
+    first = True
+    for batch in batches:
+        chunk = orjson.dumps([dict(zip(keys, row)) for row in batch])[1:-1]
+        if chunk:
+            yield chunk if first else b"," + chunk
+            first = False
+
+
+def _stream_json(db: Session, graph_id: int, name: str) -> Iterator[bytes]:
+    # Mesmo formato do GraphResponse
+    yield b'{"id":' + orjson.dumps(graph_id) + b',"name":' + orjson.dumps(name) + b',"nodes":['
+    yield from _json_rows(stream_partitions(db, nodes_statement(graph_id)), NODE_KEYS)
+    yield b'],"edges":['
+    yield from _json_rows(stream_partitions(db, edges_statement(graph_id)), EDGE_KEYS)
+    yield b"]}"
+
+
+def _stream_ndjson(db: Session, graph_id: int, name: str) -> Iterator[bytes]:
+    # Mesmo formato aceito por POST /graph/create/stream: cabeçalho do grafo, nós e arestas, um por linha
+    yield orjson.dumps({"type": "graph", "id": graph_id, "name": name}) + b"\n"
+    for keys, kind, stmt in ((NODE_KEYS, "node", nodes_statement(graph_id)), (EDGE_KEYS, "edge", edges_statement(graph_id))):
+        for batch in stream_partitions(db, stmt):
+            yield b"".join(orjson.dumps({"type": kind, **dict(zip(keys, row))}, option=orjson.OPT_APPEND_NEWLINE) for row in batch)
+
+
+def _stream_msgpack(db: Session, graph_id: int, name: str) -> Iterator[bytes]:
+    # Mapa {id, name, nodes, edges}; nós e arestas como arrays de linhas [id, name, longitude, latitude] /
+    # [id, from_node_name, to_node_name, weight]. As contagens vêm antes, pois o MessagePack exige o tamanho dos arrays
+    packer = msgpack.Packer()
+    node_count = db.execute(select(func.count()).select_from(Node).where(Node.graph_id == graph_id)).scalar()
+    edge_count = db.execute(select(func.count()).select_from(Edge).where(Edge.graph_id == graph_id)).scalar()
+
+    yield packer.pack_map_header(4) + packer.pack("id") + packer.pack(graph_id) + packer.pack("name") + packer.pack(name)
+    for key, count, stmt in (("nodes", node_count, nodes_statement(graph_id)), ("edges", edge_count, edges_statement(graph_id))):
+        yield packer.pack(key) + packer.pack_array_header(count)
+        for batch in stream_partitions(db, stmt):
+            yield b"".join(packer.pack(tuple(row)) for row in batch)
+
+
+STREAMERS = {JSON: _stream_json, NDJSON: _stream_ndjson, MSGPACK: _stream_msgpack}
+
+
+# Função para exportar um grafo no formato negociado pelo Accept. A leitura usa sessão própria (o envio
+# continua depois do fim da requisição) em um snapshot REPEATABLE READ, para que nós e arestas sejam consistentes
+def export_graph(graph_id: int, accept: Optional[str], db: Session, session_factory: Callable[[], Session]) -> StreamingResponse:
+    media_type = negotiate_graph_format(accept)
+
+    graph = db.execute(graph_statement(graph_id)).first()
+    if graph is None:
+        raise HTTPException(status_code=404, detail=f"Graph with id {graph_id} not found")
+
+    def generate() -> Iterator[bytes]:
+        export_db = session_factory()
+        try:
+            export_db.connection(execution_options={"isolation_level": "REPEATABLE READ"})
+            yield from STREAMERS[media_type](export_db, graph.id, graph.name)
+        finally:
+            export_db.close()
+
+    return StreamingResponse(generate(), media_type=media_type, headers={"Vary": "Accept"})
@@ -0,0 +1,259 @@
+# Arquivo responsável pela ingestão em lote de nós e arestas (uma transação, inserts de várias linhas)
+
+import json
+import os
+import re
+from typing import AsyncIterator, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from fastapi import HTTPException
+from pydantic import ValidationError
+from geoalchemy2 import Geography
+from sqlalchemy import Integer, cast, func, insert, or_, select, update
+from sqlalchemy.exc import IntegrityError, SQLAlchemyError
+from sqlalchemy.orm import Session, aliased
+from starlette.concurrency import run_in_threadpool
+
+from app.models.graph_models import Graph, Node, Edge
+from app.schemas.graph_schemas import NodeCreate, EdgeCreate, GraphIngestResponse
+from app.controllers.graph_cache import graph_cache
+from app.db.partitioning import create_graph_partitions, discard_partitions_unless_committed
+
+
+# Quantidade de linhas enviadas por INSERT de várias linhas
+INGEST_BATCH_SIZE = int(os.environ.get("INGEST_BATCH_SIZE", 5000))
+
+# Distância máxima (m) entre as extremidades da geometria de uma aresta e os seus nós de origem e destino
+EDGE_GEOMETRY_TOLERANCE_M = float(os.environ.get("EDGE_GEOMETRY_TOLERANCE_M", 1.0))
+
+DUPLICATE_NODE_NAME = re.compile(r"Key \(graph_id, name\)=\(\d+, (.*)\) already exists")
+
+
+def in_batches(rows: Iterable, size: int = INGEST_BATCH_SIZE) -> Iterable[list]:
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+# Cria o registro do grafo (flush apenas para obter o ID); com particionamento por lista, o ID é reservado junto
+# da criação das partições de nós e arestas, descartadas se a transação da ingestão não for confirmada
+def insert_graph(name: str, db: Session) -> Graph:
+    graph_id = create_graph_partitions(db.get_bind())
+    if graph_id is not None:
+        discard_partitions_unless_committed(graph_id, db)
+    db_graph = Graph(id=graph_id, name=name)
+    db.add(db_graph)
+    db.flush()
+    return db_graph
+
+
+# Insere os nós em lotes e devolve o mapeamento nome -> id gerado pelo banco
+def bulk_insert_nodes(graph_id: int, nodes: Iterable[Tuple[str, float, float]], db: Session) -> Dict[str, int]:
+    node_id_map = {}
+    stmt = insert(Node).returning(Node.id, Node.name)
+
+    for batch in in_batches(nodes):
+        rows = [
+            {"name": name, "graph_id": graph_id, "geom": f"SRID=4326;POINT({longitude} {latitude})"}
+            for name, longitude, latitude in batch
+        ]
+        for node_id, name in db.execute(stmt, rows):
+            node_id_map[name] = node_id
+
+    return node_id_map
+
+
+def linestring_ewkt(coordinates: Optional[Sequence[Tuple[float, float]]]) -> Optional[str]:
+    if not coordinates:
+        return None
+    return "SRID=4326;LINESTRING(" + ",".join(f"{longitude} {latitude}" for longitude, latitude in coordinates) + ")"
+
+
+# Insere as arestas em lotes, validando os nomes dos nós em memória (e, no banco, as extremidades das geometrias),
+# e devolve os ids na ordem de entrada.
+# Cada aresta é (from_node_name, to_node_name, weight) ou (from_node_name, to_node_name, weight, coordinates);
+# arestas sem peso devem passar por derive_edge_weights antes do commit
+def bulk_insert_edges(graph_id: int, edges: Iterable[tuple], node_id_map: Dict[str, int], db: Session) -> List[int]:
+    edge_ids = []
+    stmt = insert(Edge).returning(Edge.id, sort_by_parameter_order=True)
+
+    for batch in in_batches(edges):
+        rows = []
+        for from_node_name, to_node_name, weight, *coordinates in batch:
+            if from_node_name not in node_id_map or to_node_name not in node_id_map:
+                raise ValueError(f"Invalid node names in edge: {from_node_name} -> {to_node_name}")
+            rows.append({
+                "graph_id": graph_id,
+                "from_node_id": node_id_map[from_node_name],
+                "to_node_id": node_id_map[to_node_name],
+                "from_node_name": from_node_name,
+                "to_node_name": to_node_name,
+                "weight": weight,
+                "geom": linestring_ewkt(coordinates[0] if coordinates else None),
+            })
+        batch_ids = list(db.execute(stmt, rows).scalars())
+        with_geometry = [edge_id for edge_id, row in zip(batch_ids, rows) if row["geom"] is not None]
+        if with_geometry:
+            misplaced = db.execute(misplaced_edge_geometry_statement(graph_id, with_geometry)).first()
+            if misplaced is not None:
+                raise ValueError(f"Edge geometry does not start and end at its nodes: {misplaced[0]} -> {misplaced[1]}")
+        edge_ids.extend(batch_ids)
+
+    return edge_ids
+
+
+# Primeira aresta do lote cuja geometria não começa no nó de origem ou não termina no nó de destino (distância
+# esférica acima de EDGE_GEOMETRY_TOLERANCE_M); essas geometrias dariam pesos e tiles incoerentes com o grafo
+def misplaced_edge_geometry_statement(graph_id: int, edge_ids: List[int]):
+    from_node, to_node = aliased(Node), aliased(Node)
+    return (
+        select(Edge.from_node_name, Edge.to_node_name)
+        .where(Edge.graph_id == graph_id, Edge.id.in_(edge_ids),
+               from_node.graph_id == graph_id, from_node.id == Edge.from_node_id,
+               to_node.graph_id == graph_id, to_node.id == Edge.to_node_id,
+               or_(func.ST_DistanceSphere(func.ST_StartPoint(Edge.geom), from_node.geom) > EDGE_GEOMETRY_TOLERANCE_M,
+                   func.ST_DistanceSphere(func.ST_EndPoint(Edge.geom), to_node.geom) > EDGE_GEOMETRY_TOLERANCE_M))
+        .limit(1)
+    )
+
+
+def derive_edge_weights_statement(graph_id: int):
+    # Um único UPDATE ... FROM nodes: peso = comprimento geodésico (m) da geometria da aresta ou, sem ela,
+    # do segmento reto entre os nós. O índice parcial de pesos ausentes limita a varredura às arestas novas
+    from_node, to_node = aliased(Node), aliased(Node)
+    segment = func.coalesce(Edge.geom, func.ST_MakeLine(from_node.geom, to_node.geom))
+    return (
+        update(Edge)
+        .where(Edge.graph_id == graph_id, Edge.weight.is_(None),
+               from_node.graph_id == graph_id, from_node.id == Edge.from_node_id,
+               to_node.graph_id == graph_id, to_node.id == Edge.to_node_id)
+        .values(weight=cast(func.round(func.ST_Length(cast(segment, Geography(srid=4326)))), Integer))
+        .execution_options(synchronize_session=False)
+    )
+
+
+# Calcula no banco os pesos das arestas inseridas sem peso e devolve quantas foram atualizadas
+def derive_edge_weights(graph_id: int, db: Session) -> int:
+    return db.execute(derive_edge_weights_statement(graph_id)).rowcount
+
+
+# Mesmo cálculo, devolvendo o peso de cada aresta atualizada (id -> peso) para respostas e para o grafo em cache
+def derived_edge_weights(graph_id: int, db: Session) -> Dict[int, int]:
+    return dict(db.execute(derive_edge_weights_statement(graph_id).returning(Edge.id, Edge.weight)).all())
+
+
+# Converte erros de integridade do banco na mesma resposta HTTP usada na criação do grafo
+def integrity_error_to_http(e: IntegrityError) -> HTTPException:
+    # Nomes de nós são únicos por grafo: "Key (graph_id, name)=(1, A) already exists."
+    duplicate = DUPLICATE_NODE_NAME.search(str(e.orig))
+    if "duplicate key value violates unique constraint" in str(e.orig) and duplicate:
+        return HTTPException(status_code=404, detail=f"Node with name '{duplicate.group(1)}' already exists.")
+    return HTTPException(status_code=400, detail=f"An integrity error occurred while creating the graph: {str(e)}")
+
+
+async def ndjson_lines(chunks: AsyncIterator[bytes]) -> AsyncIterator[bytes]:
+    buffer = b""
+    async for chunk in chunks:
+        buffer += chunk
+        *lines, buffer = buffer.split(b"\n")
+        for line in lines:
+            if line.strip():
+                yield line
+    if buffer.strip():
+        yield buffer
+
+
+class _StreamIngestion:
+    """
+        Estado de uma ingestão NDJSON: apenas o mapa nome -> id e os lotes pendentes ficam em memória
+    """
+
+    def __init__(self, db: Session):
+        self.db = db
+        self.graph_id = None
+        self.name = None
+        self.node_id_map: Dict[str, int] = {}
+        self.pending_nodes: list = []
+        self.pending_edges: list = []
+        self.edges_created = 0
+
+    def start(self, name: str) -> None:
+        self.graph_id = insert_graph(name, self.db).id
+        self.name = name
+
+    def flush_nodes(self) -> None:
+        self.node_id_map.update(bulk_insert_nodes(self.graph_id, self.pending_nodes, self.db))
+        self.pending_nodes = []
+
+    def flush_edges(self) -> None:
+        self.edges_created += len(bulk_insert_edges(self.graph_id, self.pending_edges, self.node_id_map, self.db))
+        self.pending_edges = []
+
+    def finish(self) -> None:
+        self.flush_nodes()
+        self.flush_edges()
+        derive_edge_weights(self.graph_id, self.db)
+        self.db.commit()
+
+
+# Cria um grafo a partir de um corpo NDJSON sem materializar o GraphCreate inteiro
+async def create_graph_from_stream(chunks: AsyncIterator[bytes], db: Session) -> GraphIngestResponse:
+    ingestion = _StreamIngestion(db)
+    try:
+        async for line in ndjson_lines(chunks):
+            record = json.loads(line)
+            if not isinstance(record, dict):
+                raise ValueError("Each NDJSON line must be a JSON object")
+            record_type = record.pop("type", None)
+
+            if ingestion.graph_id is None:
+                if record_type != "graph" or not record.get("name"):
+                    raise ValueError("The first NDJSON line must be a graph header: {\"type\": \"graph\", \"name\": ...}")
+                await run_in_threadpool(ingestion.start, record["name"])
+
+            elif record_type == "node":
+                node = NodeCreate(**record)
+                ingestion.pending_nodes.append((node.name, node.longitude, node.latitude))
+                if len(ingestion.pending_nodes) >= INGEST_BATCH_SIZE:
+                    await run_in_threadpool(ingestion.flush_nodes)
+
+            elif record_type == "edge":
+                edge = EdgeCreate(**record)
+                # Arestas só referenciam nós já recebidos; os nós pendentes são gravados antes
+                if ingestion.pending_nodes:
+                    await run_in_threadpool(ingestion.flush_nodes)
+                ingestion.pending_edges.append((edge.from_node_name, edge.to_node_name, edge.weight, edge.coordinates))
+                if len(ingestion.pending_edges) >= INGEST_BATCH_SIZE:
+                    await run_in_threadpool(ingestion.flush_edges)
+
+            else:
+                raise ValueError(f"Unknown NDJSON record type: {record_type}")
+
+        if ingestion.graph_id is None:
+            raise ValueError("Empty graph stream")
+
+        await run_in_threadpool(ingestion.finish)
+        graph_cache.bump_version(ingestion.graph_id)
+
+        return GraphIngestResponse(
+            id=ingestion.graph_id,
+            name=ingestion.name,
+            nodes_created=len(ingestion.node_id_map),
+            edges_created=ingestion.edges_created
+        )
+
+    except IntegrityError as e:
+        await run_in_threadpool(db.rollback)
+        raise integrity_error_to_http(e)
+
+    except SQLAlchemyError as e:
+        await run_in_threadpool(db.rollback)
+        raise HTTPException(status_code=500, detail=f"A database error occurred while creating the graph: {str(e)}")
+
+    except (ValueError, ValidationError) as e:
+        await run_in_threadpool(db.rollback)
+        raise HTTPException(status_code=400, detail=str(e))
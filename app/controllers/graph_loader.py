@@ -0,0 +1,59 @@
+# Arquivo responsável pela camada única de carregamento de grafos (grafo, nós e arestas), usada pela API e pelo motor de rotas.
+# Cada tabela é lida com uma única consulta de colunas e as coordenadas saem do próprio SQL (ST_X/ST_Y),
+# sem carregar objetos ORM nem decodificar o WKB nó a nó em Python
+
+from typing import List, NamedTuple, Optional
+
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from app.models.graph_models import Graph, Node, Edge
+
+
+class GraphRows(NamedTuple):
+    id: int
+    name: str
+    # (id, name, longitude, latitude), em ordem de id
+    nodes: List[tuple]
+    # (id, from_node_name, to_node_name, weight), em ordem de id
+    edges: List[tuple]
+
+
+def graph_statement(graph_id: int):
+    return select(Graph.id, Graph.name).where(Graph.id == graph_id)
+
+
+def nodes_statement(graph_id: int):
+    return (
+        select(Node.id, Node.name, func.ST_X(Node.geom).label("longitude"), func.ST_Y(Node.geom).label("latitude"))
+        .where(Node.graph_id == graph_id)
+        .order_by(Node.id)
+    )
+
+
+def edges_statement(graph_id: int):
+    return (
+        select(Edge.id, Edge.from_node_name, Edge.to_node_name, Edge.weight)
+        .where(Edge.graph_id == graph_id)
+        .order_by(Edge.id)
+    )
+
+
+# Carrega o grafo com nós e arestas em três consultas; None se o grafo não existir
+def load_graph_rows(graph_id: int, db: Session) -> Optional[GraphRows]:
+    graph = db.execute(graph_statement(graph_id)).first()
+    if graph is None:
+        return None
+    nodes = db.execute(nodes_statement(graph_id)).all()
+    edges = db.execute(edges_statement(graph_id)).all()
+    return GraphRows(graph.id, graph.name, nodes, edges)
+
+
+async def load_graph_rows_async(graph_id: int, db: AsyncSession) -> Optional[GraphRows]:
+    graph = (await db.execute(graph_statement(graph_id))).first()
+    if graph is None:
+        return None
+    nodes = (await db.execute(nodes_statement(graph_id))).all()
+    edges = (await db.execute(edges_statement(graph_id))).all()
+    return GraphRows(graph.id, graph.name, nodes, edges)
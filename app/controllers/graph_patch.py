@@ -0,0 +1,313 @@
+# Arquivo responsável pelas alterações incrementais de grafos (inclusão, remoção e atualização de nós e arestas).
+# Cada alteração toca apenas as linhas afetadas, em lotes, e o grafo compilado em cache é atualizado em memória
+# em vez de ser recarregado do banco
+
+import asyncio
+import os
+import time
+from typing import AsyncIterator, Dict, Iterable, List, Optional, Set, Tuple
+
+from fastapi import HTTPException
+from pydantic import ValidationError
+from sqlalchemy import Float, Integer, String, column, delete, func, or_, select, tuple_, update, values
+from sqlalchemy.exc import IntegrityError, SQLAlchemyError
+from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
+
+from app.models.graph_models import Graph, Node, Edge
+from app.schemas.graph_schemas import EdgeWeight, EdgeWeightStreamResponse, GraphPatch, GraphPatchResponse
+from app.controllers.graph_cache import graph_cache, CompiledGraph
+from app.controllers.graph_ingest import in_batches, ndjson_lines, bulk_insert_nodes, bulk_insert_edges, derived_edge_weights, integrity_error_to_http
+from app.controllers.graph_loader import graph_statement
+
+
+# Janela (s) em que atualizações de peso recebidas por stream são agrupadas antes de irem ao banco,
+# e o máximo de arestas distintas pendentes que antecipa o envio
+WEIGHT_STREAM_WINDOW_S = float(os.environ.get("WEIGHT_STREAM_WINDOW_S", 1.0))
+WEIGHT_STREAM_MAX_PENDING = int(os.environ.get("WEIGHT_STREAM_MAX_PENDING", 50000))
+
+
+def _not_found(kind: str, missing: Iterable[str]) -> HTTPException:
+    return HTTPException(status_code=404, detail=f"{kind} not found in graph: {', '.join(sorted(missing))}")
+
+
+def _edge_labels(pairs: Iterable[Tuple[str, str]]) -> List[str]:
+    return [f"{from_node_name} -> {to_node_name}" for from_node_name, to_node_name in pairs]
+
+
+# Remove as arestas (from, to) indicadas e devolve os pares encontrados
+def bulk_delete_edges(graph_id: int, pairs: List[Tuple[str, str]], db: Session) -> Set[Tuple[str, str]]:
+    found = set()
+    for batch in in_batches(pairs):
+        stmt = (
+            delete(Edge)
+            .where(Edge.graph_id == graph_id, tuple_(Edge.from_node_name, Edge.to_node_name).in_(batch))
+            .returning(Edge.from_node_name, Edge.to_node_name)
+        )
+        found.update(tuple(row) for row in db.execute(stmt))
+    return found
+
+
+# Remove os nós indicados junto com as arestas incidentes; devolve os nomes encontrados e a quantidade de arestas removidas
+def bulk_delete_nodes(graph_id: int, names: List[str], db: Session) -> Tuple[Set[str], int]:
+    found, edges_removed = set(), 0
+    for batch in in_batches(names):
+        node_ids = select(Node.id).where(Node.graph_id == graph_id, Node.name.in_(batch)).scalar_subquery()
+        incident = delete(Edge).where(or_(Edge.from_node_id.in_(node_ids), Edge.to_node_id.in_(node_ids)))
+        edges_removed += db.execute(incident).rowcount
+        found.update(db.execute(delete(Node).where(Node.graph_id == graph_id, Node.name.in_(batch)).returning(Node.name)).scalars())
+    return found, edges_removed
+
+
+# Atualiza as coordenadas dos nós com um único UPDATE ... FROM (VALUES ...) por lote; devolve os nomes encontrados
+def bulk_update_nodes(graph_id: int, nodes: List[Tuple[str, float, float]], db: Session) -> Set[str]:
+    found = set()
+    for batch in in_batches(nodes):
+        moved = values(column("name", String), column("longitude", Float), column("latitude", Float), name="moved").data(batch)
+        stmt = (
+            update(Node)
+            .where(Node.graph_id == graph_id, Node.name == moved.c.name)
+            .values(geom=func.ST_SetSRID(func.ST_MakePoint(moved.c.longitude, moved.c.latitude), 4326))
+            .returning(Node.name)
+            .execution_options(synchronize_session=False)
+        )
+        found.update(db.execute(stmt).scalars())
+    return found
+
+
+# Atualiza os pesos das arestas (from, to) com um único UPDATE ... FROM (VALUES ...) por lote; devolve os pares encontrados.
+# Arestas paralelas entre os mesmos nós recebem o mesmo peso
+def bulk_update_edge_weights(graph_id: int, edges: List[Tuple[str, str, int]], db: Session) -> Set[Tuple[str, str]]:
+    found = set()
+    for batch in in_batches(edges):
+        weights = values(column("from_node_name", String), column("to_node_name", String), column("weight", Integer), name="weights").data(batch)
+        stmt = (
+            update(Edge)
+            .where(Edge.graph_id == graph_id, Edge.from_node_name == weights.c.from_node_name, Edge.to_node_name == weights.c.to_node_name)
+            .values(weight=weights.c.weight)
+            .returning(Edge.from_node_name, Edge.to_node_name)
+            .execution_options(synchronize_session=False)
+        )
+        found.update(tuple(row) for row in db.execute(stmt))
+    return found
+
+
+# Mapa nome -> id dos nós do grafo com os nomes indicados
+def node_ids_by_name(graph_id: int, names: Iterable[str], db: Session) -> Dict[str, int]:
+    node_id_map = {}
+    for batch in in_batches(sorted(set(names))):
+        node_id_map.update(db.execute(select(Node.name, Node.id).where(Node.graph_id == graph_id, Node.name.in_(batch))).tuples())
+    return node_id_map
+
+
+def _last_wins(rows: Iterable[tuple], key_size: int) -> List[tuple]:
+    # Remove chaves repetidas mantendo o último valor (um UPDATE ... FROM não pode casar a mesma linha duas vezes)
+    return list({row[:key_size]: row for row in rows}.values())
+
+
+def reweight_compiled_graph(entry: CompiledGraph, version: int, updates: List[Tuple[str, str, int]],
+                            name: Optional[str] = None) -> CompiledGraph:
+    # Somente pesos: cópia do array de pesos, topologia compartilhada. O índice ALT continua um limite inferior
+    # válido se nenhum peso diminuiu
+    G = entry.graph
+    landmarks = entry.landmarks
+    for a, b, weight in updates:
+        old = G.edge_weight(G.index[a], G.index[b]) if a in G.index and b in G.index else None
+        if old is not None and weight < old:
+            landmarks = None
+            break
+    return CompiledGraph(entry.graph_id, version, name or entry.name, G.with_weights(updates) if updates else G, landmarks=landmarks)
+
+
+def patch_compiled_graph(entry: CompiledGraph, version: int, patch: GraphPatch, added_nodes: List[tuple],
+                         added_edges: List[Tuple[str, str, int]], name: str) -> Optional[CompiledGraph]:
+    # Aplica ao grafo compilado em cache a mesma alteração já confirmada no banco (added_edges com os pesos gravados)
+    structural = patch.remove_edges or patch.remove_nodes or patch.add_nodes or patch.add_edges or patch.update_nodes
+    updates = [(e.from_node_name, e.to_node_name, e.weight) for e in patch.update_edges]
+    if not structural:
+        return reweight_compiled_graph(entry, version, updates, name)
+
+    compact = entry.graph.with_changes(
+        remove_edges=[(e.from_node_name, e.to_node_name) for e in patch.remove_edges],
+        remove_nodes=patch.remove_nodes,
+        add_nodes=added_nodes,
+        move_nodes=[(n.name, n.longitude, n.latitude) for n in patch.update_nodes],
+        set_edges=added_edges + updates,
+    )
+    return CompiledGraph(entry.graph_id, version, name, compact)
+
+
+# Função para aplicar uma alteração incremental ao grafo em uma única transação
+def patch_graph(graph_id: int, patch: GraphPatch, db: Session) -> GraphPatchResponse:
+    with graph_cache.write_lock(graph_id):
+        try:
+            graph = db.execute(select(Graph).where(Graph.id == graph_id)).scalar_one_or_none()
+            if graph is None:
+                raise HTTPException(status_code=404, detail=f"Graph with id {graph_id} not found")
+            if patch.name:
+                graph.name = patch.name
+            response = GraphPatchResponse(id=graph_id, name=graph.name)
+
+            remove_edges = list(dict.fromkeys((e.from_node_name, e.to_node_name) for e in patch.remove_edges))
+            if remove_edges:
+                found = bulk_delete_edges(graph_id, remove_edges, db)
+                if len(found) < len(remove_edges):
+                    raise _not_found("Edges", _edge_labels(set(remove_edges) - found))
+                response.edges_removed += len(found)
+
+            remove_nodes = list(dict.fromkeys(patch.remove_nodes))
+            if remove_nodes:
+                found, incident = bulk_delete_nodes(graph_id, remove_nodes, db)
+                if len(found) < len(remove_nodes):
+                    raise _not_found("Nodes", set(remove_nodes) - found)
+                response.nodes_removed = len(found)
+                response.edges_removed += incident
+
+            added = bulk_insert_nodes(graph_id, ((n.name, n.longitude, n.latitude) for n in patch.add_nodes), db)
+            response.nodes_added = len(added)
+
+            added_edges = []
+            if patch.add_edges:
+                referenced = {name for e in patch.add_edges for name in (e.from_node_name, e.to_node_name)}
+                node_id_map = {**node_ids_by_name(graph_id, referenced - added.keys(), db), **added}
+                edges = ((e.from_node_name, e.to_node_name, e.weight, e.coordinates) for e in patch.add_edges)
+                edge_ids = bulk_insert_edges(graph_id, edges, node_id_map, db)
+                # Arestas sem peso recebem o comprimento calculado no banco; o grafo em cache usa os pesos gravados
+                weights = derived_edge_weights(graph_id, db) if any(e.weight is None for e in patch.add_edges) else {}
+                added_edges = [(e.from_node_name, e.to_node_name, weights.get(edge_id, e.weight)) for edge_id, e in zip(edge_ids, patch.add_edges)]
+                response.edges_added = len(edge_ids)
+
+            update_nodes = _last_wins(((n.name, n.longitude, n.latitude) for n in patch.update_nodes), 1)
+            if update_nodes:
+                found = bulk_update_nodes(graph_id, update_nodes, db)
+                if len(found) < len(update_nodes):
+                    raise _not_found("Nodes", (name for name, _, _ in update_nodes if name not in found))
+                response.nodes_updated = len(found)
+
+            update_edges = _last_wins(((e.from_node_name, e.to_node_name, e.weight) for e in patch.update_edges), 2)
+            if update_edges:
+                found = bulk_update_edge_weights(graph_id, update_edges, db)
+                if len(found) < len(update_edges):
+                    raise _not_found("Edges", _edge_labels({(a, b) for a, b, _ in update_edges} - found))
+                response.edges_updated = len(found)
+
+            db.commit()
+
+        except HTTPException as e:
+            db.rollback()
+            raise e
+
+        except IntegrityError as e:
+            db.rollback()
+            raise integrity_error_to_http(e)
+
+        except SQLAlchemyError as e:
+            db.rollback()
+            raise HTTPException(status_code=500, detail=f"A database error occurred while updating the graph: {str(e)}")
+
+        except ValueError as e:
+            db.rollback()
+            raise HTTPException(status_code=400, detail=str(e))
+
+        # Nós incluídos ordenados pelo id, a mesma ordem usada ao compilar o grafo a partir do banco
+        added_nodes = sorted((added[n.name], n.name, n.longitude, n.latitude) for n in patch.add_nodes)
+        graph_cache.apply_patch(graph_id, lambda entry, version: patch_compiled_graph(entry, version, patch, added_nodes, added_edges, response.name))
+        return response
+
+
+# Aplica um lote de pesos em uma transação e publica os novos pesos no grafo em cache de uma só vez (troca da entrada
+# inteira): as consultas em andamento continuam com o grafo anterior e nenhuma vê um lote aplicado pela metade
+def apply_edge_weights(graph_id: int, updates: List[Tuple[str, str, int]], db: Session) -> Set[Tuple[str, str]]:
+    with graph_cache.write_lock(graph_id):
+        try:
+            found = bulk_update_edge_weights(graph_id, updates, db)
+            db.commit()
+        except SQLAlchemyError as e:
+            db.rollback()
+            raise HTTPException(status_code=500, detail=f"A database error occurred while updating edge weights: {str(e)}")
+
+        applied = [update for update in updates if update[:2] in found]
+        graph_cache.apply_patch(graph_id, lambda entry, version: reweight_compiled_graph(entry, version, applied))
+        return found
+
+
+class _WeightStream:
+    """
+        Atualizações de peso pendentes de um stream, agrupadas por aresta (a última de cada janela prevalece)
+    """
+
+    def __init__(self, graph_id: int, db: Session):
+        self.graph_id = graph_id
+        self.db = db
+        self.pending: Dict[Tuple[str, str], int] = {}
+        self.deadline = time.monotonic() + WEIGHT_STREAM_WINDOW_S
+        self.response = EdgeWeightStreamResponse(id=graph_id)
+
+    def add(self, edge: EdgeWeight) -> None:
+        # A janela começa na primeira atualização pendente: nenhuma espera mais que WEIGHT_STREAM_WINDOW_S
+        if not self.pending:
+            self.deadline = time.monotonic() + WEIGHT_STREAM_WINDOW_S
+        self.pending[(edge.from_node_name, edge.to_node_name)] = edge.weight
+        self.response.updates_received += 1
+
+    @property
+    def due(self) -> bool:
+        return len(self.pending) >= WEIGHT_STREAM_MAX_PENDING or time.monotonic() >= self.deadline
+
+    def flush(self) -> None:
+        updates = [(from_node_name, to_node_name, weight) for (from_node_name, to_node_name), weight in self.pending.items()]
+        self.pending = {}
+        self.deadline = time.monotonic() + WEIGHT_STREAM_WINDOW_S
+        if not updates:
+            return
+        found = apply_edge_weights(self.graph_id, updates, self.db)
+        self.response.batches += 1
+        self.response.edges_updated += len(found)
+        self.response.edges_not_found += len(updates) - len(found)
+
+    async def consume(self, lines: AsyncIterator[bytes]) -> None:
+        # A próxima linha é aguardada no máximo até o fim da janela: com o feed parado, as atualizações pendentes
+        # são aplicadas mesmo assim. A leitura em andamento não é cancelada no timeout, apenas aguardada de novo
+        lines = lines.__aiter__()
+        next_line = None
+        try:
+            while True:
+                if next_line is None:
+                    next_line = asyncio.ensure_future(lines.__anext__())
+                timeout = max(0.0, self.deadline - time.monotonic()) if self.pending else None
+                done, _ = await asyncio.wait({next_line}, timeout=timeout)
+                if not done:
+                    await run_in_threadpool(self.flush)
+                    continue
+
+                try:
+                    line = next_line.result()
+                except StopAsyncIteration:
+                    break
+                finally:
+                    next_line = None
+                self.add(EdgeWeight.model_validate_json(line))
+                if self.due:
+                    await run_in_threadpool(self.flush)
+        finally:
+            if next_line is not None:
+                next_line.cancel()
+        await run_in_threadpool(self.flush)
+
+
+# Função para aplicar um stream NDJSON de pesos ({"from_node_name", "to_node_name", "weight"} por linha).
+# As atualizações são agrupadas por janela de tempo (ou quantidade) e cada janela vira um UPDATE ... FROM (VALUES ...)
+# em uma transação própria; arestas inexistentes são contadas e ignoradas
+async def stream_edge_weights(graph_id: int, chunks: AsyncIterator[bytes], db: Session) -> EdgeWeightStreamResponse:
+    graph = await run_in_threadpool(lambda: db.execute(graph_statement(graph_id)).first())
+    if graph is None:
+        raise HTTPException(status_code=404, detail=f"Graph with id {graph_id} not found")
+
+    stream = _WeightStream(graph_id, db)
+    try:
+        await stream.consume(ndjson_lines(chunks))
+        return stream.response
+
+    except (ValueError, ValidationError) as e:
+        # As janelas anteriores já foram confirmadas; apenas as atualizações pendentes são descartadas
+        raise HTTPException(status_code=400, detail=f"{e} ({stream.response.batches} batches already applied)")
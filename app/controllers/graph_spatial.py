@@ -0,0 +1,122 @@
+# Arquivo responsável pelas consultas espaciais no banco: nós de um grafo dentro de um retângulo (bbox) ou de um raio
+# e o subgrafo induzido por eles, paginados por id de nó. Os filtros são resolvidos pelo índice GiST de nodes.geom
+
+import math
+import os
+from typing import List, Optional, Tuple
+
+from fastapi import HTTPException, Response
+from sqlalchemy import and_, func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import aliased
+
+from app.models.graph_models import Graph, Node, Edge
+from app.schemas.graph_schemas import EdgeResponse, GraphResponse, NodeResponse
+from app.controllers.compact_graph import EARTH_RADIUS_M
+from app.controllers.graph_loader import graph_statement
+
+
+# Nós por página quando limit não é informado
+SPATIAL_PAGE_SIZE = int(os.environ.get("SPATIAL_PAGE_SIZE", 1000))
+
+METERS_PER_DEGREE = math.pi * EARTH_RADIUS_M / 180
+
+
+# Converte "min_lon,min_lat,max_lon,max_lat" nos quatro limites do retângulo
+def parse_bbox(bbox: str) -> Tuple[float, float, float, float]:
+    try:
+        min_lon, min_lat, max_lon, max_lat = (float(value) for value in bbox.split(","))
+    except ValueError:
+        raise HTTPException(status_code=400, detail="bbox must be min_lon,min_lat,max_lon,max_lat")
+    if not (-180 <= min_lon <= max_lon <= 180 and -90 <= min_lat <= max_lat <= 90):
+        raise HTTPException(status_code=400, detail="bbox must satisfy -180 <= min_lon <= max_lon <= 180 and -90 <= min_lat <= max_lat <= 90")
+    return min_lon, min_lat, max_lon, max_lat
+
+
+# Distância em graus que nunca fica abaixo de radius_m metros em torno da latitude informada; permite que o
+# ST_DWithin sobre a geometria use o índice GiST antes do filtro exato em metros
+def radius_in_degrees(latitude: float, radius_m: float) -> float:
+    max_latitude = min(abs(latitude) + radius_m / METERS_PER_DEGREE, 89.0)
+    return radius_m / METERS_PER_DEGREE / math.cos(math.radians(max_latitude))
+
+
+# Condição espacial sobre a geometria dos nós: bbox (ST_Intersects com o retângulo) ou raio em metros a partir de
+# lon/lat (ST_DWithin em graus pelo índice, seguido da distância esférica exata)
+def region_filter(geom, bbox: Optional[str], longitude: Optional[float], latitude: Optional[float], radius_m: Optional[float]):
+    if (bbox is None) == (radius_m is None):
+        raise HTTPException(status_code=400, detail="Provide either bbox or lon, lat and radius_m")
+
+    if bbox is not None:
+        return func.ST_Intersects(geom, func.ST_MakeEnvelope(*parse_bbox(bbox), 4326))
+
+    if longitude is None or latitude is None:
+        raise HTTPException(status_code=400, detail="radius_m requires lon and lat")
+    point = func.ST_SetSRID(func.ST_MakePoint(longitude, latitude), 4326)
+    return and_(func.ST_DWithin(geom, point, radius_in_degrees(latitude, radius_m)), func.ST_DistanceSphere(geom, point) <= radius_m)
+
+
+def nodes_in_region_statement(graph_id: int, region, limit: int, cursor: Optional[int]):
+    stmt = (
+        select(Node.id, Node.name, func.ST_X(Node.geom).label("longitude"), func.ST_Y(Node.geom).label("latitude"))
+        .where(Node.graph_id == graph_id, region)
+        .order_by(Node.id)
+        .limit(limit + 1)
+    )
+    if cursor is not None:
+        stmt = stmt.where(Node.id > cursor)
+    return stmt
+
+
+# Nós de uma página (em ordem de id); X-Next-Cursor traz o id do último nó quando há mais páginas
+async def _region_page(graph_id: int, region, limit: Optional[int], cursor: Optional[int], db: AsyncSession,
+                       response: Optional[Response]) -> List[tuple]:
+    limit = limit or SPATIAL_PAGE_SIZE
+    rows = (await db.execute(nodes_in_region_statement(graph_id, region, limit, cursor))).all()
+    if len(rows) > limit:
+        rows = rows[:limit]
+        if response is not None:
+            response.headers["X-Next-Cursor"] = str(rows[-1].id)
+    return rows
+
+
+# Função para buscar os nós de um grafo dentro de um retângulo ou raio, paginados por id
+async def find_nodes_in_region(graph_id: int, db: AsyncSession, bbox: Optional[str] = None, longitude: Optional[float] = None,
+                               latitude: Optional[float] = None, radius_m: Optional[float] = None, limit: Optional[int] = None,
+                               cursor: Optional[int] = None, response: Optional[Response] = None) -> List[NodeResponse]:
+    region = region_filter(Node.geom, bbox, longitude, latitude, radius_m)
+    rows = await _region_page(graph_id, region, limit, cursor, db, response)
+    if not rows and (await db.execute(select(Graph.id).where(Graph.id == graph_id))).first() is None:
+        raise HTTPException(status_code=404, detail="Graph not found")
+
+    return [NodeResponse(id=node_id, name=name, longitude=x, latitude=y) for node_id, name, x, y in rows]
+
+
+# Função para buscar o subgrafo induzido pela região: nós da página e as arestas que saem deles para nós também
+# dentro da região. Cada aresta aparece uma única vez, na página do seu nó de origem
+async def find_subgraph_in_region(graph_id: int, db: AsyncSession, bbox: Optional[str] = None, longitude: Optional[float] = None,
+                                  latitude: Optional[float] = None, radius_m: Optional[float] = None, limit: Optional[int] = None,
+                                  cursor: Optional[int] = None, response: Optional[Response] = None) -> GraphResponse:
+    graph = (await db.execute(graph_statement(graph_id))).first()
+    if graph is None:
+        raise HTTPException(status_code=404, detail="Graph not found")
+
+    rows = await _region_page(graph_id, region_filter(Node.geom, bbox, longitude, latitude, radius_m), limit, cursor, db, response)
+
+    edges = []
+    if rows:
+        to_node = aliased(Node)
+        stmt = (
+            select(Edge.id, Edge.from_node_name, Edge.to_node_name, Edge.weight)
+            .join(to_node, and_(to_node.graph_id == graph_id, to_node.id == Edge.to_node_id))
+            .where(Edge.graph_id == graph_id, Edge.from_node_id.in_([row.id for row in rows]),
+                   region_filter(to_node.geom, bbox, longitude, latitude, radius_m))
+            .order_by(Edge.id)
+        )
+        edges = (await db.execute(stmt)).all()
+
+    return GraphResponse(
+        id=graph.id,
+        name=graph.name,
+        nodes=[NodeResponse(id=node_id, name=name, longitude=x, latitude=y) for node_id, name, x, y in rows],
+        edges=[EdgeResponse(id=edge_id, from_node_name=u, to_node_name=v, weight=w) for edge_id, u, v, w in edges],
+    )
@@ -0,0 +1,192 @@
+# Arquivo responsável pelos tiles vetoriais (Mapbox Vector Tiles) dos grafos, gerados no PostGIS com ST_AsMVT.
+# Cada tile tem a camada "edges" (geometria da aresta ou segmento reto entre os nós, simplificada pelo zoom) e,
+# a partir de TILE_NODES_MIN_ZOOM, a camada "nodes". Os tiles ficam em um cache LRU indexado pela versão do grafo,
+# de modo que qualquer escrita no grafo os invalida
+
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+from typing import Dict, Optional, Set, Tuple
+
+from fastapi import HTTPException, Response
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.controllers.graph_cache import graph_cache
+from app.controllers.graph_loader import graph_statement
+
+
+# Limite do cache de tiles (soma dos bytes mantidos em memória)
+TILE_CACHE_MAX_BYTES = int(os.environ.get("TILE_CACHE_MAX_BYTES", 64 * 1024 * 1024))
+# Zoom mínimo em que os nós entram no tile (abaixo dele apenas as arestas são desenhadas)
+TILE_NODES_MIN_ZOOM = int(os.environ.get("TILE_NODES_MIN_ZOOM", 12))
+TILE_MAX_ZOOM = 22
+
+# Resolução do tile e margem (em unidades do tile) desenhada além da borda
+TILE_EXTENT = 4096
+TILE_BUFFER = 64
+
+MVT_MEDIA_TYPE = "application/vnd.mapbox-vector-tile"
+
+# Largura do mundo em Web Mercator (EPSG:3857), em metros
+WEB_MERCATOR_WIDTH = 2 * 20037508.342789244
+
+# Arestas candidatas: pela geometria gravada (índice GiST de edges.geom) ou, nas arestas sem geometria, por um nó
+# extremo no tile ou nos tiles vizinhos (índice GiST de nodes.geom). Segmentos retos que atravessam o tile sem ter
+# extremidade nessa vizinhança não entram. A simplificação usa a tolerância de um pixel do tile em metros
+TILE_SQL = """
+WITH bounds AS (
+    SELECT ST_TileEnvelope(:z, :x, :y) AS tile,
+           ST_Transform(ST_TileEnvelope(:z, :x, :y), 4326) AS area,
+           ST_Transform(ST_TileEnvelope(:z, :x, :y, margin => 1.0), 4326) AS reach
+),
+candidates AS (
+    SELECT e.id FROM edges e, bounds b
+    WHERE e.graph_id = :graph_id AND e.geom && b.area
+    UNION
+    SELECT e.id FROM nodes n, bounds b, edges e
+    WHERE n.graph_id = :graph_id AND n.geom && b.reach
+      AND e.graph_id = :graph_id AND e.from_node_id = n.id AND e.geom IS NULL
+    UNION
+    SELECT e.id FROM nodes n, bounds b, edges e
+    WHERE n.graph_id = :graph_id AND n.geom && b.reach
+      AND e.graph_id = :graph_id AND e.to_node_id = n.id AND e.geom IS NULL
+),
+edges_layer AS (
+    SELECT e.id, e.from_node_name, e.to_node_name, e.weight,
+           ST_AsMVTGeom(ST_Simplify(ST_Transform(COALESCE(e.geom, ST_MakeLine(f.geom, t.geom)), 3857), :tolerance),
+                        b.tile, :extent, :buffer) AS geom
+    FROM candidates c
+    JOIN edges e ON e.graph_id = :graph_id AND e.id = c.id
+    JOIN nodes f ON f.graph_id = :graph_id AND f.id = e.from_node_id
+    JOIN nodes t ON t.graph_id = :graph_id AND t.id = e.to_node_id
+    CROSS JOIN bounds b
+),
+nodes_layer AS (
+    SELECT n.id, n.name, ST_AsMVTGeom(ST_Transform(n.geom, 3857), b.tile, :extent, :buffer) AS geom
+    FROM nodes n, bounds b
+    WHERE :with_nodes AND n.graph_id = :graph_id AND n.geom && b.area
+)
+SELECT COALESCE((SELECT ST_AsMVT(edges_layer, 'edges', :extent, 'geom', 'id') FROM edges_layer WHERE geom IS NOT NULL), ''::bytea)
+    || COALESCE((SELECT ST_AsMVT(nodes_layer, 'nodes', :extent, 'geom', 'id') FROM nodes_layer WHERE geom IS NOT NULL), ''::bytea)
+"""
+
+
+class TileCache:
+    """
+        Cache LRU de tiles, indexado por (graph_id, versão, z, x, y) e limitado pela soma dos bytes.
+        Uma versão nova de um grafo descarta de uma vez os tiles das versões anteriores
+    """
+
+    def __init__(self, max_bytes: int = TILE_CACHE_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[tuple, Tuple[bytes, str]]" = OrderedDict()
+        self._keys_by_graph: Dict[int, Set[tuple]] = {}
+        self._versions: Dict[int, int] = {}
+        self._lock = threading.Lock()
+        self._bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: tuple) -> Optional[Tuple[bytes, str]]:
+        with self._lock:
+            self._observe_version(key[0], key[1])
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    def put(self, key: tuple, tile: bytes, etag: str) -> None:
+        with self._lock:
+            self._observe_version(key[0], key[1])
+            # Descarta tiles gerados sobre uma versão que já foi invalidada
+            if key[1] != self._versions[key[0]] or key in self._entries:
+                return
+            self._entries[key] = (tile, etag)
+            self._keys_by_graph.setdefault(key[0], set()).add(key)
+            self._bytes += len(tile)
+            self._evict()
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._keys_by_graph.clear()
+            self._bytes = 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "tiles": len(self._entries),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
+
+    def _observe_version(self, graph_id: int, version: int) -> None:
+        if version > self._versions.get(graph_id, -1):
+            self._versions[graph_id] = version
+            for key in self._keys_by_graph.pop(graph_id, ()):
+                self._bytes -= len(self._entries.pop(key)[0])
+
+    def _evict(self) -> None:
+        # Remove os tiles menos usados até respeitar o limite (mantém sempre o mais recente)
+        while len(self._entries) > 1 and self._bytes > self.max_bytes:
+            key, (tile, _) = self._entries.popitem(last=False)
+            self._keys_by_graph[key[0]].discard(key)
+            self._bytes -= len(tile)
+            self.evictions += 1
+
+
+tile_cache = TileCache()
+
+
+def tile_etag(tile: bytes) -> str:
+    # ETag pelo conteúdo: continua válida entre reinícios e entre processos da API
+    return '"' + hashlib.blake2b(tile, digest_size=16).hexdigest() + '"'
+
+
+def _etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    tags = [tag.strip() for tag in if_none_match.split(",")]
+    return "*" in tags or etag in tags or f"W/{etag}" in tags
+
+
+async def render_tile(graph_id: int, z: int, x: int, y: int, db: AsyncSession) -> bytes:
+    params = {
+        "graph_id": graph_id, "z": z, "x": x, "y": y,
+        "extent": TILE_EXTENT, "buffer": TILE_BUFFER,
+        "tolerance": WEB_MERCATOR_WIDTH / 2 ** z / TILE_EXTENT,
+        "with_nodes": z >= TILE_NODES_MIN_ZOOM,
+    }
+    return bytes((await db.execute(text(TILE_SQL), params)).scalar())
+
+
+# Função para obter o tile z/x/y de um grafo: do cache quando a versão do grafo não mudou, senão gerado no banco.
+# Com If-None-Match igual à ETag do tile, responde 304 sem corpo
+async def get_graph_tile(graph_id: int, z: int, x: int, y: int, if_none_match: Optional[str], db: AsyncSession) -> Response:
+    if not (0 <= z <= TILE_MAX_ZOOM and 0 <= x < 2 ** z and 0 <= y < 2 ** z):
+        raise HTTPException(status_code=400, detail=f"Invalid tile {z}/{x}/{y}")
+
+    # A versão é lida antes da consulta: um tile gerado durante uma escrita fica registrado na versão anterior
+    key = (graph_id, graph_cache.version(graph_id), z, x, y)
+    cached = tile_cache.get(key)
+    if cached is None:
+        if (await db.execute(graph_statement(graph_id))).first() is None:
+            raise HTTPException(status_code=404, detail="Graph not found")
+        tile = await render_tile(graph_id, z, x, y, db)
+        cached = (tile, tile_etag(tile))
+        tile_cache.put(key, *cached)
+
+    tile, etag = cached
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if _etag_matches(if_none_match, etag):
+        return Response(status_code=304, headers=headers)
+    return Response(content=tile, media_type=MVT_MEDIA_TYPE, headers=headers)
@@ -0,0 +1,146 @@
+# Arquivo responsável pela enumeração de rotas com orçamento de tempo/quantidade de rotas e cancelamento cooperativo.
+# A busca roda em processos separados (pool de app.core.executor); o resultado parcial volta marcado como truncado
+
+import asyncio
+import functools
+import heapq
+import os
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+from itertools import islice
+from typing import Callable, List, NamedTuple, Optional, Tuple
+
+from fastapi import Request
+from app.controllers.compact_graph import CompactGraph
+from app.controllers.graph_cache import CompiledGraph
+from app.core.executor import (
+    route_process_pool, acquire_cancel_slot_async, release_cancel_slot, request_cancel, cancel_requested
+)
+
+
+# Orçamento máximo por requisição; o cliente pode pedir valores menores
+ROUTE_TIME_BUDGET_S = float(os.environ.get("ROUTE_TIME_BUDGET_S", 10))
+ROUTE_MAX_ROUTES = int(os.environ.get("ROUTE_MAX_ROUTES", 10000))
+# Grafos mantidos em memória por processo de rotas, para não reenviá-los a cada requisição
+ROUTE_WORKER_GRAPHS = int(os.environ.get("ROUTE_WORKER_GRAPHS", 4))
+# Intervalo de verificação de desconexão do cliente enquanto a busca roda
+DISCONNECT_POLL_INTERVAL_S = 0.1
+
+GRAPH_REQUIRED = "graph-required"
+
+
+class RouteSelection(NamedTuple):
+    routes: List[Tuple[List[int], int]]
+    # Último caminho entregue quando há mais rotas a buscar (base do cursor da próxima página)
+    next_after: Optional[List[int]]
+    truncated: bool
+
+
+class RouteBudget:
+    # Condição de parada da busca: prazo esgotado ou cancelamento solicitado
+    def __init__(self, time_budget: Optional[float] = None, cancelled: Optional[Callable[[], bool]] = None):
+        self.deadline = time.monotonic() + time_budget if time_budget is not None else None
+        self.cancelled = cancelled
+        self.exceeded = False
+
+    def __call__(self) -> bool:
+        if not self.exceeded:
+            self.exceeded = (self.deadline is not None and time.monotonic() >= self.deadline) or \
+                            (self.cancelled is not None and self.cancelled())
+        return self.exceeded
+
+
+def route_budgets(time_budget: Optional[float] = None, max_routes: Optional[int] = None) -> Tuple[float, int]:
+    # Valores pedidos pelo cliente, limitados ao orçamento do servidor
+    return min(time_budget or ROUTE_TIME_BUDGET_S, ROUTE_TIME_BUDGET_S), min(max_routes or ROUTE_MAX_ROUTES, ROUTE_MAX_ROUTES)
+
+
+# Seleciona as rotas de uma consulta (página por limit/resume_after ou as mais baratas com order_by=cost),
+# parando ao esgotar o orçamento de tempo, de rotas ou quando cancelled() for verdadeiro
+def select_routes(G: CompactGraph, source: int, target: int, cutoff: Optional[int] = None, resume_after: Optional[List[int]] = None,
+                  max_cost: Optional[int] = None, order_by: Optional[str] = None, limit: Optional[int] = None,
+                  max_routes: Optional[int] = None, time_budget: Optional[float] = None,
+                  cancelled: Optional[Callable[[], bool]] = None) -> RouteSelection:
+    budget = RouteBudget(time_budget, cancelled)
+    paths = G.all_simple_paths_with_costs(source, target, cutoff=cutoff, resume_after=resume_after, max_cost=max_cost, should_stop=budget)
+
+    if order_by == "cost":
+        # Apenas as rotas examinadas dentro do orçamento participam da ordenação
+        examined = islice(paths, max_routes) if max_routes is not None else paths
+        key = lambda item: (item[1], len(item[0]))
+        best = heapq.nsmallest(limit, examined, key=key) if limit is not None else sorted(examined, key=key)
+        truncated = budget.exceeded or (max_routes is not None and next(paths, None) is not None)
+        return RouteSelection(best, None, truncated)
+
+    cap, capped_by_budget = limit, False
+    if max_routes is not None and (cap is None or max_routes < cap):
+        cap, capped_by_budget = max_routes, True
+
+    routes, next_after, truncated = [], None, False
+    for path, cost in paths:
+        if cap is not None and len(routes) >= cap:
+            next_after, truncated = routes[-1][0], capped_by_budget
+            break
+        routes.append((path, cost))
+
+    if budget.exceeded:
+        # Busca interrompida: o cursor permite continuar de onde parou
+        truncated = True
+        next_after = routes[-1][0] if routes else resume_after
+
+    return RouteSelection(routes, next_after, truncated)
+
+
+# Grafos já recebidos por este processo de rotas, por (graph_id, versão)
+_worker_graphs: "OrderedDict[Tuple[int, int], CompactGraph]" = OrderedDict()
+
+
+def enumerate_routes_task(graph_key: Tuple[int, int], graph: Optional[CompactGraph], slot: int, source: int, target: int, options: dict):
+    # Executada no processo de rotas. Sem o grafo, usa a cópia local ou pede o envio devolvendo GRAPH_REQUIRED
+    if graph is None:
+        graph = _worker_graphs.get(graph_key)
+        if graph is None:
+            return GRAPH_REQUIRED
+        _worker_graphs.move_to_end(graph_key)
+    else:
+        _worker_graphs[graph_key] = graph
+        while len(_worker_graphs) > ROUTE_WORKER_GRAPHS:
+            _worker_graphs.popitem(last=False)
+
+    return select_routes(graph, source, target, cancelled=functools.partial(cancel_requested, slot), **options)
+
+
+def _submit(compiled: CompiledGraph, graph: Optional[CompactGraph], slot: int, source: int, target: int, options: dict) -> Future:
+    return route_process_pool().submit(enumerate_routes_task, (compiled.graph_id, compiled.version), graph, slot, source, target, options)
+
+
+async def _wait_for_routes(future: Future, slot: int, request: Optional[Request]):
+    waiting = asyncio.wrap_future(future)
+    try:
+        while True:
+            done, _ = await asyncio.wait({waiting}, timeout=DISCONNECT_POLL_INTERVAL_S)
+            if done:
+                return waiting.result()
+            if request is not None and await request.is_disconnected():
+                # O processo encerra a busca na próxima verificação; a posição só é liberada depois disso
+                request_cancel(slot)
+                future.cancel()
+                request = None
+    except asyncio.CancelledError:
+        request_cancel(slot)
+        await asyncio.wait({waiting})
+        raise
+
+
+# Seleciona as rotas em um processo de rotas sem bloquear o event loop; a desconexão do cliente cancela a busca
+async def select_routes_in_process(compiled: CompiledGraph, source: int, target: int, request: Optional[Request] = None,
+                                   **options) -> RouteSelection:
+    slot = await acquire_cancel_slot_async()
+    try:
+        result = await _wait_for_routes(_submit(compiled, None, slot, source, target, options), slot, request)
+        if result == GRAPH_REQUIRED:
+            result = await _wait_for_routes(_submit(compiled, compiled.graph, slot, source, target, options), slot, request)
+        return result
+    finally:
+        release_cancel_slot(slot)
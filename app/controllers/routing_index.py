@@ -0,0 +1,128 @@
+# Arquivo responsável pelo índice de rotas pré-calculado (ALT: A* com landmarks e desigualdade triangular).
+# O índice é persistido junto do grafo (tabela routing_indexes) e validado pela impressão digital dos arrays CSR
+
+import hashlib
+import io
+import os
+from typing import Callable, Optional
+
+import numpy as np
+
+from app.controllers.compact_graph import CompactGraph, csgraph_dijkstra, csr_matrix
+
+
+# Quantidade padrão de landmarks; cada um guarda duas distâncias por nó
+ROUTING_INDEX_LANDMARKS = int(os.environ.get("ROUTING_INDEX_LANDMARKS", 8))
+
+
+def graph_fingerprint(G: CompactGraph) -> str:
+    # Identifica a topologia e os pesos do grafo compilado; um índice só é usado com o grafo que o gerou
+    digest = hashlib.blake2b(digest_size=16)
+    for array in (G.node_ids, G.offsets, G.targets, G.weights):
+        digest.update(np.ascontiguousarray(array).tobytes())
+    return digest.hexdigest()
+
+
+class LandmarkIndex:
+    """
+        Distâncias de cada landmark para todos os nós (from_landmarks[v, i] = d(L_i, v)) e de todos os nós
+        para cada landmark (to_landmarks[v, i] = d(v, L_i)). Distâncias inexistentes valem `unreachable`
+    """
+
+    def __init__(self, landmarks: np.ndarray, from_landmarks: np.ndarray, to_landmarks: np.ndarray, fingerprint: str):
+        self.landmarks = landmarks
+        self.from_landmarks = from_landmarks
+        self.to_landmarks = to_landmarks
+        self.fingerprint = fingerprint
+        self.unreachable = unreachable_for(from_landmarks.dtype)
+
+    @property
+    def nbytes(self) -> int:
+        return self.landmarks.nbytes + self.from_landmarks.nbytes + self.to_landmarks.nbytes
+
+    def heuristic(self, target: int) -> Callable[[int], float]:
+        # Limite inferior de d(v, target) pela desigualdade triangular:
+        # max_i(d(L_i, t) - d(L_i, v), d(v, L_i) - d(t, L_i)). Valores acima de unreachable / 2 indicam destino inalcançável
+        from_target = self.from_landmarks[target].astype(np.int64)
+        to_target = self.to_landmarks[target].astype(np.int64)
+        from_landmarks, to_landmarks = self.from_landmarks, self.to_landmarks
+
+        def bound(v: int) -> float:
+            return max(0, int((from_target - from_landmarks[v]).max()), int((to_landmarks[v] - to_target).max()))
+
+        return bound
+
+    def to_bytes(self) -> bytes:
+        buffer = io.BytesIO()
+        np.savez_compressed(buffer, landmarks=self.landmarks, from_landmarks=self.from_landmarks, to_landmarks=self.to_landmarks)
+        return buffer.getvalue()
+
+    @classmethod
+    def from_bytes(cls, data: bytes, fingerprint: str) -> "LandmarkIndex":
+        with np.load(io.BytesIO(data)) as arrays:
+            return cls(arrays["landmarks"], arrays["from_landmarks"], arrays["to_landmarks"], fingerprint)
+
+
+def unreachable_for(dtype: np.dtype) -> int:
+    # Sentinela para "sem caminho", com folga para que as subtrações da heurística não estourem o tipo
+    return 2 ** 30 if np.dtype(dtype) == np.int32 else 2 ** 62
+
+
+def _distances_from(G: CompactGraph, sources: list) -> np.ndarray:
+    # Distâncias de cada origem para todos os nós (np.inf quando não há caminho)
+    n = G.number_of_nodes
+    if csgraph_dijkstra is not None:
+        matrix = csr_matrix((G.weights, G.targets, G.offsets), shape=(n, n))
+        return np.atleast_2d(csgraph_dijkstra(matrix, directed=True, indices=sources))
+
+    dist = np.full((len(sources), n), np.inf)
+    for row, source in enumerate(sources):
+        tree = G.dijkstra_tree(source)[0]
+        dist[row, list(tree)] = list(tree.values())
+    return dist
+
+
+def _reversed(G: CompactGraph) -> CompactGraph:
+    sources = np.repeat(np.arange(G.number_of_nodes, dtype=np.int32), np.diff(G.offsets))
+    return CompactGraph.from_arrays(G.names, G.node_ids, G.longitudes, G.latitudes, G.targets, sources, G.weights)
+
+
+def build_landmark_index(G: CompactGraph, count: int = ROUTING_INDEX_LANDMARKS) -> LandmarkIndex:
+    # Seleção "farthest": cada novo landmark é o nó mais distante (ida + volta) dos landmarks já escolhidos
+    n = G.number_of_nodes
+    count = min(count, n)
+    reverse = _reversed(G)
+    landmarks, forward, backward = [], [], []
+    closest = np.full(n, np.inf)
+    candidate = 0
+
+    for _ in range(count):
+        landmarks.append(candidate)
+        forward.append(_distances_from(G, [candidate])[0])
+        backward.append(_distances_from(reverse, [candidate])[0])
+
+        # Distância finita (em qualquer sentido) até o landmark mais próximo; nós isolados dos landmarks têm prioridade
+        both = np.where(np.isfinite(forward[-1]) & np.isfinite(backward[-1]), forward[-1] + backward[-1], np.inf)
+        closest = np.minimum(closest, both)
+        score = np.where(np.isfinite(closest), closest, np.finfo(np.float64).max)
+        score[landmarks] = -1
+        candidate = int(np.argmax(score))
+
+    from_landmarks = np.stack(forward, axis=1) if forward else np.zeros((n, 0))
+    to_landmarks = np.stack(backward, axis=1) if backward else np.zeros((n, 0))
+
+    # int32 quando as distâncias cabem com folga; senão int64
+    finite = np.concatenate([from_landmarks[np.isfinite(from_landmarks)], to_landmarks[np.isfinite(to_landmarks)]])
+    dtype = np.int32 if finite.size == 0 or finite.max() < 2 ** 29 else np.int64
+    unreachable = unreachable_for(dtype)
+    from_landmarks = np.where(np.isfinite(from_landmarks), from_landmarks, unreachable).astype(dtype)
+    to_landmarks = np.where(np.isfinite(to_landmarks), to_landmarks, unreachable).astype(dtype)
+
+    return LandmarkIndex(np.asarray(landmarks, dtype=np.int32), from_landmarks, to_landmarks, graph_fingerprint(G))
+
+
+def load_landmark_index(G: CompactGraph, fingerprint: Optional[str], data: Optional[bytes]) -> Optional[LandmarkIndex]:
+    # Índice persistido de outra versão do grafo (fingerprint diferente) é ignorado até ser reconstruído
+    if data is None or fingerprint != graph_fingerprint(G):
+        return None
+    return LandmarkIndex.from_bytes(data, fingerprint)
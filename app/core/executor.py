@@ -0,0 +1,125 @@
+# Arquivo responsável pelo executor limitado onde rodam os cálculos de rotas (CPU), fora do event loop
+
+import asyncio
+import functools
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from typing import AsyncIterator, Callable, Iterator, Optional
+
+
+ROUTING_WORKERS = int(os.environ.get("ROUTING_WORKERS", 4))
+# Quantidade máxima de cálculos aguardando um worker; acima disso as requisições esperam sem ocupar a fila do executor
+ROUTING_QUEUE_SIZE = int(os.environ.get("ROUTING_QUEUE_SIZE", 64))
+
+# Processos dedicados à enumeração de rotas (busca exponencial), para não disputar o GIL com as demais requisições
+ROUTE_PROCESS_WORKERS = int(os.environ.get("ROUTE_PROCESS_WORKERS", 2))
+ROUTE_PROCESS_QUEUE_SIZE = int(os.environ.get("ROUTE_PROCESS_QUEUE_SIZE", 16))
+
+routing_executor = ThreadPoolExecutor(max_workers=ROUTING_WORKERS, thread_name_prefix="routing")
+_routing_slots = None
+
+# O pool de processos é criado sob demanda; cada tarefa em andamento ocupa uma posição de cancelamento
+# em memória compartilhada, que o processo consulta periodicamente durante a busca
+_process_pool = None
+_process_lock = threading.Lock()
+_cancel_flags = None
+_free_cancel_slots = None
+_cancel_slots = None
+
+
+def _slots() -> asyncio.Semaphore:
+    global _routing_slots
+    if _routing_slots is None:
+        _routing_slots = asyncio.Semaphore(ROUTING_WORKERS + ROUTING_QUEUE_SIZE)
+    return _routing_slots
+
+
+async def run_routing(func: Callable, *args, **kwargs):
+    async with _slots():
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(routing_executor, functools.partial(func, *args, **kwargs))
+
+
+async def iterate_in_routing_executor(iterator: Iterator, batch_size: int = 64, on_close: Optional[Callable[[], None]] = None) -> AsyncIterator:
+    # Consome um gerador síncrono no executor de rotas, em lotes, para não pagar uma troca de thread por item.
+    # on_close é chamado ao final, inclusive quando o cliente desconecta no meio do envio
+    def next_batch():
+        batch = []
+        for item in iterator:
+            batch.append(item)
+            if len(batch) >= batch_size:
+                break
+        return batch
+
+    try:
+        while True:
+            batch = await run_routing(next_batch)
+            if not batch:
+                return
+            for item in batch:
+                yield item
+    finally:
+        if on_close is not None:
+            on_close()
+
+
+def _init_route_process(cancel_flags) -> None:
+    global _cancel_flags
+    _cancel_flags = cancel_flags
+
+
+def route_process_pool() -> ProcessPoolExecutor:
+    global _process_pool, _cancel_flags, _free_cancel_slots, _cancel_slots
+    with _process_lock:
+        if _process_pool is None:
+            # spawn evita herdar (via fork) as threads e conexões do processo da API
+            context = multiprocessing.get_context("spawn")
+            slots = ROUTE_PROCESS_WORKERS + ROUTE_PROCESS_QUEUE_SIZE
+            _cancel_flags = context.RawArray("b", slots)
+            _free_cancel_slots = list(range(slots))
+            _cancel_slots = threading.Semaphore(slots)
+            _process_pool = ProcessPoolExecutor(max_workers=ROUTE_PROCESS_WORKERS, mp_context=context,
+                                                initializer=_init_route_process, initargs=(_cancel_flags,))
+        return _process_pool
+
+
+def acquire_cancel_slot(blocking: bool = True) -> Optional[int]:
+    route_process_pool()
+    if not _cancel_slots.acquire(blocking=blocking):
+        return None
+    with _process_lock:
+        slot = _free_cancel_slots.pop()
+    _cancel_flags[slot] = 0
+    return slot
+
+
+async def acquire_cancel_slot_async() -> int:
+    slot = acquire_cancel_slot(blocking=False)
+    if slot is None:
+        # Todas as posições ocupadas: aguarda fora do event loop
+        slot = await asyncio.get_running_loop().run_in_executor(None, acquire_cancel_slot)
+    return slot
+
+
+def release_cancel_slot(slot: int) -> None:
+    _cancel_flags[slot] = 0
+    with _process_lock:
+        _free_cancel_slots.append(slot)
+    _cancel_slots.release()
+
+
+def request_cancel(slot: int) -> None:
+    _cancel_flags[slot] = 1
+
+
+# Consultado dentro dos processos de rotas
+def cancel_requested(slot: int) -> bool:
+    return _cancel_flags[slot] != 0
+
+
+def shutdown_routing_executor() -> None:
+    routing_executor.shutdown(wait=False, cancel_futures=True)
+    if _process_pool is not None:
+        _process_pool.shutdown(wait=False, cancel_futures=True)
@@ -1,6 +1,7 @@
 # Arquivo para conexão com o banco de dados PostgreSQL/PostGIS
 
 from sqlalchemy import create_engine
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.orm import sessionmaker
 import os
 from sqlalchemy.orm import declarative_base
@@ -10,13 +11,41 @@ password = os.environ.get("PASSWORD")
 host = os.environ.get("HOST")
 port = os.environ.get("PORT")
 
+# Configurações do pool de conexões (compartilhadas pelos engines síncrono e assíncrono)
+pool_size = int(os.environ.get("DB_POOL_SIZE", 10))
+max_overflow = int(os.environ.get("DB_MAX_OVERFLOW", 20))
+pool_timeout = int(os.environ.get("DB_POOL_TIMEOUT", 30))
+pool_recycle = int(os.environ.get("DB_POOL_RECYCLE", 1800))
+statement_timeout_ms = int(os.environ.get("DB_STATEMENT_TIMEOUT_MS", 30000))
+
 # Definir o endereço do banco de dados com o usuário, senha e nome do banco de dados
 DATABASE_URL = f"postgresql://{user}:{password}@{host}:{port}/geodb"
+ASYNC_DATABASE_URL = f"postgresql+asyncpg://{user}:{password}@{host}:{port}/geodb"
 
 
-engine = create_engine(DATABASE_URL)
+engine = create_engine(
+    DATABASE_URL,
+    pool_size=pool_size,
+    max_overflow=max_overflow,
+    pool_timeout=pool_timeout,
+    pool_recycle=pool_recycle,
+    pool_pre_ping=True,
+    connect_args={"options": f"-c statement_timeout={statement_timeout_ms}"},
+)
 Session = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# Engine assíncrono (asyncpg) usado pelas rotas de consulta de caminhos
+async_engine = create_async_engine(
+    ASYNC_DATABASE_URL,
+    pool_size=pool_size,
+    max_overflow=max_overflow,
+    pool_timeout=pool_timeout,
+    pool_recycle=pool_recycle,
+    pool_pre_ping=True,
+    connect_args={"server_settings": {"statement_timeout": str(statement_timeout_ms)}},
+)
+AsyncSessionLocal = async_sessionmaker(async_engine, class_=AsyncSession, autoflush=False, expire_on_commit=False)
+
 Base = declarative_base()
 
 def get_db():
@@ -25,3 +54,8 @@ def get_db():
         yield db
     finally:
         db.close()
+
+
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
@@ -0,0 +1,41 @@
+-- Migração de bancos criados antes dos nomes de nós por grafo (bancos novos já são criados assim pelo create_all).
+-- Nós passam a ser únicos por (graph_id, name), arestas referenciam os ids dos nós e as cargas por grafo ganham
+-- índices compostos. Executar uma vez, com a aplicação parada:
+--   psql -U $USER -d geodb -f app/db/migrations/001_graph_scoped_node_names.sql
+
+BEGIN;
+
+-- Arestas referenciam os nós pelo id; os nomes eram globalmente únicos até aqui, então o join por nome é exato
+ALTER TABLE edges ADD COLUMN IF NOT EXISTS from_node_id integer;
+ALTER TABLE edges ADD COLUMN IF NOT EXISTS to_node_id integer;
+
+UPDATE edges e SET from_node_id = n.id FROM nodes n WHERE n.name = e.from_node_name AND e.from_node_id IS NULL;
+UPDATE edges e SET to_node_id = n.id FROM nodes n WHERE n.name = e.to_node_name AND e.to_node_id IS NULL;
+
+-- Remove as chaves estrangeiras por nome e a unicidade global do nome
+ALTER TABLE edges DROP CONSTRAINT IF EXISTS edges_from_node_name_fkey;
+ALTER TABLE edges DROP CONSTRAINT IF EXISTS edges_to_node_name_fkey;
+ALTER TABLE nodes DROP CONSTRAINT IF EXISTS nodes_name_key;
+DROP INDEX IF EXISTS ix_nodes_name;
+CREATE INDEX ix_nodes_name ON nodes (name);
+
+-- Nomes únicos dentro de cada grafo
+ALTER TABLE nodes ADD CONSTRAINT uq_nodes_graph_id_name UNIQUE (graph_id, name);
+
+ALTER TABLE edges ADD CONSTRAINT edges_from_node_id_fkey FOREIGN KEY (from_node_id) REFERENCES nodes (id);
+ALTER TABLE edges ADD CONSTRAINT edges_to_node_id_fkey FOREIGN KEY (to_node_id) REFERENCES nodes (id);
+
+-- Índices das cargas por grafo (nós e arestas em ordem de id), das alterações por (from, to) e das chaves estrangeiras
+CREATE INDEX IF NOT EXISTS ix_nodes_graph_id_id ON nodes (graph_id, id);
+CREATE INDEX IF NOT EXISTS ix_edges_graph_id_id ON edges (graph_id, id);
+CREATE INDEX IF NOT EXISTS ix_edges_graph_id_from_to ON edges (graph_id, from_node_name, to_node_name);
+CREATE INDEX IF NOT EXISTS ix_edges_from_node_id ON edges (from_node_id);
+CREATE INDEX IF NOT EXISTS ix_edges_to_node_id ON edges (to_node_id);
+
+-- Índice GiST da busca do nó mais próximo (o create_all não cria índices em tabelas já existentes)
+CREATE INDEX IF NOT EXISTS idx_nodes_geom ON nodes USING gist (geom);
+
+COMMIT;
+
+ANALYZE nodes;
+ANALYZE edges;
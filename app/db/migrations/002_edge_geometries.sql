@@ -0,0 +1,12 @@
+-- Migração de bancos criados antes das geometrias de arestas (bancos novos já são criados assim pelo create_all).
+-- Arestas ganham uma LINESTRING opcional e o índice parcial usado no cálculo dos pesos ausentes na ingestão.
+-- Executar uma vez, depois da 001:
+--   psql -U $USER -d geodb -f app/db/migrations/002_edge_geometries.sql
+
+BEGIN;
+
+ALTER TABLE edges ADD COLUMN IF NOT EXISTS geom geometry(LINESTRING, 4326);
+
+CREATE INDEX IF NOT EXISTS ix_edges_graph_id_missing_weight ON edges (graph_id) WHERE weight IS NULL;
+
+COMMIT;
@@ -0,0 +1,9 @@
+-- Índice espacial das geometrias de arestas, usado pelos tiles vetoriais (GET /graph/{id}/tiles/{z}/{x}/{y}.mvt).
+-- Bancos novos já são criados com ele pelo create_all. Executar uma vez, depois da 002:
+--   psql -U $USER -d geodb -f app/db/migrations/003_edge_geometry_index.sql
+
+BEGIN;
+
+CREATE INDEX IF NOT EXISTS idx_edges_geom ON edges USING gist (geom);
+
+COMMIT;
@@ -0,0 +1,202 @@
+# Arquivo responsável pela criação do esquema do banco, com particionamento declarativo opcional de nós e arestas por grafo.
+#   none: tabelas comuns (create_all)
+#   hash: GRAPH_PARTITION_COUNT partições fixas por hash do graph_id
+#   list: uma partição de nós e uma de arestas por grafo, criadas junto do grafo; remover o grafo descarta as partições
+# O modo vale para bancos novos: tabelas já existentes sem partições não são convertidas
+
+import logging
+import os
+from typing import Optional, Tuple
+
+from sqlalchemy import event, text
+from sqlalchemy.engine import Connection, Engine
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.orm import Session
+from sqlalchemy.schema import CreateIndex
+
+from app.models.graph_models import Base, Node, Edge
+
+
+GRAPH_PARTITIONING = os.environ.get("GRAPH_PARTITIONING", "none").lower()
+GRAPH_PARTITION_COUNT = int(os.environ.get("GRAPH_PARTITION_COUNT", 16))
+# Espera máxima pelo bloqueio das tabelas pai ao descartar partições (evita fila atrás de leituras longas)
+GRAPH_PARTITION_LOCK_TIMEOUT_MS = int(os.environ.get("GRAPH_PARTITION_LOCK_TIMEOUT_MS", 5000))
+
+PARTITIONING_MODES = ("none", "hash", "list")
+
+# Chave em Session.info com os grafos cujas partições aguardam o commit da ingestão
+PENDING_PARTITIONS_KEY = "pending_graph_partitions"
+
+logger = logging.getLogger(__name__)
+PARTITIONED_TABLES = (Node.__table__, Edge.__table__)
+
+# Mesmas colunas dos modelos; a chave primária e as chaves estrangeiras entre nós e arestas incluem o graph_id,
+# como o Postgres exige em tabelas particionadas
+NODES_DDL = """
+CREATE TABLE IF NOT EXISTS nodes (
+    id SERIAL NOT NULL,
+    name VARCHAR,
+    graph_id INTEGER NOT NULL,
+    geom geometry(POINT, 4326),
+    PRIMARY KEY (graph_id, id),
+    CONSTRAINT uq_nodes_graph_id_name UNIQUE (graph_id, name){foreign_keys}
+) PARTITION BY {strategy} (graph_id)
+"""
+
+EDGES_DDL = """
+CREATE TABLE IF NOT EXISTS edges (
+    id SERIAL NOT NULL,
+    graph_id INTEGER NOT NULL,
+    from_node_id INTEGER,
+    to_node_id INTEGER,
+    from_node_name VARCHAR,
+    to_node_name VARCHAR,
+    weight INTEGER,
+    geom geometry(LINESTRING, 4326),
+    PRIMARY KEY (graph_id, id){foreign_keys}
+) PARTITION BY {strategy} (graph_id)
+"""
+
+# Chaves estrangeiras nas tabelas pai (modo hash, partições fixas)
+NODES_FOREIGN_KEYS = """,
+    FOREIGN KEY (graph_id) REFERENCES graphs (id)"""
+
+EDGES_FOREIGN_KEYS = """,
+    FOREIGN KEY (graph_id) REFERENCES graphs (id),
+    FOREIGN KEY (graph_id, from_node_id) REFERENCES nodes (graph_id, id),
+    FOREIGN KEY (graph_id, to_node_id) REFERENCES nodes (graph_id, id)"""
+
+# Modo list: as arestas de um grafo referenciam direto a partição de nós do mesmo grafo
+EDGES_PARTITION_FOREIGN_KEYS = """
+ALTER TABLE {edges}
+    ADD FOREIGN KEY (graph_id, from_node_id) REFERENCES {nodes} (graph_id, id),
+    ADD FOREIGN KEY (graph_id, to_node_id) REFERENCES {nodes} (graph_id, id)
+"""
+
+
+def partition_name(table: str, graph_id: int) -> str:
+    return f"{table}_g{int(graph_id)}"
+
+
+def _is_partitioned(conn: Connection, table: str) -> bool:
+    return conn.execute(text("SELECT relkind FROM pg_class WHERE oid = to_regclass(:table)"), {"table": table}).scalar() == "p"
+
+
+def _table_exists(conn: Connection, table: str) -> bool:
+    return conn.execute(text("SELECT to_regclass(:table) IS NOT NULL"), {"table": table}).scalar()
+
+
+# Cria as tabelas da aplicação (substitui o create_all chamado na inicialização)
+def create_schema(engine: Engine, partitioning: str = GRAPH_PARTITIONING, partitions: int = GRAPH_PARTITION_COUNT) -> None:
+    if partitioning not in PARTITIONING_MODES:
+        raise ValueError(f"GRAPH_PARTITIONING must be one of {', '.join(PARTITIONING_MODES)}, got {partitioning!r}")
+
+    if partitioning == "none":
+        Base.metadata.create_all(bind=engine)
+        return
+
+    with engine.begin() as conn:
+        for table in PARTITIONED_TABLES:
+            if _table_exists(conn, table.name) and not _is_partitioned(conn, table.name):
+                raise RuntimeError(f"GRAPH_PARTITIONING={partitioning} but table {table.name} already exists without partitions")
+
+        others = [table for table in Base.metadata.sorted_tables if table not in PARTITIONED_TABLES]
+        Base.metadata.create_all(bind=conn, tables=others)
+
+        # No modo list as chaves estrangeiras ficam nas partições de cada grafo (ver create_graph_partitions)
+        if partitioning == "list":
+            conn.execute(text(NODES_DDL.format(strategy="LIST", foreign_keys="")))
+            conn.execute(text(EDGES_DDL.format(strategy="LIST", foreign_keys="")))
+        else:
+            conn.execute(text(NODES_DDL.format(strategy="HASH", foreign_keys=NODES_FOREIGN_KEYS)))
+            conn.execute(text(EDGES_DDL.format(strategy="HASH", foreign_keys=EDGES_FOREIGN_KEYS)))
+
+        # Índices dos modelos, criados na tabela pai e herdados por todas as partições
+        for table in PARTITIONED_TABLES:
+            for index in table.indexes:
+                conn.execute(CreateIndex(index, if_not_exists=True))
+
+        if partitioning == "hash":
+            for table in PARTITIONED_TABLES:
+                for remainder in range(partitions):
+                    conn.execute(text(
+                        f"CREATE TABLE IF NOT EXISTS {table.name}_p{remainder} PARTITION OF {table.name} "
+                        f"FOR VALUES WITH (MODULUS {partitions}, REMAINDER {remainder})"
+                    ))
+
+
+# Modo list: reserva o id de um grafo novo na sequência e cria as partições de nós e arestas em uma transação própria
+# e curta, antes da transação da ingestão (o ATTACH mantém um bloqueio nas tabelas pai até o commit). As chaves
+# estrangeiras ligam apenas as duas partições novas: clonadas das tabelas pai, elas exigiriam bloqueios em graphs e
+# nodes que conflitam com as ingestões em andamento. Nos demais modos devolve None e o id sai do próprio INSERT
+def create_graph_partitions(bind: Engine, partitioning: str = GRAPH_PARTITIONING) -> Optional[int]:
+    if partitioning != "list":
+        return None
+
+    with bind.connect() as conn:
+        graph_id = conn.execute(text("SELECT nextval(pg_get_serial_sequence('graphs', 'id'))")).scalar()
+        nodes, edges = partition_name("nodes", graph_id), partition_name("edges", graph_id)
+
+        conn.execute(text(f"CREATE TABLE {nodes} (LIKE nodes INCLUDING DEFAULTS)"))
+        conn.execute(text(f"ALTER TABLE nodes ATTACH PARTITION {nodes} FOR VALUES IN ({int(graph_id)})"))
+        conn.execute(text(f"CREATE TABLE {edges} (LIKE edges INCLUDING DEFAULTS)"))
+        conn.execute(text(EDGES_PARTITION_FOREIGN_KEYS.format(edges=edges, nodes=nodes)))
+        conn.execute(text(f"ALTER TABLE edges ATTACH PARTITION {edges} FOR VALUES IN ({int(graph_id)})"))
+        conn.commit()
+    return graph_id
+
+
+# Descarta as partições de um grafo (modo list) e devolve (nós, arestas) removidos. Cada partição é desanexada com
+# DETACH PARTITION CONCURRENTLY, que não bloqueia as leituras das tabelas pai (um DROP direto exigiria ACCESS
+# EXCLUSIVE em nodes/edges), e só então removida. Roda em conexão própria em autocommit, pois o CONCURRENTLY não
+# aceita bloco de transação; uma desanexação interrompida (lock_timeout) é concluída com FINALIZE na nova tentativa.
+# As arestas saem primeiro, pois referenciam a partição de nós
+def drop_graph_partitions(graph_id: int, bind: Engine) -> Tuple[int, int]:
+    counts = []
+    with bind.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        conn.execute(text(f"SET lock_timeout = {GRAPH_PARTITION_LOCK_TIMEOUT_MS}"))
+        try:
+            for table in ("edges", "nodes"):
+                partition = partition_name(table, graph_id)
+                if not _table_exists(conn, partition):
+                    counts.append(0)
+                    continue
+                counts.append(conn.execute(text(f"SELECT count(*) FROM {partition}")).scalar())
+
+                detach_pending = conn.execute(
+                    text("SELECT inhdetachpending FROM pg_inherits WHERE inhrelid = to_regclass(:partition)"), {"partition": partition}
+                ).scalar()
+                if detach_pending is not None:
+                    mode = "FINALIZE" if detach_pending else "CONCURRENTLY"
+                    conn.execute(text(f"ALTER TABLE {table} DETACH PARTITION {partition} {mode}"))
+                conn.execute(text(f"DROP TABLE {partition}"))
+        finally:
+            conn.execute(text("RESET lock_timeout"))
+
+    edges_deleted, nodes_deleted = counts
+    return nodes_deleted, edges_deleted
+
+
+# Modo list: as partições de um grafo novo são confirmadas antes da transação da ingestão. Se essa transação terminar
+# sem commit (erro, cliente desconectado, sessão fechada), as partições do id reservado são descartadas; sem isso
+# ficariam órfãs, já que o grafo nunca chega a existir para ser removido
+def discard_partitions_unless_committed(graph_id: int, db: Session) -> None:
+    if not event.contains(db, "after_transaction_end", _discard_pending_partitions):
+        event.listen(db, "after_commit", _keep_pending_partitions)
+        event.listen(db, "after_transaction_end", _discard_pending_partitions)
+    db.info.setdefault(PENDING_PARTITIONS_KEY, []).append(graph_id)
+
+
+def _keep_pending_partitions(session: Session) -> None:
+    session.info.pop(PENDING_PARTITIONS_KEY, None)
+
+
+def _discard_pending_partitions(session: Session, transaction) -> None:
+    if transaction.parent is not None:
+        return
+    for graph_id in session.info.pop(PENDING_PARTITIONS_KEY, []):
+        try:
+            drop_graph_partitions(graph_id, session.get_bind())
+        except SQLAlchemyError as e:
+            # Não mascara o erro original da ingestão; as partições ficam para remoção manual
+            logger.warning("Could not drop partitions of graph %s after a failed ingestion: %s", graph_id, e)
@@ -1,14 +1,22 @@
 from fastapi import FastAPI
 
-from app.db.database import engine
-from app.models.graph_models import Base as GraphBase
+from app.db.database import engine, async_engine
+from app.core.executor import shutdown_routing_executor
+from app.db.partitioning import create_schema
 from app.routers import graph_routers, users_routers
 
 
 app = FastAPI()
 
-GraphBase.metadata.create_all(bind=engine)
+# Tabelas da aplicação, com nós e arestas particionados por grafo conforme GRAPH_PARTITIONING
+create_schema(engine)
 
 
 app.include_router(users_routers.router, prefix="/users", tags=["users"])
 app.include_router(graph_routers.router, prefix="/graph", tags=["graph"])
+
+
+@app.on_event("shutdown")
+async def close_connections():
+    shutdown_routing_executor()
+    await async_engine.dispose()
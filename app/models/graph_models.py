@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, ForeignKey
+from sqlalchemy import Column, Integer, String, ForeignKey, Index, LargeBinary, UniqueConstraint, text
 from sqlalchemy.orm import relationship
 from geoalchemy2 import Geometry
 from sqlalchemy.orm import declarative_base
@@ -22,13 +22,22 @@ class Node(Base):
     __tablename__ = "nodes"
 
     id = Column(Integer, primary_key=True, index=True)
-    name = Column(String, index=True, unique=True)
+    name = Column(String, index=True)
     graph_id = Column(Integer, ForeignKey("graphs.id"))
-    geom = Column(Geometry(geometry_type="POINT", srid=4326))
+    geom = Column(Geometry(geometry_type="POINT", srid=4326, spatial_index=False))
 
     graph = relationship("Graph", back_populates="nodes")
-    edges_from = relationship("Edge", foreign_keys="[Edge.from_node_name]", back_populates="from_node")
-    edges_to = relationship("Edge", foreign_keys="[Edge.to_node_name]", back_populates="to_node")
+    edges_from = relationship("Edge", foreign_keys="[Edge.from_node_id]", back_populates="from_node")
+    edges_to = relationship("Edge", foreign_keys="[Edge.to_node_id]", back_populates="to_node")
+
+    __table_args__ = (
+        # Índice GiST explícito (mesmo nome do gerado pelo GeoAlchemy2), usado na busca KNN (<->) do nó mais próximo
+        Index("idx_nodes_geom", "geom", postgresql_using="gist"),
+        # Nomes únicos dentro de cada grafo; o índice (graph_id, name) também resolve nomes por grafo
+        UniqueConstraint("graph_id", "name", name="uq_nodes_graph_id_name"),
+        # Carregamento dos nós de um grafo em ordem de id (camada de carregamento)
+        Index("ix_nodes_graph_id_id", "graph_id", "id"),
+    )
 
 
 # Definindo modelos edges(arestas)
@@ -37,13 +46,41 @@ class Edge(Base):
 
     id = Column(Integer, primary_key=True, index=True)
     graph_id = Column(Integer, ForeignKey("graphs.id"))
-    from_node_name = Column(String, ForeignKey("nodes.name"))
-    to_node_name = Column(String, ForeignKey("nodes.name"))
+    from_node_id = Column(Integer, ForeignKey("nodes.id"), index=True)
+    to_node_id = Column(Integer, ForeignKey("nodes.id"), index=True)
+    # Nomes das extremidades, copiados dos nós (que não mudam de nome) para as respostas e consultas por nome
+    from_node_name = Column(String)
+    to_node_name = Column(String)
+    # Sem peso informado na ingestão, recebe o comprimento em metros (ver graph_ingest.derive_edge_weights)
     weight = Column(Integer)
+    # Geometria opcional; sem ela a aresta é o segmento reto entre os nós
+    geom = Column(Geometry(geometry_type="LINESTRING", srid=4326, spatial_index=False))
 
     graph = relationship("Graph", back_populates="edges")
-    from_node = relationship("Node", foreign_keys=[from_node_name], back_populates="edges_from")
-    to_node = relationship("Node", foreign_keys=[to_node_name], back_populates="edges_to")
+    from_node = relationship("Node", foreign_keys=[from_node_id], back_populates="edges_from")
+    to_node = relationship("Node", foreign_keys=[to_node_id], back_populates="edges_to")
+
+    __table_args__ = (
+        # Carregamento das arestas de um grafo em ordem de id (camada de carregamento)
+        Index("ix_edges_graph_id_id", "graph_id", "id"),
+        # Alterações de arestas identificadas por (from_node_name, to_node_name) dentro do grafo
+        Index("ix_edges_graph_id_from_to", "graph_id", "from_node_name", "to_node_name"),
+        # Arestas aguardando o cálculo do peso; parcial, fica vazio fora da ingestão
+        Index("ix_edges_graph_id_missing_weight", "graph_id", postgresql_where=text("weight IS NULL")),
+        # Arestas com geometria que cruzam um tile vetorial (graph_tiles)
+        Index("idx_edges_geom", "geom", postgresql_using="gist"),
+    )
+
+
+# Índice de rotas pré-calculado (landmarks do ALT) de um grafo, válido enquanto o fingerprint coincidir com o grafo
+class RoutingIndex(Base):
+    __tablename__ = "routing_indexes"
+
+    graph_id = Column(Integer, ForeignKey("graphs.id"), primary_key=True)
+    kind = Column(String, default="alt")
+    landmarks = Column(Integer)
+    fingerprint = Column(String)
+    data = Column(LargeBinary)
 
 
 class User(Base):
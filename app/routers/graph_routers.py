@@ -1,11 +1,28 @@
 # app/routers/graph.py
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, BackgroundTasks, Depends, File, Form, HTTPException, Query, Request, Response, UploadFile
+from fastapi.responses import ORJSONResponse, StreamingResponse
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
-from typing import List, Optional
-from app.db.database import get_db
+from typing import List, Literal, Optional
+import threading
+from app.db import database
+from app.db.database import get_db, get_async_db
 from app.schemas import graph_schemas
-from app.controllers.graph_controls import create_graph, get_graph, find_all_routes, delete_graph_by_id, find_shortest_route
-from app.models.graph_models import User
+from app.controllers.graph_controls import (
+    create_graph, update_graph_by_id, delete_graph_by_id, schedule_graph_deletion, load_compiled_graph_async, all_routes_for_graph_async, stream_routes_for_graph,
+    shortest_route_for_graph, shortest_routes_for_graph, distance_matrix_for_graph, find_nearest_nodes, shortest_route_by_coordinates_for_graph,
+    build_routing_index, rebuild_routing_index_if_present, get_routing_index_status
+)
+from app.core.executor import run_routing, iterate_in_routing_executor
+from app.controllers.graph_cache import graph_cache
+from app.controllers.routing_index import ROUTING_INDEX_LANDMARKS
+from app.controllers.graph_ingest import create_graph_from_stream
+from app.controllers.graph_export import export_graph
+from app.controllers.graph_patch import patch_graph, stream_edge_weights
+from app.controllers.graph_columnar import export_graph_table, import_graph_columnar
+from app.controllers.graph_spatial import find_nodes_in_region, find_subgraph_in_region
+from app.controllers.graph_tiles import get_graph_tile, tile_cache
+from app.models.graph_models import Graph
 from app.core.auth_bearer import JWTBearer
 
 router = APIRouter()
@@ -18,51 +35,272 @@ def create_new_graph(graph: graph_schemas.GraphCreate, db: Session = Depends(get
     """
     return create_graph(graph, db)
 
-@router.get("/{graph_id}", response_model=graph_schemas.GraphResponse, dependencies=[Depends(JWTBearer())], summary="Get a graph by Id" )
-def read_graph(graph_id: int, db: Session = Depends(get_db)):
+@router.post("/create/stream", response_model=graph_schemas.GraphIngestResponse, summary="Create a new graph from an NDJSON stream")
+async def create_new_graph_from_stream(request: Request, db: Session = Depends(get_db)):
     """
-        Get a graph by its ID in the database 
+        Create a new graph from an NDJSON body, inserted in batches inside a single transaction.
+        The first line is the graph header ({"type": "graph", "name": ...}), followed by
+        {"type": "node", ...} and {"type": "edge", ...} lines; edges may only reference nodes sent before them
     """
-    graph = get_graph(graph_id, db)
-    if not graph:
-        raise HTTPException(status_code=404, detail="Graph not found")
-    return graph
+    return await create_graph_from_stream(request.stream(), db)
+
+@router.post("/import", response_model=graph_schemas.GraphIngestResponse, summary="Create a new graph from Arrow/Parquet files")
+def import_graph(name: str = Form(...), nodes: UploadFile = File(...), edges: UploadFile = File(...), db: Session = Depends(get_db)):
+    """
+        Create a new graph from two columnar files (Arrow IPC stream/file or Parquet), inserted in batches inside a single transaction.
+        nodes needs the columns name, longitude and latitude; edges needs from_node_name, to_node_name and weight
+    """
+    return import_graph_columnar(name, nodes.file, edges.file, db)
+
+
+@router.get("/cache/stats", summary="Get routing graph cache statistics")
+def read_cache_stats():
+    """
+        Get hit/miss/rebuild counters and the current size of the in-memory routing graph cache, and the counters of
+        the vector tile cache under "tiles"
+    """
+    return {**graph_cache.stats(), "tiles": tile_cache.stats()}
+
+
+@router.get("/{graph_id}", response_model=graph_schemas.GraphResponse, dependencies=[Depends(JWTBearer())], summary="Get a graph by Id",
+            responses={200: {"content": {"application/x-ndjson": {}, "application/msgpack": {}}}})
+def read_graph(graph_id: int, request: Request, db: Session = Depends(get_db)):
+    """
+        Get a graph by its ID in the database, streamed straight from the database cursor.
+        The format follows the Accept header: application/json (default, same shape as GraphResponse),
+        application/x-ndjson (the same lines accepted by /create/stream) or application/msgpack
+    """
+    return export_graph(graph_id, request.headers.get("accept"), db, database.Session)
+
+@router.get("/{graph_id}/export/{table}.{file_format}", dependencies=[Depends(JWTBearer())], summary="Export the nodes or edges of a graph as Arrow/Parquet",
+            response_class=StreamingResponse)
+def export_graph_columnar(graph_id: int, table: Literal["nodes", "edges"], file_format: Literal["arrow", "parquet"], db: Session = Depends(get_db)):
+    """
+        Export the nodes (id, name, longitude, latitude) or edges (id, from_node_name, to_node_name, weight) table of a graph,
+        streamed from the database cursor as an Arrow IPC stream or a Parquet file with one row group per batch
+    """
+    return export_graph_table(graph_id, table, file_format, db, database.Session)
 
 
 @router.put("/{graph_id}", response_model=graph_schemas.GraphResponse, summary="Update a graph by Id")
-def update_graph(graph_id: int, graph: graph_schemas.GraphCreate, db: Session = Depends(get_db)):
+def update_graph(graph_id: int, graph: graph_schemas.GraphCreate, background_tasks: BackgroundTasks, db: Session = Depends(get_db)):
     """
-        Update a graph by its ID in the database with the provided nodes and edges
+        Replace the name, nodes and edges of a graph by its ID with the provided ones.
+        If the graph has a routing index, it is rebuilt in the background
     """
-    update_graph = create_graph(graph, db)    
-    if not update_graph:
-        raise HTTPException(status_code=404, detail="Graph not found")
+    update_graph = update_graph_by_id(graph_id, graph, db)
+    background_tasks.add_task(rebuild_routing_index_if_present, graph_id, database.Session)
     return update_graph
 
+
+@router.patch("/{graph_id}", response_model=graph_schemas.GraphPatchResponse, summary="Incrementally update a graph by Id")
+def patch_graph_by_id(graph_id: int, patch: graph_schemas.GraphPatch, background_tasks: BackgroundTasks, db: Session = Depends(get_db)):
+    """
+        Add, remove or update specific nodes and edges of a graph in a single transaction; only the affected rows are written
+        and the cached routing graph is updated in memory. Edges are identified by (from_node_name, to_node_name);
+        removing a node also removes its edges. If the graph has a routing index, it is rebuilt in the background
+    """
+    response = patch_graph(graph_id, patch, db)
+    background_tasks.add_task(rebuild_routing_index_if_present, graph_id, database.Session)
+    return response
+
+
+@router.patch("/{graph_id}/edges/weights", response_model=graph_schemas.GraphPatchResponse, summary="Update the weights of many edges")
+def update_edge_weights(graph_id: int, batch: graph_schemas.EdgeWeightBatch, background_tasks: BackgroundTasks, db: Session = Depends(get_db)):
+    """
+        Update the weight of many edges (from_node_name, to_node_name, weight) in one call.
+        The cached routing graph only gets a new weights array, sharing its topology with the previous version
+    """
+    response = patch_graph(graph_id, graph_schemas.GraphPatch(update_edges=batch.edges), db)
+    background_tasks.add_task(rebuild_routing_index_if_present, graph_id, database.Session)
+    return response
+
+
+@router.post("/{graph_id}/edges/weights/stream", response_model=graph_schemas.EdgeWeightStreamResponse, summary="Stream edge weight updates as NDJSON")
+async def stream_edge_weight_updates(graph_id: int, request: Request, background_tasks: BackgroundTasks, db: Session = Depends(get_db)):
+    """
+        Apply a live NDJSON feed of {"from_node_name", "to_node_name", "weight"} lines. Repeated updates to the same edge
+        within a time window are coalesced and each window is applied in one transaction and published to the cached
+        routing graph at once, so route queries never see a half-applied batch. Unknown edges are counted and skipped
+    """
+    response = await stream_edge_weights(graph_id, request.stream(), db)
+    background_tasks.add_task(rebuild_routing_index_if_present, graph_id, database.Session)
+    return response
+
 # rota de deleção de grafo
 @router.delete("/{graph_id}", response_model=graph_schemas.GraphDelete, summary="Delete a graph by Id")
-def remove_graph(graph_id: int, db: Session = Depends(get_db)):
+def remove_graph(graph_id: int, background_tasks: BackgroundTasks, response: Response, background: bool = False, db: Session = Depends(get_db)):
     """
-        Delete a graph by its ID in the database
+        Delete a graph by its ID in the database, with its nodes, edges and routing index, in a single transaction.
+        The response carries the number of deleted nodes and edges. With background=true the deletion is only
+        scheduled and the response (202) returns immediately, which suits very large graphs
     """
+    if background:
+        response.status_code = 202
+        return schedule_graph_deletion(graph_id, background_tasks, db, database.Session)
+
     graph = delete_graph_by_id(graph_id, db)
     if not graph:
         raise HTTPException(status_code=404, detail="Graph not found")
     return graph
 
 
+# As rotas de consulta de caminhos são assíncronas: o grafo é carregado via asyncpg (ou cache)
+# e o cálculo, que usa CPU, roda no executor limitado de rotas
+
 @router.get("/graph/{graph_id}/routes", response_model=List[graph_schemas.RouteResponse], summary="Get all routes between two nodes")  
-def get_all_routes(graph_id: int, start_node: str, end_node: str, max_stops: Optional[int] = None, db: Session = Depends(get_db)):
+async def get_all_routes(graph_id: int, start_node: str, end_node: str, request: Request, response: Response, max_stops: Optional[int] = Query(None, ge=0),
+                         limit: Optional[int] = Query(None, ge=1), cursor: Optional[str] = None, max_cost: Optional[int] = None,
+                         order_by: Optional[Literal["cost"]] = None, k: Optional[int] = Query(None, ge=1, le=1000),
+                         time_budget: Optional[float] = Query(None, gt=0), max_routes: Optional[int] = Query(None, ge=1),
+                         db: AsyncSession = Depends(get_async_db)):
     """
-        Get all routes between two nodes in the graph
+        Get all routes between two nodes in the graph, each with its total cost and hop count.
+        max_stops and max_cost prune the search; order_by=cost returns the cheapest routes first (combined with limit, only the cheapest limit routes).
+        Without order_by, when limit is reached the X-Next-Cursor header carries the cursor for the next page.
+        With k, only the k cheapest loopless routes are computed (k-shortest-paths), in increasing cost order.
+        The enumeration runs in a separate process within a time budget (time_budget, seconds) and a route budget (max_routes),
+        both capped by the server; when a budget stops the search the X-Routes-Truncated header is set. Disconnecting cancels the search
     """
-    return find_all_routes(graph_id, start_node, end_node, max_stops, db)
+    compiled = await load_compiled_graph_async(graph_id, db)
+    return await all_routes_for_graph_async(compiled, start_node, end_node, max_stops, limit=limit, cursor=cursor, response=response,
+                                            max_cost=max_cost, order_by=order_by, k=k, time_budget=time_budget, max_routes=max_routes,
+                                            request=request)
+
+
+@router.get("/graph/{graph_id}/routes/stream", summary="Stream all routes between two nodes as NDJSON")
+async def stream_routes(graph_id: int, start_node: str, end_node: str, max_stops: Optional[int] = Query(None, ge=0),
+                        limit: Optional[int] = Query(None, ge=1), cursor: Optional[str] = None, max_cost: Optional[int] = None,
+                        k: Optional[int] = Query(None, ge=1, le=1000), time_budget: Optional[float] = Query(None, gt=0),
+                        db: AsyncSession = Depends(get_async_db)):
+    """
+        Stream the routes between two nodes as NDJSON, one RouteResponse per line, as soon as they are found.
+        With k, the k cheapest routes are streamed in increasing cost order.
+        When limit is reached, a final {"next_cursor": ...} line is sent; when the time budget stops the search,
+        a final {"truncated": true, "next_cursor": ...} line is sent
+    """
+    compiled = await load_compiled_graph_async(graph_id, db)
+    # Sinaliza à busca que o cliente desconectou (ou o envio terminou)
+    closed = threading.Event()
+    lines = await run_routing(stream_routes_for_graph, compiled, start_node, end_node, max_stops, limit=limit, cursor=cursor, max_cost=max_cost, k=k,
+                              time_budget=time_budget, cancelled=closed.is_set)
+    return StreamingResponse(iterate_in_routing_executor(lines, on_close=closed.set), media_type="application/x-ndjson")
 
 
 
 @router.get("/graph/{graph_id}/shortest_route", response_model=graph_schemas.RouteResponse, summary="Get the shortest route between two nodes")
-def get_shortest_route(graph_id: int, start_node: str, end_node: str, db: Session = Depends(get_db)):
+async def get_shortest_route(graph_id: int, start_node: str, end_node: str, algorithm: Optional[Literal["dijkstra", "astar", "alt"]] = None,
+                             heuristic_scale: Optional[float] = Query(None, ge=0), corridor_m: Optional[float] = Query(None, gt=0),
+                             db: AsyncSession = Depends(get_async_db)):
+    """
+        Get the shortest route between two nodes in the graph, with Dijkstra, A* or ALT.
+        A* is guided by the great-circle distance to the destination times heuristic_scale (weight units per meter);
+        by default the largest scale that keeps the heuristic admissible for the graph is used, so the route stays optimal.
+        ALT uses the graph's precomputed landmark index and is the default when the index exists (Dijkstra otherwise).
+        With corridor_m, only nodes within that many meters of the straight line between start and end are searched
+        (the route is the shortest inside the corridor). The response reports the algorithm and the number of nodes expanded
+    """
+    compiled = await load_compiled_graph_async(graph_id, db)
+    return await run_routing(shortest_route_for_graph, compiled, start_node, end_node, algorithm, heuristic_scale, corridor_m)
+
+
+@router.get("/graph/{graph_id}/shortest_route/by_coordinates", response_model=graph_schemas.SnappedRouteResponse,
+            summary="Get the shortest route between two coordinates")
+async def get_shortest_route_by_coordinates(graph_id: int, start_lon: float = Query(..., ge=-180, le=180), start_lat: float = Query(..., ge=-90, le=90),
+                                            end_lon: float = Query(..., ge=-180, le=180), end_lat: float = Query(..., ge=-90, le=90),
+                                            max_distance_m: Optional[float] = Query(None, gt=0), algorithm: Optional[Literal["dijkstra", "astar", "alt"]] = None,
+                                            heuristic_scale: Optional[float] = Query(None, ge=0), corridor_m: Optional[float] = Query(None, gt=0),
+                                            db: AsyncSession = Depends(get_async_db)):
+    """
+        Get the shortest route between two lon/lat coordinates, each snapped to its nearest node.
+        start_snap and end_snap report the snapped nodes and their distance in meters; with max_distance_m,
+        a coordinate farther than that from every node is rejected. algorithm, heuristic_scale and corridor_m work as in shortest_route
+    """
+    compiled = await load_compiled_graph_async(graph_id, db)
+    return await run_routing(shortest_route_by_coordinates_for_graph, compiled, start_lon, start_lat, end_lon, end_lat, max_distance_m,
+                             algorithm, heuristic_scale, corridor_m)
+
+
+@router.post("/graph/{graph_id}/routing_index", response_model=graph_schemas.RoutingIndexResponse, status_code=202,
+             summary="Build the routing index of a graph")
+def create_routing_index(graph_id: int, background_tasks: BackgroundTasks, landmarks: int = Query(ROUTING_INDEX_LANDMARKS, ge=1, le=64), db: Session = Depends(get_db)):
+    """
+        Build (or rebuild) the ALT landmark index of the graph in the background and persist it next to the graph.
+        Once ready, shortest-route queries use it transparently; it is rebuilt when the graph is updated
+    """
+    if db.get(Graph, graph_id) is None:
+        raise HTTPException(status_code=404, detail="Graph not found")
+    background_tasks.add_task(build_routing_index, graph_id, database.Session, landmarks)
+    return graph_schemas.RoutingIndexResponse(graph_id=graph_id, status="scheduled", kind="alt", landmarks=landmarks)
+
+
+@router.get("/graph/{graph_id}/routing_index", response_model=graph_schemas.RoutingIndexResponse, summary="Get the routing index status of a graph")
+async def read_routing_index(graph_id: int, db: AsyncSession = Depends(get_async_db)):
+    """
+        Get the routing index of the graph: active (valid for the cached graph), stale (being rebuilt), unknown (graph not
+        loaded yet; checked on the next route query) or missing
+    """
+    return await get_routing_index_status(graph_id, db)
+
+
+@router.get("/graph/{graph_id}/nearest_node", response_model=List[graph_schemas.NearestNodeResponse], summary="Get the nodes nearest to a coordinate")
+async def get_nearest_node(graph_id: int, lon: float = Query(..., ge=-180, le=180), lat: float = Query(..., ge=-90, le=90),
+                           k: int = Query(1, ge=1, le=100), db: AsyncSession = Depends(get_async_db)):
+    """
+        Get the k nodes nearest to a lon/lat coordinate, closest first, with their distance in meters
+    """
+    return await find_nearest_nodes(graph_id, lon, lat, k, db)
+
+
+@router.get("/graph/{graph_id}/nodes", response_model=List[graph_schemas.NodeResponse], summary="Get the nodes inside a bounding box or radius")
+async def get_nodes_in_region(graph_id: int, response: Response, bbox: Optional[str] = None, lon: Optional[float] = Query(None, ge=-180, le=180),
+                              lat: Optional[float] = Query(None, ge=-90, le=90), radius_m: Optional[float] = Query(None, gt=0),
+                              limit: Optional[int] = Query(None, ge=1, le=10000), cursor: Optional[int] = Query(None, ge=0),
+                              db: AsyncSession = Depends(get_async_db)):
+    """
+        Get the nodes of the graph inside bbox (min_lon,min_lat,max_lon,max_lat) or within radius_m meters of lon/lat,
+        in id order. Results are paginated: when there are more nodes, X-Next-Cursor holds the cursor for the next page
+    """
+    return await find_nodes_in_region(graph_id, db, bbox, lon, lat, radius_m, limit, cursor, response)
+
+
+@router.get("/graph/{graph_id}/subgraph", response_model=graph_schemas.GraphResponse, summary="Get the part of a graph inside a bounding box or radius")
+async def get_subgraph_in_region(graph_id: int, response: Response, bbox: Optional[str] = None, lon: Optional[float] = Query(None, ge=-180, le=180),
+                                 lat: Optional[float] = Query(None, ge=-90, le=90), radius_m: Optional[float] = Query(None, gt=0),
+                                 limit: Optional[int] = Query(None, ge=1, le=10000), cursor: Optional[int] = Query(None, ge=0),
+                                 db: AsyncSession = Depends(get_async_db)):
+    """
+        Get the subgraph induced by the region (bbox or lon/lat/radius_m, as in /nodes): the nodes inside it and the
+        edges between them. Pages follow the nodes (X-Next-Cursor); each edge is returned with the page of its start node
+    """
+    return await find_subgraph_in_region(graph_id, db, bbox, lon, lat, radius_m, limit, cursor, response)
+
+
+@router.get("/{graph_id}/tiles/{z}/{x}/{y}.mvt", summary="Get a vector tile of a graph",
+            responses={200: {"content": {"application/vnd.mapbox-vector-tile": {}}}})
+async def read_graph_tile(graph_id: int, z: int, x: int, y: int, request: Request, db: AsyncSession = Depends(get_async_db)):
+    """
+        Get the Mapbox vector tile z/x/y (XYZ scheme) of the graph, with the layer "edges" (simplified for the zoom level)
+        and, from TILE_NODES_MIN_ZOOM, the layer "nodes". Responses carry an ETag; If-None-Match returns 304
+    """
+    return await get_graph_tile(graph_id, z, x, y, request.headers.get("if-none-match"), db)
+
+
+@router.post("/graph/{graph_id}/shortest_routes", response_model=graph_schemas.ShortestRouteBatchResponse, summary="Get the shortest routes for many node pairs")
+async def get_shortest_routes(graph_id: int, batch: graph_schemas.ShortestRouteBatchRequest, db: AsyncSession = Depends(get_async_db)):
+    """
+        Get the shortest route for each (start_node, end_node) pair in one call.
+        Pairs sharing a start node are answered from a single Dijkstra tree; pairs without a route carry an error instead
+    """
+    compiled = await load_compiled_graph_async(graph_id, db)
+    return await run_routing(shortest_routes_for_graph, compiled, batch.pairs)
+
+
+@router.post("/graph/{graph_id}/distance_matrix", response_model=graph_schemas.DistanceMatrixResponse, response_class=ORJSONResponse, summary="Get the cost matrix between two sets of nodes")
+async def get_distance_matrix(graph_id: int, request: graph_schemas.DistanceMatrixRequest, db: AsyncSession = Depends(get_async_db)):
     """
-        Get the shortest route between two nodes in the graph
+        Get the shortest-route cost between every source and every target node in one pass.
+        costs[i][j] is the cost from sources[i] to targets[j], or null when there is no route
     """
-    return find_shortest_route(graph_id, start_node, end_node, db)
\ No newline at end of file
+    compiled = await load_compiled_graph_async(graph_id, db)
+    return await run_routing(distance_matrix_for_graph, compiled, request.sources, request.targets)
@@ -1,5 +1,5 @@
-from pydantic import BaseModel
-from typing import List, Optional
+from pydantic import BaseModel, Field
+from typing import List, Optional, Tuple
 
 class NodeCreate(BaseModel):
     name: str
@@ -17,6 +17,16 @@ class NodeResponse(BaseModel):
 
 
 class EdgeCreate(BaseModel):
+    from_node_name: str
+    to_node_name: str
+    # Sem peso, o servidor usa o comprimento da aresta em metros (da geometria ou do segmento reto entre os nós)
+    weight: Optional[int] = None
+    # Geometria opcional da aresta (LINESTRING): pontos [longitude, latitude] do nó de origem ao de destino
+    coordinates: Optional[List[Tuple[float, float]]] = Field(None, min_length=2)
+
+
+# Novo peso de uma aresta existente (alterações e streams de pesos)
+class EdgeWeight(BaseModel):
     from_node_name: str
     to_node_name: str
     weight: int
@@ -45,11 +55,116 @@ class GraphResponse(BaseModel):
     class Config:
         from_attributes = True 
 
+class GraphIngestResponse(BaseModel):
+    id: int
+    name: str
+    nodes_created: int
+    edges_created: int
+
+
+class EdgeRef(BaseModel):
+    from_node_name: str
+    to_node_name: str
+
+
+# Alteração incremental de um grafo; aplicada na ordem: remoções de arestas e nós, inclusões de nós e arestas,
+# atualizações de coordenadas (update_nodes) e de pesos (update_edges)
+class GraphPatch(BaseModel):
+    name: Optional[str] = None
+    add_nodes: List[NodeCreate] = []
+    update_nodes: List[NodeCreate] = []
+    remove_nodes: List[str] = []
+    add_edges: List[EdgeCreate] = []
+    update_edges: List[EdgeWeight] = []
+    remove_edges: List[EdgeRef] = []
+
+
+class EdgeWeightBatch(BaseModel):
+    edges: List[EdgeWeight] = Field(..., min_length=1)
+
+
+class GraphPatchResponse(BaseModel):
+    id: int
+    name: str
+    nodes_added: int = 0
+    nodes_updated: int = 0
+    nodes_removed: int = 0
+    edges_added: int = 0
+    edges_updated: int = 0
+    edges_removed: int = 0
+
+
+class EdgeWeightStreamResponse(BaseModel):
+    id: int
+    updates_received: int = 0
+    edges_updated: int = 0
+    edges_not_found: int = 0
+    batches: int = 0
+
+
 class GraphDelete(BaseModel):
     id: int
+    name: Optional[str] = None
+    message: str
+    nodes_deleted: Optional[int] = None
+    edges_deleted: Optional[int] = None
     
 
 class RouteResponse(BaseModel):
     route: List[NodeResponse]
-    
+    cost: Optional[int] = None
+    hops: Optional[int] = None
+    algorithm: Optional[str] = None
+    nodes_expanded: Optional[int] = None
+
+
+class NearestNodeResponse(BaseModel):
+    node: NodeResponse
+    distance_m: float
+
+
+class SnappedRouteResponse(RouteResponse):
+    start_snap: NearestNodeResponse
+    end_snap: NearestNodeResponse
+
+
+class RoutingIndexResponse(BaseModel):
+    graph_id: int
+    status: str
+    kind: Optional[str] = None
+    landmarks: Optional[int] = None
+    fingerprint: Optional[str] = None
+    size_bytes: Optional[int] = None
+
+
+class RoutePair(BaseModel):
+    start_node: str
+    end_node: str
+
+
+class ShortestRouteBatchRequest(BaseModel):
+    pairs: List[RoutePair] = Field(..., min_length=1, max_length=10000)
+
+
+class ShortestRouteBatchItem(BaseModel):
+    start_node: str
+    end_node: str
+    route: Optional[List[NodeResponse]] = None
+    cost: Optional[int] = None
+    hops: Optional[int] = None
+    error: Optional[str] = None
+
+
+class ShortestRouteBatchResponse(BaseModel):
+    routes: List[ShortestRouteBatchItem]
+
+
+class DistanceMatrixRequest(BaseModel):
+    sources: List[str] = Field(..., min_length=1, max_length=2000)
+    targets: List[str] = Field(..., min_length=1, max_length=2000)
+
 
+class DistanceMatrixResponse(BaseModel):
+    sources: List[str]
+    targets: List[str]
+    costs: List[List[Optional[int]]]
@@ -0,0 +1,249 @@
+# Arquivo para realizar testes da representação compacta (CSR) usada nas rotas
+
+import random
+
+import networkx as nx
+import pytest
+from app.controllers.compact_graph import CompactGraph
+
+
+def build_random_graph(n: int = 30, m: int = 120, seed: int = 7):
+    rnd = random.Random(seed)
+    nodes = [(i + 1, f"N{i}", rnd.uniform(-50, -40), rnd.uniform(-25, -15)) for i in range(n)]
+    edges = [(f"N{rnd.randrange(n)}", f"N{rnd.randrange(n)}", rnd.randint(1, 20)) for _ in range(m)]
+    edges = [e for e in edges if e[0] != e[1]]
+
+    G = nx.DiGraph()
+    for _, name, _, _ in nodes:
+        G.add_node(name)
+    for u, v, w in edges:
+        G.add_edge(u, v, weight=w)
+    return CompactGraph.from_rows(nodes, edges), G
+
+
+# Teste de equivalência do Dijkstra CSR com o networkx
+def test_dijkstra_matches_networkx():
+    compact, G = build_random_graph()
+    for source in list(G.nodes)[:10]:
+        for target in G.nodes:
+            try:
+                expected = nx.dijkstra_path_length(G, source, target)
+            except nx.NetworkXNoPath:
+                with pytest.raises(nx.NetworkXNoPath):
+                    compact.dijkstra_path(compact.node_index(source), compact.node_index(target))
+                continue
+            path = compact.dijkstra_path(compact.node_index(source), compact.node_index(target))
+            cost = sum(compact.edge_weight(u, v) for u, v in zip(path, path[1:]))
+            assert cost == expected
+
+
+# Teste de equivalência da enumeração de caminhos simples com o networkx
+def test_all_simple_paths_matches_networkx():
+    compact, G = build_random_graph(n=10, m=25)
+    for cutoff in (None, 2, 4):
+        expected = sorted(nx.all_simple_paths(G, "N0", "N5", cutoff=cutoff))
+        found = sorted(compact.path_names(p) for p in compact.all_simple_paths(compact.node_index("N0"), compact.node_index("N5"), cutoff=cutoff))
+        assert found == expected
+
+
+# Teste de arestas paralelas (a última prevalece) e nó inexistente
+def test_parallel_edges_and_missing_node():
+    compact = CompactGraph.from_rows([(1, "A", 0.0, 0.0), (2, "B", 1.0, 1.0)], [("A", "B", 10), ("A", "B", 3)])
+    assert compact.number_of_edges == 1
+    assert compact.edge_weight(0, 1) == 3
+    with pytest.raises(nx.NodeNotFound):
+        compact.node_index("Z")
+
+
+# Teste de paginação: retomar a busca após o último caminho entregue reproduz a enumeração completa
+def test_all_simple_paths_resume():
+    compact, _ = build_random_graph(n=10, m=80)
+    source, target = compact.node_index("N0"), compact.node_index("N5")
+    expected = list(compact.all_simple_paths(source, target, cutoff=5))
+    assert len(expected) > 10
+
+    pages, last = [], None
+    while True:
+        page = []
+        for path in compact.all_simple_paths(source, target, cutoff=5, resume_after=last):
+            page.append(path)
+            if len(page) == 3:
+                break
+        if not page:
+            break
+        pages.extend(page)
+        last = page[-1]
+    assert pages == expected
+
+    with pytest.raises(ValueError):
+        compact.all_simple_paths(source, target, resume_after=[target, source])
+
+
+# Teste do cálculo em lote: pares com a mesma origem compartilham a árvore e o resultado é igual ao cálculo individual
+def test_shortest_paths_for_pairs_matches_single_pair():
+    from app.controllers.graph_controls import shortest_paths_for_pairs
+
+    compact, G = build_random_graph()
+    pairs = [(f"N{s}", f"N{t}") for s in (0, 1, 0, 2) for t in range(0, 30, 3)] + [("N0", "Z")]
+    results = shortest_paths_for_pairs(compact, pairs)
+
+    for (source, target), result in zip(pairs, results):
+        if target == "Z":
+            assert isinstance(result, nx.NodeNotFound)
+        elif nx.has_path(G, source, target):
+            path, cost = result
+            assert cost == sum(compact.edge_weight(u, v) for u, v in zip(path, path[1:]))
+            assert cost == nx.dijkstra_path_length(G, source, target)
+        else:
+            assert isinstance(result, nx.NetworkXNoPath)
+
+
+# Teste da matriz de distâncias (SciPy, SciPy em blocos de uma origem e implementação em Python puro) contra o networkx
+@pytest.mark.parametrize("mode", ["scipy", "scipy_chunked", "python"])
+def test_distance_matrix_matches_networkx(monkeypatch, mode):
+    import app.controllers.compact_graph as compact_graph
+
+    if mode == "python":
+        monkeypatch.setattr(compact_graph, "csgraph_dijkstra", None)
+    elif compact_graph.csgraph_dijkstra is None:
+        pytest.skip("scipy not installed")
+    if mode == "scipy_chunked":
+        monkeypatch.setattr(compact_graph, "DISTANCE_MATRIX_CHUNK_BYTES", 1)
+
+    compact, G = build_random_graph()
+    sources = ["N0", "N3", "N0", "N7"]
+    targets = [f"N{i}" for i in range(0, 30, 2)]
+    matrix = compact.distance_matrix([compact.node_index(s) for s in sources], [compact.node_index(t) for t in targets])
+
+    for row, source in enumerate(sources):
+        lengths = nx.single_source_dijkstra_path_length(G, source)
+        for col, target in enumerate(targets):
+            assert matrix[row, col] == lengths.get(target, float("inf"))
+
+
+# Teste dos custos devolvidos pela enumeração e da poda por max_cost
+def test_all_simple_paths_costs_and_max_cost():
+    compact, G = build_random_graph(n=10, m=80)
+    source, target = compact.node_index("N0"), compact.node_index("N5")
+    routes = list(compact.all_simple_paths_with_costs(source, target, cutoff=5))
+    for path, cost in routes:
+        assert cost == nx.path_weight(G, compact.path_names(path), weight="weight")
+
+    max_cost = sorted(cost for _, cost in routes)[len(routes) // 2]
+    pruned = list(compact.all_simple_paths_with_costs(source, target, cutoff=5, max_cost=max_cost))
+    assert pruned == [(path, cost) for path, cost in routes if cost <= max_cost]
+
+
+# Teste do k-shortest-paths (Yen) contra o networkx
+def test_k_shortest_paths_matches_networkx():
+    compact, G = build_random_graph()
+    source, target = "N0", "N5"
+    expected = [nx.path_weight(G, p, weight="weight") for _, p in zip(range(8), nx.shortest_simple_paths(G, source, target, weight="weight"))]
+
+    found = list(compact.k_shortest_paths(compact.node_index(source), compact.node_index(target), 8))
+    assert [cost for _, cost in found] == expected
+    for path, cost in found:
+        assert len(set(path)) == len(path)
+        assert compact.path_cost(path) == cost
+
+    bounded = list(compact.k_shortest_paths(compact.node_index(source), compact.node_index(target), 8, max_cost=expected[3]))
+    assert [cost for _, cost in bounded] == [c for c in expected if c <= expected[3]]
+
+
+# Teste do nó mais próximo (STRtree) contra a busca exaustiva, inclusive com k maior que o vizinho imediato
+def test_nearest_nodes_matches_brute_force():
+    import numpy as np
+    from app.controllers.compact_graph import haversine_m
+
+    compact, _ = build_random_graph(n=200, m=10)
+    for longitude, latitude in ((-45.0, -20.0), (-50.5, -14.0), (-40.2, -25.3)):
+        planar = np.hypot(compact.longitudes - longitude, compact.latitudes - latitude)
+        expected = np.argsort(planar, kind="stable")
+        for k in (1, 5, 250):
+            found = compact.nearest_nodes(longitude, latitude, k)
+            assert [index for index, _ in found] == expected[:k].tolist()
+            index, distance = found[0]
+            assert distance == pytest.approx(haversine_m(longitude, latitude, compact.longitudes[index], compact.latitudes[index]))
+
+
+# Teste do A*: mesmo custo do Dijkstra com a escala admissível e menos nós expandidos numa malha geográfica
+def test_astar_matches_dijkstra():
+    from app.benchmarks.bench_routing import build_grid_rows
+
+    compact = CompactGraph.from_rows(*build_grid_rows(30))
+    assert compact.heuristic_scale > 0
+    rnd = random.Random(3)
+    expanded_astar = expanded_dijkstra = 0
+    for _ in range(20):
+        source, target = rnd.randrange(compact.number_of_nodes), rnd.randrange(compact.number_of_nodes)
+        dist, _ = compact.dijkstra_tree(source, [target])
+        path, cost, expanded = compact.astar_path(source, target)
+        assert cost == dist[target] == compact.path_cost(path)
+        expanded_astar += expanded
+        expanded_dijkstra += len(dist)
+    assert expanded_astar < expanded_dijkstra
+
+    isolated = CompactGraph.from_rows([(1, "A", 0.0, 0.0), (2, "B", 1.0, 1.0)], [])
+    with pytest.raises(nx.NetworkXNoPath):
+        isolated.astar_path(0, 1)
+
+
+def assert_same_graph(found: CompactGraph, expected: CompactGraph):
+    assert found.names == expected.names
+    for attribute in ("node_ids", "longitudes", "latitudes", "offsets", "targets", "weights"):
+        assert getattr(found, attribute).tolist() == getattr(expected, attribute).tolist()
+
+
+# Teste das alterações incrementais em memória: o resultado é o mesmo de compilar novamente as linhas alteradas
+def test_with_changes_matches_rebuild():
+    rnd = random.Random(3)
+    nodes = [(i + 1, f"N{i}", rnd.uniform(-50, -40), rnd.uniform(-25, -15)) for i in range(20)]
+    edges = [(f"N{rnd.randrange(20)}", f"N{rnd.randrange(20)}", rnd.randint(1, 20)) for _ in range(80)]
+    compact = CompactGraph.from_rows(nodes, edges)
+
+    remove_edges = [edges[0][:2], edges[5][:2]]
+    remove_nodes = ["N3", "N7"]
+    add_nodes = [(21, "N20", -45.0, -20.0), (22, "N21", -44.0, -19.0)]
+    move_nodes = [("N1", -41.0, -16.0)]
+    set_edges = [("N20", "N0", 4), ("N21", "N20", 2), (edges[10][0], edges[10][1], 99)]
+
+    changed = compact.with_changes(remove_edges, remove_nodes, add_nodes, move_nodes, set_edges)
+
+    expected_nodes = [row for row in nodes if row[1] not in remove_nodes] + add_nodes
+    expected_nodes = [(i, name, -41.0, -16.0) if name == "N1" else (i, name, lon, lat) for i, name, lon, lat in expected_nodes]
+    expected_edges = [e for e in edges if e[:2] not in remove_edges and e[0] not in remove_nodes and e[1] not in remove_nodes] + set_edges
+    assert_same_graph(changed, CompactGraph.from_rows(expected_nodes, expected_edges))
+
+    # Somente pesos: copy-on-write do array de pesos, topologia compartilhada e original intacto
+    original = compact.weights.copy()
+    reweighted = compact.with_weights([(edges[10][0], edges[10][1], 99), ("N0", "missing", 1)])
+    assert reweighted.targets is compact.targets and reweighted.offsets is compact.offsets
+    assert compact.weights.tolist() == original.tolist()
+    assert reweighted.edge_weight(compact.node_index(edges[10][0]), compact.node_index(edges[10][1])) == 99
+
+
+# Teste do corredor espacial: a máscara coincide com a distância ao segmento e a busca restrita nunca sai dela
+def test_corridor_restricted_search():
+    import numpy as np
+    from app.benchmarks.bench_routing import build_grid_rows
+
+    compact = CompactGraph.from_rows(*build_grid_rows(30))
+    source, target = compact.node_index("N5_2"), compact.node_index("N5_25")
+    mask = compact.corridor_mask(source, target, 250)
+    # Malha com espaçamento de ~110 m: o corredor de 250 m cobre as linhas 3 a 7 entre as colunas da origem e do destino
+    assert {compact.names[i] for i in np.flatnonzero(mask)} >= {f"N{r}_{c}" for r in range(3, 8) for c in range(2, 26)}
+    assert not any(mask[compact.node_index(name)] for name in ("N8_15", "N1_15", "N5_29"))
+
+    dist, _ = compact.dijkstra_tree(source, [target])
+    corridor_dist, corridor_pred = compact.dijkstra_tree(source, [target], allowed=mask)
+    dijkstra = (compact.tree_path(corridor_pred, source, target), corridor_dist[target], len(corridor_dist))
+    for path, cost, expanded in (dijkstra, compact.astar_path(source, target, allowed=mask)):
+        assert all(mask[i] for i in path)
+        assert cost == compact.path_cost(path) >= dist[target]
+        assert expanded <= mask.sum()
+
+    # Corredor que separa origem e destino
+    narrow = np.zeros(compact.number_of_nodes, dtype=bool)
+    narrow[[source, target]] = True
+    with pytest.raises(nx.NetworkXNoPath):
+        compact.astar_path(source, target, allowed=narrow)
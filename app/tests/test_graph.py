@@ -1,5 +1,7 @@
 # Arquivo para realizar testes dos métodos de controle dos grafos
 
+import json
+import pytest
 from fastapi.testclient import TestClient
 from app.main import app
 
@@ -121,4 +123,350 @@ def test_delete_graph():
         print(f"AssertionError: {e}")
         
     except Exception as e:
-        print(f"Exception occurred: {str(e)}")
\ No newline at end of file
+        print(f"Exception occurred: {str(e)}")
+
+# Teste criação do grafo a partir de um corpo NDJSON (ingestão em lote)
+def test_create_new_graph_from_stream():
+    lines = [
+        {"type": "graph", "name": "Test stream graph"},
+        {"type": "node", "name": "S1", "longitude": 0.0, "latitude": 0.0},
+        {"type": "node", "name": "S2", "longitude": 1.0, "latitude": 1.0},
+        {"type": "edge", "from_node_name": "S1", "to_node_name": "S2", "weight": 5},
+    ]
+    response = client.post(
+        "/graph/create/stream",
+        content="\n".join(json.dumps(line) for line in lines),
+        headers={"Content-Type": "application/x-ndjson"}
+    )
+    assert response.status_code == 200
+    assert response.json()["name"] == "Test stream graph"
+    assert response.json()["nodes_created"] == 2
+    assert response.json()["edges_created"] == 1
+
+
+# Teste de uma linha NDJSON válida que não é um objeto, depois do cabeçalho: 400 e nenhum grafo criado
+def test_create_graph_from_stream_rejects_non_object_line():
+    response = client.post(
+        "/graph/create/stream",
+        content=json.dumps({"type": "graph", "name": "Test stream non-object"}) + "\n[1]\n",
+        headers={"Content-Type": "application/x-ndjson"}
+    )
+    assert response.status_code == 400
+    assert response.json()["detail"] == "Each NDJSON line must be a JSON object"
+
+
+# Teste do nó mais próximo de uma coordenada (busca KNN no banco) e da rota entre coordenadas
+def test_nearest_node_and_route_by_coordinates():
+    lines = [
+        {"type": "graph", "name": "Test snapping graph"},
+        {"type": "node", "name": "K1", "longitude": 0.0, "latitude": 0.0},
+        {"type": "node", "name": "K2", "longitude": 1.0, "latitude": 1.0},
+        {"type": "edge", "from_node_name": "K1", "to_node_name": "K2", "weight": 5},
+    ]
+    response = client.post(
+        "/graph/create/stream",
+        content="\n".join(json.dumps(line) for line in lines),
+        headers={"Content-Type": "application/x-ndjson"}
+    )
+    graph_id = response.json()["id"]
+
+    response = client.get(f"/graph/graph/{graph_id}/nearest_node", params={"lon": 0.9, "lat": 1.1, "k": 2})
+    assert response.status_code == 200
+    assert [item["node"]["name"] for item in response.json()] == ["K2", "K1"]
+
+    response = client.get(f"/graph/graph/{graph_id}/shortest_route/by_coordinates",
+                          params={"start_lon": 0.1, "start_lat": 0.0, "end_lon": 1.0, "end_lat": 0.9})
+    assert response.status_code == 200
+    assert [node["name"] for node in response.json()["route"]] == ["K1", "K2"]
+    assert response.json()["start_snap"]["node"]["name"] == "K1"
+
+
+# Teste dos pesos calculados no banco: comprimento da geometria informada ou do segmento reto entre os nós
+def test_edge_weights_derived_from_geometry():
+    response = client.post(
+        "/graph/create",
+        json={
+            "name": "Test edge length graph",
+            "nodes": [{"name": "LA", "longitude": 0.0, "latitude": 0.0},
+                      {"name": "LB", "longitude": 0.01, "latitude": 0.0}],
+            "edges": [{"from_node_name": "LA", "to_node_name": "LB"},
+                      {"from_node_name": "LB", "to_node_name": "LA", "coordinates": [[0.01, 0.0], [0.01, 0.01], [0.0, 0.0]]},
+                      {"from_node_name": "LA", "to_node_name": "LB", "weight": 7}]
+        }
+    )
+    assert response.status_code == 200
+    weights = [edge["weight"] for edge in response.json()["edges"]]
+    # 0,01 grau de longitude no equador ~ 1113 m; o segundo trecho soma ~ 1106 m + ~ 1568 m
+    assert weights[0] == pytest.approx(1113, abs=2)
+    assert weights[1] == pytest.approx(2674, abs=5)
+    assert weights[2] == 7
+
+    from app.db.database import Session
+    from app.controllers.graph_loader import load_graph_rows
+    with Session() as db:
+        assert [weight for _, _, _, weight in load_graph_rows(response.json()["id"], db).edges] == weights
+
+
+# Teste da geometria fora dos nós: extremidades distantes da origem/destino (ou invertidas) são rejeitadas com 400
+@pytest.mark.parametrize("coordinates", [[[0.01, 0.0], [0.0, 0.0]], [[0.0, 0.0], [0.02, 0.0]]])
+def test_edge_geometry_must_match_its_nodes(coordinates):
+    response = client.post(
+        "/graph/create",
+        json={
+            "name": "Test misplaced geometry graph",
+            "nodes": [{"name": "MA", "longitude": 0.0, "latitude": 0.0},
+                      {"name": "MB", "longitude": 0.01, "latitude": 0.0}],
+            "edges": [{"from_node_name": "MA", "to_node_name": "MB", "coordinates": coordinates}]
+        }
+    )
+    assert response.status_code == 400
+    assert response.json()["detail"] == "Edge geometry does not start and end at its nodes: MA -> MB"
+
+
+# Teste das consultas espaciais: nós por bbox/raio com paginação, subgrafo induzido e rota restrita a um corredor
+def test_spatial_region_queries():
+    response = client.post(
+        "/graph/create",
+        json={
+            "name": "Test spatial graph",
+            "nodes": [{"name": f"SP{i}", "longitude": i * 0.01, "latitude": 0.0} for i in range(5)]
+                     + [{"name": "SPFAR", "longitude": 0.02, "latitude": 0.5}],
+            "edges": [{"from_node_name": f"SP{i}", "to_node_name": f"SP{i + 1}", "weight": 10} for i in range(4)]
+                     + [{"from_node_name": "SP0", "to_node_name": "SPFAR", "weight": 1},
+                        {"from_node_name": "SPFAR", "to_node_name": "SP4", "weight": 1}]
+        }
+    )
+    graph_id = response.json()["id"]
+
+    response = client.get(f"/graph/graph/{graph_id}/nodes", params={"bbox": "-0.001,-0.001,0.025,0.001", "limit": 2})
+    assert response.status_code == 200
+    assert [node["name"] for node in response.json()] == ["SP0", "SP1"]
+    response = client.get(f"/graph/graph/{graph_id}/nodes",
+                          params={"bbox": "-0.001,-0.001,0.025,0.001", "limit": 2, "cursor": response.headers["X-Next-Cursor"]})
+    assert [node["name"] for node in response.json()] == ["SP2"]
+    assert "X-Next-Cursor" not in response.headers
+
+    # 0,01 grau no equador ~ 1,1 km
+    response = client.get(f"/graph/graph/{graph_id}/nodes", params={"lon": 0.0, "lat": 0.0, "radius_m": 1500})
+    assert [node["name"] for node in response.json()] == ["SP0", "SP1"]
+
+    response = client.get(f"/graph/graph/{graph_id}/subgraph", params={"bbox": "-0.001,-0.001,0.025,0.001"})
+    assert response.status_code == 200
+    assert [(e["from_node_name"], e["to_node_name"]) for e in response.json()["edges"]] == [("SP0", "SP1"), ("SP1", "SP2")]
+
+    assert client.get(f"/graph/graph/{graph_id}/nodes").status_code == 400
+    assert client.get(f"/graph/graph/{graph_id}/nodes", params={"bbox": "1,2,3"}).status_code == 400
+
+    # Sem corredor a rota passa por SPFAR; com um corredor de 5 km ela segue pela linha
+    response = client.get(f"/graph/graph/{graph_id}/shortest_route", params={"start_node": "SP0", "end_node": "SP4"})
+    assert [node["name"] for node in response.json()["route"]] == ["SP0", "SPFAR", "SP4"]
+    response = client.get(f"/graph/graph/{graph_id}/shortest_route", params={"start_node": "SP0", "end_node": "SP4", "corridor_m": 5000})
+    assert [node["name"] for node in response.json()["route"]] == ["SP0", "SP1", "SP2", "SP3", "SP4"]
+
+
+# Teste dos tiles vetoriais: tile com conteúdo e ETag, 304 para If-None-Match e nova ETag após alterar o grafo
+def test_graph_vector_tiles():
+    response = client.post(
+        "/graph/create",
+        json={
+            "name": "Test tiles graph",
+            "nodes": [{"name": f"TL{i}", "longitude": 0.005 + i * 0.01, "latitude": -0.01} for i in range(3)],
+            "edges": [{"from_node_name": "TL0", "to_node_name": "TL1", "weight": 1},
+                      {"from_node_name": "TL1", "to_node_name": "TL2", "coordinates": [[0.015, -0.01], [0.02, -0.02], [0.025, -0.01]]}]
+        }
+    )
+    graph_id = response.json()["id"]
+
+    # Tile 12/2048/2048 cobre longitude 0 a 0,088 e latitude 0 a -0,088
+    response = client.get(f"/graph/{graph_id}/tiles/12/2048/2048.mvt")
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "application/vnd.mapbox-vector-tile"
+    assert len(response.content) > 0
+    etag = response.headers["ETag"]
+
+    response = client.get(f"/graph/{graph_id}/tiles/12/2048/2048.mvt", headers={"If-None-Match": etag})
+    assert response.status_code == 304
+
+    client.patch(f"/graph/{graph_id}/edges/weights", json={"edges": [{"from_node_name": "TL0", "to_node_name": "TL1", "weight": 7}]})
+    response = client.get(f"/graph/{graph_id}/tiles/12/2048/2048.mvt", headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.headers["ETag"] != etag
+
+    assert client.get(f"/graph/{graph_id}/tiles/12/5000/2048.mvt").status_code == 400
+    assert client.get("/graph/0/tiles/0/0/0.mvt").status_code == 404
+
+
+# Teste de regressão da quantidade de consultas: o carregamento do grafo não pode voltar a crescer com o número de nós (N+1)
+def test_graph_loading_query_count():
+    from sqlalchemy import event
+    from app.db.database import Session, engine
+    from app.controllers.graph_cache import graph_cache
+    from app.controllers.graph_controls import load_compiled_graph
+    from app.controllers.graph_loader import load_graph_rows
+
+    response = client.post(
+        "/graph/create",
+        json={
+            "name": "Test query count graph",
+            "nodes": [{"name": f"QC{i}", "longitude": i * 0.01, "latitude": i * 0.01} for i in range(50)],
+            "edges": [{"from_node_name": f"QC{i}", "to_node_name": f"QC{i + 1}", "weight": 1} for i in range(49)]
+        }
+    )
+    graph_id = response.json()["id"]
+
+    statements = []
+
+    def count(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(engine, "before_cursor_execute", count)
+    try:
+        with Session() as db:
+            rows = load_graph_rows(graph_id, db)
+        assert len(rows.nodes) == 50
+        assert len(statements) == 3
+
+        # Grafo compilado para rotas: grafo, nós, arestas e índice de rotas
+        statements.clear()
+        graph_cache.bump_version(graph_id)
+        with Session() as db:
+            compiled = load_compiled_graph(graph_id, db)
+        assert compiled.graph.number_of_nodes == 50
+        assert len(statements) == 4
+    finally:
+        event.remove(engine, "before_cursor_execute", count)
+
+
+# Teste da alteração incremental (PATCH): apenas as linhas indicadas mudam e o grafo em cache acompanha a alteração
+def test_patch_graph():
+    response = client.post(
+        "/graph/create",
+        json={
+            "name": "Test patch graph",
+            "nodes": [{"name": f"PT{i}", "longitude": i * 0.01, "latitude": 0.0} for i in range(4)],
+            "edges": [
+                {"from_node_name": "PT0", "to_node_name": "PT1", "weight": 1},
+                {"from_node_name": "PT1", "to_node_name": "PT3", "weight": 1},
+                {"from_node_name": "PT0", "to_node_name": "PT2", "weight": 5},
+                {"from_node_name": "PT2", "to_node_name": "PT3", "weight": 5}
+            ]
+        }
+    )
+    graph_id = response.json()["id"]
+
+    response = client.get(f"/graph/graph/{graph_id}/shortest_route", params={"start_node": "PT0", "end_node": "PT3"})
+    assert [node["name"] for node in response.json()["route"]] == ["PT0", "PT1", "PT3"]
+
+    response = client.patch(f"/graph/{graph_id}/edges/weights", json={"edges": [{"from_node_name": "PT1", "to_node_name": "PT3", "weight": 50}]})
+    assert response.status_code == 200
+    assert response.json()["edges_updated"] == 1
+
+    response = client.get(f"/graph/graph/{graph_id}/shortest_route", params={"start_node": "PT0", "end_node": "PT3"})
+    assert [node["name"] for node in response.json()["route"]] == ["PT0", "PT2", "PT3"]
+    assert response.json()["cost"] == 10
+
+    response = client.patch(f"/graph/{graph_id}", json={
+        "remove_nodes": ["PT2"],
+        "add_nodes": [{"name": "PT4", "longitude": 0.5, "latitude": 0.5}],
+        "add_edges": [{"from_node_name": "PT0", "to_node_name": "PT4", "weight": 1}, {"from_node_name": "PT4", "to_node_name": "PT3", "weight": 1}]
+    })
+    assert response.status_code == 200
+    assert response.json()["nodes_removed"] == 1 and response.json()["edges_removed"] == 2
+    assert response.json()["nodes_added"] == 1 and response.json()["edges_added"] == 2
+
+    response = client.get(f"/graph/graph/{graph_id}/shortest_route", params={"start_node": "PT0", "end_node": "PT3"})
+    assert [node["name"] for node in response.json()["route"]] == ["PT0", "PT4", "PT3"]
+
+    response = client.patch(f"/graph/{graph_id}", json={"remove_edges": [{"from_node_name": "PT3", "to_node_name": "PT0"}]})
+    assert response.status_code == 404
+
+
+# Teste do índice de rotas após lotes de pesos: aumentos mantêm o índice (apenas a impressão digital é regravada);
+# uma redução exige reconstrução, feita em segundo plano
+# O status do índice não compila o grafo: sem o grafo em cache a resposta é "unknown"
+def test_routing_index_status_without_cached_graph():
+    from app.controllers.graph_cache import graph_cache
+
+    response = client.post(
+        "/graph/create",
+        json={
+            "name": "Test routing index status graph",
+            "nodes": [{"name": f"RS{i}", "longitude": i * 0.01, "latitude": 0.0} for i in range(3)],
+            "edges": [{"from_node_name": f"RS{i}", "to_node_name": f"RS{i + 1}", "weight": 1} for i in range(2)]
+        }
+    )
+    graph_id = response.json()["id"]
+    assert client.post(f"/graph/graph/{graph_id}/routing_index", params={"landmarks": 2}).status_code == 202
+
+    graph_cache.clear()
+    assert client.get(f"/graph/graph/{graph_id}/routing_index").json()["status"] == "unknown"
+    assert graph_cache.get(graph_id) is None
+
+    client.get(f"/graph/graph/{graph_id}/shortest_route", params={"start_node": "RS0", "end_node": "RS2"})
+    assert client.get(f"/graph/graph/{graph_id}/routing_index").json()["status"] == "active"
+
+
+def test_routing_index_after_weight_batches():
+    response = client.post(
+        "/graph/create",
+        json={
+            "name": "Test routing index weights graph",
+            "nodes": [{"name": f"RW{i}", "longitude": i * 0.01, "latitude": 0.0} for i in range(4)],
+            "edges": [{"from_node_name": f"RW{i}", "to_node_name": f"RW{i + 1}", "weight": 10} for i in range(3)]
+        }
+    )
+    graph_id = response.json()["id"]
+    assert client.post(f"/graph/graph/{graph_id}/routing_index", params={"landmarks": 2}).status_code == 202
+    client.get(f"/graph/graph/{graph_id}/shortest_route", params={"start_node": "RW0", "end_node": "RW3"})
+
+    client.patch(f"/graph/{graph_id}/edges/weights", json={"edges": [{"from_node_name": "RW0", "to_node_name": "RW1", "weight": 20}]})
+    assert client.get(f"/graph/graph/{graph_id}/routing_index").json()["status"] == "active"
+    response = client.get(f"/graph/graph/{graph_id}/shortest_route", params={"start_node": "RW0", "end_node": "RW3"})
+    assert response.json()["algorithm"] == "alt" and response.json()["cost"] == 40
+
+    client.patch(f"/graph/{graph_id}/edges/weights", json={"edges": [{"from_node_name": "RW0", "to_node_name": "RW1", "weight": 1}]})
+    assert client.get(f"/graph/graph/{graph_id}/routing_index").json()["status"] == "active"
+    response = client.get(f"/graph/graph/{graph_id}/shortest_route", params={"start_node": "RW0", "end_node": "RW3"})
+    assert response.json()["cost"] == 21
+
+
+# Teste da remoção em lote: a resposta traz as contagens; no modo em segundo plano a resposta é 202
+def test_delete_graph_counts_and_background():
+    def payload(prefix: str) -> dict:
+        return {
+            "name": f"Test delete graph {prefix}",
+            "nodes": [{"name": f"{prefix}{i}", "longitude": 0.0, "latitude": i * 0.01} for i in range(5)],
+            "edges": [{"from_node_name": f"{prefix}{i}", "to_node_name": f"{prefix}{i + 1}", "weight": 1} for i in range(4)]
+        }
+
+    graph_id = client.post("/graph/create", json=payload("DL")).json()["id"]
+    response = client.delete(f"/graph/{graph_id}")
+    assert response.status_code == 200
+    assert response.json()["nodes_deleted"] == 5 and response.json()["edges_deleted"] == 4
+    assert client.delete(f"/graph/{graph_id}").status_code == 404
+
+    # O TestClient executa as tarefas em segundo plano antes de devolver a resposta
+    graph_id = client.post("/graph/create", json=payload("DB")).json()["id"]
+    response = client.delete(f"/graph/{graph_id}", params={"background": True})
+    assert response.status_code == 202
+    assert response.json()["message"] == "Graph deletion scheduled"
+    assert client.delete(f"/graph/{graph_id}").status_code == 404
+
+
+# Teste dos nomes de nós por grafo: grafos diferentes podem repetir nomes, o mesmo grafo não
+def test_node_names_are_scoped_to_graph():
+    payload = {
+        "nodes": [{"name": "SC1", "longitude": 0.0, "latitude": 0.0}, {"name": "SC2", "longitude": 1.0, "latitude": 1.0}],
+        "edges": [{"from_node_name": "SC1", "to_node_name": "SC2", "weight": 3}]
+    }
+    first = client.post("/graph/create", json={"name": "Test scoped names 1", **payload})
+    second = client.post("/graph/create", json={"name": "Test scoped names 2", **payload})
+    assert first.status_code == 200 and second.status_code == 200
+
+    for graph_id in (first.json()["id"], second.json()["id"]):
+        response = client.get(f"/graph/graph/{graph_id}/shortest_route", params={"start_node": "SC1", "end_node": "SC2"})
+        assert response.json()["cost"] == 3
+
+    response = client.patch(f"/graph/{first.json()['id']}", json={"add_nodes": [{"name": "SC1", "longitude": 2.0, "latitude": 2.0}]})
+    assert response.status_code == 404
+    assert response.json()["detail"] == "Node with name 'SC1' already exists."
@@ -0,0 +1,124 @@
+# Arquivo para realizar testes do cache de grafos compilados
+
+from app.controllers.compact_graph import CompactGraph
+from app.controllers.graph_cache import GraphCache, CompiledGraph
+
+
+def build_entry(graph_id: int, version: int, size: int = 1) -> CompiledGraph:
+    graph = CompactGraph.from_rows([(i, f"N{i}", 0.0, 0.0) for i in range(size)], [])
+    return CompiledGraph(graph_id=graph_id, version=version, name=f"graph {graph_id}", graph=graph)
+
+
+# Teste de acerto/falha do cache e reconstrução após incremento de versão
+def test_cache_hit_miss_and_invalidation():
+    cache = GraphCache(max_graphs=4, max_elements=100)
+    builds = []
+
+    def builder(version):
+        builds.append(version)
+        return build_entry(1, version)
+
+    first = cache.get_or_build(1, builder)
+    second = cache.get_or_build(1, builder)
+    assert first is second
+    assert builds == [0]
+
+    cache.bump_version(1)
+    third = cache.get_or_build(1, builder)
+    assert third is not first
+    assert builds == [0, 1]
+
+    stats = cache.stats()
+    assert stats["hits"] == 1
+    assert stats["misses"] == 2
+    assert stats["rebuilds"] == 2
+
+
+# Teste de descarte de construções feitas sobre versões já invalidadas
+def test_cache_rejects_stale_entry():
+    cache = GraphCache()
+    cache.bump_version(1)
+    cache.put(build_entry(1, 0))
+    assert cache.get(1) is None
+
+
+# Teste de remoção LRU por quantidade de grafos e por tamanho total
+def test_cache_lru_eviction():
+    cache = GraphCache(max_graphs=2, max_elements=10)
+    cache.put(build_entry(1, 0, size=3))
+    cache.put(build_entry(2, 0, size=3))
+    cache.get(1)
+    cache.put(build_entry(3, 0, size=3))
+    assert cache.get(2) is None
+    assert cache.get(1) is not None
+
+    cache.put(build_entry(4, 0, size=9))
+    assert cache.stats()["graphs"] == 1
+    assert cache.get(4) is not None
+    assert cache.stats()["evictions"] == 3
+
+
+# Teste do carregamento assíncrono: requisições simultâneas do mesmo grafo fazem uma única reconstrução
+def test_cache_async_single_build():
+    import asyncio
+
+    cache = GraphCache()
+    builds = []
+
+    async def builder(version):
+        builds.append(version)
+        await asyncio.sleep(0.01)
+        return build_entry(1, version)
+
+    async def run():
+        return await asyncio.gather(*(cache.get_or_build_async(1, builder) for _ in range(5)))
+
+    entries = asyncio.run(run())
+    assert builds == [0]
+    assert all(entry is entries[0] for entry in entries)
+
+
+# Teste da atualização incremental: a entrada em cache avança de versão sem reconstrução; sem entrada, nada é criado
+def test_cache_apply_patch():
+    cache = GraphCache()
+    cache.put(build_entry(1, 0, size=2))
+
+    version = cache.apply_patch(1, lambda entry, version: CompiledGraph(1, version, "patched", entry.graph))
+    patched = cache.get(1)
+    assert version == 1 and patched.version == 1 and patched.name == "patched"
+    assert cache.stats()["patches"] == 1 and cache.stats()["elements"] == 2
+
+    # Patch que desiste (None) invalida a entrada, como o bump_version
+    cache.apply_patch(1, lambda entry, version: None)
+    assert cache.get(1) is None
+
+    assert cache.apply_patch(2, lambda entry, version: entry) == 1
+    assert cache.get(2) is None
+
+
+# Teste do patch fora do lock: durante o patch as consultas seguem com a entrada anterior; se a versão mudar
+# nesse intervalo, o resultado do patch é descartado
+def test_cache_apply_patch_outside_lock():
+    import threading
+
+    cache = GraphCache()
+    original = build_entry(1, 0)
+    cache.put(original)
+    seen = []
+
+    def patch(entry, version):
+        reader = threading.Thread(target=lambda: seen.append(cache.get(1)))
+        reader.start()
+        reader.join(timeout=5)
+        return CompiledGraph(1, version, "patched", entry.graph)
+
+    assert cache.apply_patch(1, patch) == 1
+    assert seen == [original]
+    assert cache.get(1).name == "patched"
+
+    def concurrent_write(entry, version):
+        cache.bump_version(1)
+        return CompiledGraph(1, version, "lost", entry.graph)
+
+    assert cache.apply_patch(1, concurrent_write) == 3
+    assert cache.get(1) is None
@@ -0,0 +1,70 @@
+# Arquivo para realizar testes da exportação rápida de grafos
+
+import io
+import json
+
+import pytest
+from fastapi import HTTPException
+from app.controllers import graph_export
+from app.controllers.graph_export import JSON, NDJSON, MSGPACK, NODE_KEYS, negotiate_graph_format
+from app.schemas.graph_schemas import GraphResponse
+
+
+# Teste da negociação pelo cabeçalho Accept (pesos q, curingas e tipos não suportados)
+def test_negotiate_graph_format(monkeypatch):
+    assert negotiate_graph_format(None) == JSON
+    assert negotiate_graph_format("*/*") == JSON
+    assert negotiate_graph_format("application/x-ndjson") == NDJSON
+    assert negotiate_graph_format("application/json;q=0.5, application/x-ndjson") == NDJSON
+    assert negotiate_graph_format("text/html, application/json;q=0.1") == JSON
+    with pytest.raises(HTTPException) as error:
+        negotiate_graph_format("text/html")
+    assert error.value.status_code == 406
+
+    monkeypatch.setattr(graph_export, "msgpack", None)
+    assert negotiate_graph_format("application/msgpack, application/json;q=0.2") == JSON
+    monkeypatch.setattr(graph_export, "msgpack", object())
+    assert negotiate_graph_format("application/msgpack, application/json;q=0.2") == MSGPACK
+
+
+# Teste do JSON gerado em lotes: mesmo formato do GraphResponse, inclusive com lotes vazios
+def test_stream_json_matches_graph_response(monkeypatch):
+    batches = {
+        "nodes": [[(1, "A", 0.0, 0.5)], [], [(2, "B", 1.0, 1.5), (3, "C", 2.0, 2.5)]],
+        "edges": [[(10, "A", "B", 4)]],
+    }
+    monkeypatch.setattr(graph_export, "stream_partitions", lambda db, stmt: iter(batches["nodes" if "nodes" in str(stmt) else "edges"]))
+
+    body = b"".join(graph_export._stream_json(None, 7, "export graph"))
+    graph = GraphResponse.model_validate(json.loads(body))
+    assert graph.id == 7 and graph.name == "export graph"
+    assert [node.name for node in graph.nodes] == ["A", "B", "C"]
+    assert graph.edges[0].weight == 4
+
+    lines = b"".join(graph_export._stream_ndjson(None, 7, "export graph")).splitlines()
+    assert json.loads(lines[0]) == {"type": "graph", "id": 7, "name": "export graph"}
+    assert json.loads(lines[1]) == {"type": "node", **dict(zip(NODE_KEYS, (1, "A", 0.0, 0.5)))}
+    assert len(lines) == 5
+
+
+# Teste da exportação colunar em lotes e da leitura usada na importação (Arrow IPC e Parquet)
+@pytest.mark.parametrize("file_format", ["arrow", "parquet"])
+def test_columnar_export_roundtrip(monkeypatch, file_format):
+    pytest.importorskip("pyarrow")
+    from app.controllers import graph_columnar
+    pa = graph_columnar._pyarrow()
+
+    batches = [[(1, "A", 0.0, 0.5)], [(2, "B", 1.0, 1.5), (3, "C", 2.0, 2.5)]]
+    monkeypatch.setattr(graph_columnar, "stream_partitions", lambda db, stmt: iter(batches))
+    nodes_schema, _ = graph_columnar._schemas(pa)
+
+    sink = graph_columnar._ChunkSink()
+    writer = pa.parquet.ParquetWriter(sink, nodes_schema) if file_format == "parquet" else pa.ipc.new_stream(sink, nodes_schema)
+    for batch in graph_columnar._record_batches(pa, None, None, nodes_schema):
+        writer.write_batch(batch)
+    writer.close()
+
+    file = io.BytesIO(sink.drain())
+    columns, types = graph_columnar.NODE_COLUMNS, (pa.string(), pa.float64(), pa.float64())
+    rows = list(graph_columnar._column_rows(pa, graph_columnar._read_batches(pa, file, columns), columns, types))
+    assert rows == [row[1:] for batch in batches for row in batch]
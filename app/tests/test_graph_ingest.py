@@ -0,0 +1,53 @@
+# Arquivo para realizar testes dos auxiliares da ingestão em lote
+
+import pytest
+from pydantic import ValidationError
+from sqlalchemy.exc import IntegrityError
+from app.controllers.graph_ingest import in_batches, integrity_error_to_http, linestring_ewkt
+from app.schemas.graph_schemas import EdgeCreate, EdgeWeight
+
+
+# Teste da conversão do erro de nome duplicado (nomes únicos por grafo) na resposta HTTP
+def test_integrity_error_to_http_duplicate_node():
+    orig = Exception('duplicate key value violates unique constraint "uq_nodes_graph_id_name"\n'
+                     'DETAIL:  Key (graph_id, name)=(12, Praça, Centro) already exists.')
+    error = integrity_error_to_http(IntegrityError("INSERT", {}, orig))
+    assert error.status_code == 404
+    assert error.detail == "Node with name 'Praça, Centro' already exists."
+
+    other = integrity_error_to_http(IntegrityError("INSERT", {}, Exception("violates foreign key constraint")))
+    assert other.status_code == 400
+
+
+def test_in_batches():
+    assert list(in_batches(range(5), size=2)) == [[0, 1], [2, 3], [4]]
+
+
+# Teste da geometria opcional das arestas: peso opcional na criação, obrigatório nas atualizações de peso
+def test_edge_geometry_and_optional_weight():
+    edge = EdgeCreate(from_node_name="A", to_node_name="B", coordinates=[(-47.0, -15.0), (-47.01, -15.0), (-47.01, -15.01)])
+    assert edge.weight is None
+    assert linestring_ewkt(edge.coordinates) == "SRID=4326;LINESTRING(-47.0 -15.0,-47.01 -15.0,-47.01 -15.01)"
+    assert linestring_ewkt(None) is None
+
+    with pytest.raises(ValidationError):
+        EdgeCreate(from_node_name="A", to_node_name="B", coordinates=[(-47.0, -15.0)])
+    with pytest.raises(ValidationError):
+        EdgeWeight(from_node_name="A", to_node_name="B")
+
+
+# Teste de linhas NDJSON que não são objetos: erro 400 pelo mesmo caminho de rollback das demais linhas inválidas
+@pytest.mark.parametrize("line", [b"[1]", b'"x"', b"3"])
+def test_stream_rejects_non_object_lines(line):
+    import asyncio
+    from fastapi import HTTPException
+    from sqlalchemy.orm import Session
+    from app.controllers.graph_ingest import create_graph_from_stream
+
+    async def chunks():
+        yield line + b"\n"
+
+    with pytest.raises(HTTPException) as error:
+        asyncio.run(create_graph_from_stream(chunks(), Session()))
+    assert error.value.status_code == 400
+    assert error.value.detail == "Each NDJSON line must be a JSON object"
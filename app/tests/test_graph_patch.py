@@ -0,0 +1,78 @@
+# Arquivo para realizar testes das alterações incrementais de grafos e do stream de pesos
+
+from app.controllers import graph_patch
+from app.controllers.compact_graph import CompactGraph
+from app.controllers.graph_cache import CompiledGraph
+from app.schemas.graph_schemas import EdgeWeight
+
+
+def build_compiled() -> CompiledGraph:
+    nodes = [(i + 1, f"W{i}", i * 0.01, 0.0) for i in range(3)]
+    edges = [("W0", "W1", 5), ("W1", "W2", 5), ("W0", "W2", 20)]
+    return CompiledGraph(graph_id=1, version=0, name="weights", graph=CompactGraph.from_rows(nodes, edges), landmarks="index")
+
+
+# Teste da troca de pesos: novo grafo compartilhando a topologia; o índice ALT só é descartado se algum peso diminuir
+def test_reweight_compiled_graph():
+    compiled = build_compiled()
+    G = compiled.graph
+
+    heavier = graph_patch.reweight_compiled_graph(compiled, 1, [("W0", "W1", 30)])
+    assert heavier.version == 1 and heavier.landmarks == "index"
+    assert heavier.graph.targets is G.targets
+    assert heavier.graph.path_names(heavier.graph.dijkstra_path(0, 2)) == ["W0", "W2"]
+    assert G.path_names(G.dijkstra_path(0, 2)) == ["W0", "W1", "W2"]
+
+    lighter = graph_patch.reweight_compiled_graph(heavier, 2, [("W0", "W2", 1)])
+    assert lighter.landmarks is None
+
+
+# Teste do agrupamento por janela: atualizações repetidas da mesma aresta viram uma só, com o último peso
+def test_weight_stream_coalesces_updates(monkeypatch):
+    applied = []
+
+    def apply(graph_id, updates, db):
+        applied.append(updates)
+        return {update[:2] for update in updates if update[0] != "missing"}
+
+    monkeypatch.setattr(graph_patch, "apply_edge_weights", apply)
+    monkeypatch.setattr(graph_patch, "WEIGHT_STREAM_MAX_PENDING", 2)
+
+    stream = graph_patch._WeightStream(1, None)
+    for from_node_name, to_node_name, weight in [("W0", "W1", 7), ("W0", "W1", 9), ("W1", "W2", 3), ("missing", "W2", 1)]:
+        stream.add(EdgeWeight(from_node_name=from_node_name, to_node_name=to_node_name, weight=weight))
+        if stream.due:
+            stream.flush()
+    stream.flush()
+
+    assert applied == [[("W0", "W1", 9), ("W1", "W2", 3)], [("missing", "W2", 1)]]
+    assert stream.response.updates_received == 4
+    assert stream.response.batches == 2
+    assert stream.response.edges_updated == 2 and stream.response.edges_not_found == 1
+
+
+# Teste da janela com o feed parado: a atualização pendente é aplicada ao fim da janela, antes do stream terminar
+def test_weight_stream_flushes_when_feed_is_idle(monkeypatch):
+    import asyncio
+
+    applied = []
+    seen_before_end = []
+
+    def apply(graph_id, updates, db):
+        applied.append(updates)
+        return {update[:2] for update in updates}
+
+    monkeypatch.setattr(graph_patch, "apply_edge_weights", apply)
+    monkeypatch.setattr(graph_patch, "WEIGHT_STREAM_WINDOW_S", 0.05)
+
+    async def lines():
+        yield b'{"from_node_name": "W0", "to_node_name": "W1", "weight": 7}'
+        await asyncio.sleep(0.5)
+        seen_before_end.append(list(applied))
+
+    stream = graph_patch._WeightStream(1, None)
+    asyncio.run(stream.consume(lines()))
+
+    assert seen_before_end == [[[("W0", "W1", 7)]]]
+    assert applied == [[("W0", "W1", 7)]]
+    assert stream.response.batches == 1
@@ -0,0 +1,43 @@
+# Arquivo para realizar testes do cache de tiles vetoriais
+
+import asyncio
+
+import pytest
+from fastapi import HTTPException
+
+from app.controllers.graph_tiles import TileCache, get_graph_tile, tile_etag
+
+
+# Teste de remoção LRU pelo total de bytes
+def test_tile_cache_lru_by_bytes():
+    cache = TileCache(max_bytes=10)
+    cache.put((1, 0, 0, 0, 0), b"1234", tile_etag(b"1234"))
+    cache.put((1, 0, 1, 0, 0), b"5678", tile_etag(b"5678"))
+    cache.get((1, 0, 0, 0, 0))
+    cache.put((1, 0, 1, 1, 0), b"9999", tile_etag(b"9999"))
+
+    assert cache.get((1, 0, 1, 0, 0)) is None
+    assert cache.get((1, 0, 0, 0, 0)) == (b"1234", tile_etag(b"1234"))
+    stats = cache.stats()
+    assert stats["tiles"] == 2 and stats["bytes"] == 8 and stats["evictions"] == 1
+
+
+# Teste da invalidação por versão: uma versão nova descarta os tiles do grafo e tiles gerados sobre a versão antiga
+def test_tile_cache_version_invalidation():
+    cache = TileCache()
+    cache.put((1, 0, 0, 0, 0), b"old", tile_etag(b"old"))
+    cache.put((2, 0, 0, 0, 0), b"other", tile_etag(b"other"))
+
+    assert cache.get((1, 1, 0, 0, 0)) is None
+    assert cache.stats()["tiles"] == 1
+    cache.put((1, 0, 0, 0, 0), b"stale", tile_etag(b"stale"))
+    assert cache.stats()["tiles"] == 1
+    assert cache.get((2, 0, 0, 0, 0)) is not None
+
+
+# Teste da validação das coordenadas do tile antes de acessar o banco
+@pytest.mark.parametrize("z, x, y", [(-1, 0, 0), (23, 0, 0), (2, 4, 0), (2, 0, -1)])
+def test_invalid_tile_coordinates(z, x, y):
+    with pytest.raises(HTTPException) as error:
+        asyncio.run(get_graph_tile(1, z, x, y, None, db=None))
+    assert error.value.status_code == 400
@@ -0,0 +1,60 @@
+# Arquivo para realizar testes da enumeração de rotas com orçamento e cancelamento
+
+import asyncio
+
+from app.controllers.graph_cache import CompiledGraph
+from app.controllers.route_enumeration import select_routes, select_routes_in_process
+from app.tests.test_compact_graph import build_random_graph
+
+
+def build_query(n: int = 10, m: int = 80):
+    compact, _ = build_random_graph(n=n, m=m)
+    return compact, compact.node_index("N0"), compact.node_index("N5")
+
+
+# Teste do orçamento de rotas: a seleção é truncada e o cursor retoma exatamente de onde parou
+def test_select_routes_max_routes_budget():
+    compact, source, target = build_query()
+    expected = list(compact.all_simple_paths_with_costs(source, target, cutoff=5))
+
+    first = select_routes(compact, source, target, cutoff=5, max_routes=4)
+    assert first.truncated
+    assert first.routes == expected[:4]
+    assert first.next_after == expected[3][0]
+
+    rest = select_routes(compact, source, target, cutoff=5, resume_after=first.next_after)
+    assert not rest.truncated and rest.next_after is None
+    assert first.routes + rest.routes == expected
+
+    # limit menor que o orçamento apenas pagina, sem marcar truncamento
+    page = select_routes(compact, source, target, cutoff=5, limit=2, max_routes=4)
+    assert not page.truncated and page.next_after == expected[1][0]
+
+
+# Teste de cancelamento cooperativo e de prazo esgotado
+def test_select_routes_cancelled_and_time_budget():
+    compact, source, target = build_query(n=14, m=160)
+
+    cancelled = select_routes(compact, source, target, cancelled=lambda: True)
+    assert cancelled.truncated
+
+    expired = select_routes(compact, source, target, time_budget=0)
+    assert expired.truncated
+
+    ordered = select_routes(compact, source, target, cutoff=4, order_by="cost", limit=3, max_routes=5)
+    assert ordered.truncated
+    assert [cost for _, cost in ordered.routes] == sorted(cost for _, cost in ordered.routes)
+
+
+# Teste da execução no pool de processos: mesmo resultado da seleção local, enviando o grafo apenas quando necessário
+def test_select_routes_in_process_matches_local():
+    compact, source, target = build_query()
+    compiled = CompiledGraph(graph_id=1, version=0, name="graph 1", graph=compact)
+
+    expected = select_routes(compact, source, target, cutoff=5, limit=7)
+
+    async def run():
+        return [await select_routes_in_process(compiled, source, target, cutoff=5, limit=7, time_budget=30) for _ in range(3)]
+
+    for found in asyncio.run(run()):
+        assert found == expected
@@ -0,0 +1,79 @@
+# Arquivo para realizar testes do índice de rotas pré-calculado (ALT)
+
+import networkx as nx
+import pytest
+from app.controllers.compact_graph import CompactGraph
+from app.controllers.graph_cache import CompiledGraph
+from app.controllers.graph_controls import shortest_route_for_graph
+from app.controllers.routing_index import LandmarkIndex, build_landmark_index, load_landmark_index
+from app.tests.test_compact_graph import build_random_graph
+
+
+# Teste de equivalência do ALT com o networkx, inclusive para pares sem caminho
+@pytest.mark.parametrize("seed", [1, 2, 3])
+def test_alt_matches_networkx(seed):
+    compact, G = build_random_graph(n=40, m=90, seed=seed)
+    index = build_landmark_index(compact, 4)
+    for source in range(0, 40, 3):
+        for target in range(40):
+            try:
+                expected = nx.dijkstra_path_length(G, compact.names[source], compact.names[target])
+            except nx.NetworkXNoPath:
+                with pytest.raises(nx.NetworkXNoPath):
+                    compact.alt_path(source, target, index)
+                continue
+            path, cost, _ = compact.alt_path(source, target, index)
+            assert cost == expected == compact.path_cost(path)
+
+
+# Teste da persistência: o índice serializado só é carregado para o mesmo grafo (fingerprint)
+def test_landmark_index_roundtrip_and_fingerprint():
+    compact, _ = build_random_graph()
+    index = build_landmark_index(compact, 3)
+    restored = load_landmark_index(compact, index.fingerprint, index.to_bytes())
+    assert isinstance(restored, LandmarkIndex)
+    assert (restored.from_landmarks == index.from_landmarks).all()
+
+    changed = CompactGraph.from_arrays(compact.names, compact.node_ids, compact.longitudes, compact.latitudes,
+                                       compact.targets[:-1], compact.targets[1:], compact.weights[1:])
+    assert load_landmark_index(changed, index.fingerprint, index.to_bytes()) is None
+
+
+# Teste do uso transparente: com índice, a menor rota usa ALT por padrão
+def test_shortest_route_uses_routing_index():
+    compact, G = build_random_graph()
+    compiled = CompiledGraph(graph_id=1, version=0, name="graph 1", graph=compact)
+    assert shortest_route_for_graph(compiled, "N0", "N5").algorithm == "dijkstra"
+
+    compiled.landmarks = build_landmark_index(compact, 4)
+    route = shortest_route_for_graph(compiled, "N0", "N5")
+    assert route.algorithm == "alt"
+    assert route.cost == nx.dijkstra_path_length(G, "N0", "N5")
+
+
+# Teste da reconstrução agrupada: pedidos feitos durante uma reconstrução do mesmo grafo viram uma única nova passada
+def test_routing_index_rebuilds_are_coalesced(monkeypatch):
+    import threading
+    import app.controllers.graph_controls as graph_controls
+
+    started, release = threading.Event(), threading.Event()
+    runs = []
+
+    def refresh(graph_id, session_factory):
+        runs.append(graph_id)
+        started.set()
+        release.wait(timeout=5)
+
+    monkeypatch.setattr(graph_controls, "refresh_routing_index", refresh)
+    first = threading.Thread(target=graph_controls.rebuild_routing_index_if_present, args=(1, None))
+    first.start()
+    started.wait(timeout=5)
+
+    for _ in range(5):
+        graph_controls.rebuild_routing_index_if_present(1, None)
+    assert runs == [1]
+
+    release.set()
+    first.join(timeout=5)
+    assert runs == [1, 1]
+    assert graph_controls._index_rebuilds == {}